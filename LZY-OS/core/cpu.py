@@ -46,10 +46,10 @@ class CPU:
             0x09:'HALT', 0x0A:'MUL', 0x0B:'MOV'
         }
     
-    def load_program(self, prog):
-        for i, b in enumerate(prog):
-            if i < len(self.memory):
-                self.memory[i] = b
+    def load_program(self, prog, base=0):
+        # words past the end of memory are dropped
+        n = max(0, min(len(prog), len(self.memory) - base))
+        self.memory[base:base + n] = prog[:n]
     
     def run(self):
         while not self.halted:
@@ -4,6 +4,9 @@
 
 import sys
 import os
+import codecs
+import tarfile
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
@@ -11,7 +14,16 @@ from core.cpu import CPU
 from modules.process_manager import ProcessManager
 from modules.memory_manager import MemoryManager
 from modules.file_manager import FileManager
+from modules.disk_storage import open_disk
+from modules.dedup_storage import DedupStorage
+from modules.compressed_storage import CompressedStorage
+from modules.fs_transfer import bulk_import, bulk_export
 from utils.assembler import Assembler, SimpleProgram
+from utils.objfile import ProgramCache
+from utils.linker import link, load_image
+from utils.optimizer import format_report
+from utils.cfg import analyze, format_analysis
+from utils.disasm import Disassembler
 from utils.experiments import ExperimentDemo
 from utils.ai_assistant import DeepSeekAssistant
 
@@ -19,12 +31,20 @@ from utils.ai_assistant import DeepSeekAssistant
 class LZYOS:
     VERSION = "2.1"
     
-    def __init__(self):
+    def __init__(self, disk=None, journal="group", dedup=None, compress=None, asm_cache=None):
         self.cpu = CPU(512)
-        self.process_manager = ProcessManager(self.cpu, "RR")
         self.memory_manager = MemoryManager("dynamic", 512, "first-fit")
-        self.file_manager = FileManager()
+        self.memory_manager.enable_history()
+        self.process_manager = ProcessManager(self.cpu, "RR", self.memory_manager)
+        if disk:
+            storage = open_disk(disk, journal=journal)
+        elif compress:
+            storage = CompressedStorage(compress)
+        else:
+            storage = DedupStorage(dedup) if dedup else None
+        self.file_manager = FileManager(storage)
         self.assembler = Assembler()
+        self.program_cache = ProgramCache(directory=asm_cache)
         
         self.running = True
         self.ai_mode = True
@@ -63,7 +83,7 @@ class LZYOS:
                     self._ai_handle(user_input)
                 else:
                     self._exec(user_input)
-                    
+            
             except KeyboardInterrupt:
                 print("\n[SIGINT] Shutting down...")
                 self._shutdown()
@@ -96,13 +116,22 @@ class LZYOS:
 LZY-OS Command Reference
 ========================
 Special:  /mode /cmd <c> /clear /exit
-System:   help sysinfo cpuinfo meminfo fsinfo ai clear exit
+System:   help sysinfo cpuinfo meminfo fsinfo sync ai clear exit
+          meminfo --history | --export <file.csv|file.json>
 File:     ls [path] cd <path> pwd mkdir <path> touch <path>
-          cat <path> echo <path> <text> rm <path>
-Process:  run <prog> ps
+          cat <path> echo [-a] <path> <text> rm [-r] <path>
+          find [path] [-name pat] [-type f|d] [-size [+-]N[k|M]] [-mmin [+-]N] [-maxdepth N]
+          search [path] [-name pat] [-size [+-]N[k|M]] [-mmin [+-]N]   (indexed, files only)
+          du [-s] [path] tree [path] [-L depth]
+          import <host-dir|file.tar[.gz]> [dest]  export <path> <host-dir|file.tar[.gz]>
+          compress <path> <zlib|lzma|none|inherit> [level]   (--compress storage)
+Process:  run [-O] <prog> ps
           Programs: fibonacci sum hello multiply
-Tools:    asm <prog> exp <demo>
-          Demos: producer-consumer memory-allocation
+Tools:    asm [-O] <prog> exp <demo>
+          link [-O] <main.s> [module.s ...]   link sources from the FS, load and run
+          disasm [start] [end]   disassemble CPU memory (zero runs collapsed)
+          -O: optimize the program first (peephole/dataflow passes)
+          Demos: producer-consumer memory-allocation memory-trace
                  process-scheduling filesystem
 AI Mode:  Natural language input -> auto command execution
         """)
@@ -132,8 +161,9 @@ AI Mode:  Natural language input -> auto command execution
             'quit': lambda a: self._shutdown(),
             'sysinfo': self._cmd_sysinfo,
             'cpuinfo': lambda a: self.cpu.dump_registers(),
-            'meminfo': lambda a: print(self.memory_manager.get_status()),
+            'meminfo': self._cmd_meminfo,
             'fsinfo': lambda a: print(self.file_manager.get_status()),
+            'sync': lambda a: self.file_manager.sync(),
             'ls': self._cmd_ls,
             'cd': self._cmd_cd,
             'pwd': lambda a: print(self.file_manager.pwd()),
@@ -142,11 +172,20 @@ AI Mode:  Natural language input -> auto command execution
             'cat': self._cmd_cat,
             'echo': self._cmd_echo,
             'rm': self._cmd_rm,
+            'find': self._cmd_find,
+            'search': self._cmd_search,
+            'du': self._cmd_du,
+            'import': self._cmd_import,
+            'export': self._cmd_export,
+            'compress': self._cmd_compress,
+            'tree': self._cmd_tree,
             'run': self._cmd_run,
             'ps': lambda a: print(self.process_manager.get_process_info()),
             'clear': lambda a: os.system('cls' if os.name == 'nt' else 'clear'),
             'exp': self._cmd_exp,
             'asm': self._cmd_asm,
+            'link': self._cmd_link,
+            'disasm': self._cmd_disasm,
             'ai': self._cmd_ai,
         }
         
@@ -158,9 +197,9 @@ AI Mode:  Natural language input -> auto command execution
     
     def _suggest_cmd(self, cmd):
         """Command auto-correction"""
-        all_cmds = ['help','exit','sysinfo','cpuinfo','meminfo','fsinfo',
-                    'ls','cd','pwd','mkdir','touch','cat','echo','rm',
-                    'run','ps','clear','exp','asm','ai']
+        all_cmds = ['help','exit','sysinfo','cpuinfo','meminfo','fsinfo','sync',
+                    'ls','cd','pwd','mkdir','touch','cat','echo','rm','find','search','du','tree','import','export','compress',
+                    'run','ps','clear','exp','asm','link','disasm','ai']
         
         suggestions = []
         for c in all_cmds:
@@ -195,6 +234,28 @@ Memory:   Dynamic partition, first-fit allocation
 FS:       Unix-style inode directory tree
 Scheduler:Round-Robin (RR), FCFS, SJF, Priority
         """.format(self.VERSION))
+        st = self.program_cache.stats()
+        print("Programs: {} cached, {} memory / {} disk hits, {} assembled ({})\n".format(
+            st['entries'], st['hits'], st['disk_hits'], st['misses'], st['directory'] or "no disk cache"))
+    
+    def _cmd_meminfo(self, args):
+        parts = args.split()
+        history = self.memory_manager.history
+        if not parts:
+            print(self.memory_manager.get_status())
+        elif parts[0] == '--history':
+            print(history.format_summary() if history else "[error] history disabled")
+        elif parts[0] == '--export' and len(parts) > 1:
+            if not history:
+                print("[error] history disabled")
+            elif parts[1].endswith('.json'):
+                history.to_json(parts[1])
+                print("[ok] {} samples -> {}".format(len(history), parts[1]))
+            else:
+                history.to_csv(parts[1])
+                print("[ok] {} samples -> {}".format(len(history), parts[1]))
+        else:
+            print("[error] usage: meminfo [--history | --export <file.csv|file.json>]")
     
     def _cmd_ls(self, path):
         result = self.file_manager.ls(path if path else None)
@@ -214,29 +275,233 @@ Scheduler:Round-Robin (RR), FCFS, SJF, Priority
         if not path:
             print("[error] path required")
             return
-        content = self.file_manager.cat(path)
-        if content is not None:
-            print(content)
-        else:
+        handle = self.file_manager.open(path)
+        if handle is None:
             print("[error] no such file: {}".format(path))
+            return
+        # stream block by block instead of loading the whole file
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        with handle:
+            for chunk in handle.chunks():
+                sys.stdout.write(decoder.decode(chunk))
+        print(decoder.decode(b'', final=True))
     
     def _cmd_echo(self, args):
+        append = args.startswith("-a ")
+        if append:
+            args = args[3:].lstrip()
         parts = args.split(maxsplit=1)
         if len(parts) < 2:
-            print("[error] usage: echo <path> <content>")
+            print("[error] usage: echo [-a] <path> <content>")
             return
-        self.file_manager.echo(parts[0], parts[1])
+        if not self.file_manager.echo(parts[0], parts[1], append=append):
+            print("[error] no such file: {}".format(parts[0]))
     
     def _cmd_rm(self, path):
+        recursive = path.startswith("-r ")
+        if recursive:
+            path = path[3:].strip()
         if not path:
             print("[error] path required")
             return
-        if self.file_manager.rm(path):
+        ok = self.file_manager.rmdir(path, recursive=True) if recursive else self.file_manager.rm(path)
+        if ok:
             print("[ok] removed: {}".format(path))
         else:
             print("[error] cannot remove: {}".format(path))
     
+    FIND_USAGE = "find [path] [-name pat] [-type f|d] [-size [+-]N[k|M]] [-mmin [+-]N] [-maxdepth N]"
+    SEARCH_USAGE = "search [path] [-name pat] [-size [+-]N[k|M]] [-mmin [+-]N]"
+    
+    def _parse_find(self, args, options):
+        """Parse find-style options -> (path, criteria), None on bad usage"""
+        parts = args.split()
+        path = None
+        if parts and not parts[0].startswith("-"):
+            path = parts.pop(0)
+        criteria = {}
+        units = {'k': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+        try:
+            for opt, val in zip(parts[::2], parts[1::2]):
+                if opt not in options:
+                    raise ValueError(opt)
+                if opt == "-name":
+                    criteria['name'] = val
+                elif opt == "-type" and val in ("f", "d"):
+                    criteria['kind'] = val
+                elif opt == "-size":
+                    n = int(val.lstrip("+-").rstrip("kMG")) * units.get(val[-1], 1)
+                    if val[0] == "+":
+                        criteria['min_size'] = n + 1
+                    elif val[0] == "-":
+                        criteria['max_size'] = n - 1
+                    else:
+                        criteria['min_size'] = criteria['max_size'] = n
+                elif opt == "-mmin":
+                    t = time.time() - float(val.lstrip("+-")) * 60
+                    criteria['older' if val[0] == "+" else 'newer'] = t
+                elif opt == "-maxdepth":
+                    criteria['max_depth'] = int(val)
+                else:
+                    raise ValueError(opt)
+            if len(parts) % 2:
+                raise ValueError(parts[-1])
+        except ValueError:
+            return None
+        return path, criteria
+    
+    def _cmd_find(self, args):
+        parsed = self._parse_find(args, ("-name", "-type", "-size", "-mmin", "-maxdepth"))
+        if parsed is None:
+            print("[error] usage: " + self.FIND_USAGE)
+            return
+        path, criteria = parsed
+        if self.file_manager.fs.resolve(path) is None:
+            print("[error] no such path: {}".format(path))
+            return
+        count = 0
+        for p in self.file_manager.find(path, **criteria):
+            print(p)
+            count += 1
+        print("[find] {} match(es)".format(count))
+    
+    def _cmd_search(self, args):
+        parsed = self._parse_find(args, ("-name", "-size", "-mmin"))
+        if parsed is None:
+            print("[error] usage: " + self.SEARCH_USAGE)
+            return
+        path, criteria = parsed
+        if self.file_manager.fs.resolve(path) is None:
+            print("[error] no such path: {}".format(path))
+            return
+        fs = self.file_manager.fs
+        if fs.index is None:
+            # built on first use, so mounting stays lazy and writes pay no upkeep until then
+            t0 = time.perf_counter()
+            fs.enable_index()
+            print("[search] index built: {} files in {:.2f} ms".format(
+                len(fs.index), (time.perf_counter() - t0) * 1000))
+        t0 = time.perf_counter()
+        paths = sorted(self.file_manager.search(path, **criteria))
+        elapsed = time.perf_counter() - t0
+        for p in paths:
+            print(p)
+        print("[search] {} match(es) in {:.2f} ms".format(len(paths), elapsed * 1000))
+    
+    def _print_transfer(self, label, st):
+        print("[{}] {} files, {} dirs, {} bytes in {:.2f}s ({:,.0f} files/s, {:.1f} MB/s){}".format(
+            label, st['files'], st['dirs'], st['bytes'], st['elapsed'], st['files_per_sec'],
+            st['mb_per_sec'], ", {} skipped".format(st['skipped']) if st['skipped'] else ""))
+    
+    def _cmd_import(self, args):
+        parts = args.split()
+        if not 1 <= len(parts) <= 2:
+            print("[error] usage: import <host-dir|file.tar[.gz]> [dest]")
+            return
+        dest = parts[1] if len(parts) == 2 else self.file_manager.pwd()
+        try:
+            st = bulk_import(self.file_manager.fs, parts[0], dest)
+        except (OSError, EOFError, tarfile.TarError) as e:
+            print("[error] import failed: {}".format(e))
+            return
+        if st is None:
+            print("[error] not a host directory or tar archive, or dest is not a directory")
+            return
+        self._print_transfer("import", st)
+    
+    def _cmd_export(self, args):
+        parts = args.split()
+        if len(parts) != 2:
+            print("[error] usage: export <path> <host-dir|file.tar[.gz]>")
+            return
+        try:
+            st = bulk_export(self.file_manager.fs, parts[0], parts[1])
+        except OSError as e:
+            print("[error] export failed: {}".format(e))
+            return
+        if st is None:
+            print("[error] no such path: {}".format(parts[0]))
+            return
+        self._print_transfer("export", st)
+    
+    def _cmd_compress(self, args):
+        parts = args.split()
+        if len(parts) not in (2, 3) or (len(parts) == 3 and not parts[2].isdigit()):
+            print("[error] usage: compress <path> <zlib|lzma|none|inherit> [level]")
+            return
+        codec = None if parts[1] == "inherit" else parts[1]
+        level = int(parts[2]) if len(parts) == 3 else None
+        try:
+            n = self.file_manager.compress(parts[0], codec, level)
+        except ValueError as e:
+            print("[error] {}".format(e))
+            return
+        if n is None:
+            print("[error] no such path or storage is not compressed (start with --compress): {}".format(parts[0]))
+            return
+        print("[ok] {}: policy {}, {} files recompressed".format(parts[0], parts[1], n))
+    
+    def _cmd_du(self, args):
+        parts = args.split()
+        summary = "-s" in parts
+        parts = [p for p in parts if p != "-s"]
+        result = self.file_manager.du(parts[0] if parts else None, summary)
+        print(result if result is not None else "[error] no such path: {}".format(parts[0]))
+    
+    def _cmd_tree(self, args):
+        parts = args.split()
+        depth = None
+        if "-L" in parts:
+            i = parts.index("-L")
+            try:
+                depth = int(parts[i + 1])
+            except (IndexError, ValueError):
+                print("[error] usage: tree [path] [-L depth]")
+                return
+            del parts[i:i + 2]
+        result = self.file_manager.tree(parts[0] if parts else None, depth)
+        print(result if result is not None else "[error] no such path: {}".format(parts[0]))
+    
+    def _load_program(self, source):
+        """Assemble source, or take the object file from the program cache."""
+        obj, origin = self.program_cache.load(source, self.assembler)
+        if origin != "assembled":
+            print("[cache] {} hit, {} words".format(origin, len(obj)))
+        return obj
+    
+    @staticmethod
+    def _opt_flag(args):
+        """Strip -O from the arguments; returns (remaining args, whether it was given)."""
+        parts = args.split()
+        return " ".join(p for p in parts if p != "-O"), "-O" in parts
+    
+    def _optimized(self, obj):
+        """Optimize a linked object through the program cache and print its report (the input is untouched)."""
+        try:
+            optimized, report, origin = self.program_cache.optimized(obj)
+        except ValueError as e:
+            print("[error] optimize failed: {}".format(e))
+            return None
+        if report is not None:
+            print(format_report(report))
+        else:
+            print("[opt] {} -> {} words (cached in {})".format(len(obj), len(optimized), origin))
+        return optimized
+    
+    def _admit(self, code, label, base=0, symbols=None, region=None):
+        """Statically analyze a program and create its process; returns None if it can never halt."""
+        analysis = analyze(code, base, symbols)
+        if analysis.never_halts:
+            where = "no reachable HALT"
+            if analysis.traps:
+                where = "loop at {}".format(analysis.describe(analysis.loops[analysis.traps[0]][0]))
+            print("[error] {} never halts ({}), not admitted".format(label, where))
+            return None
+        return self.process_manager.create_process(code, name=label, base=base, estimate=analysis.worst,
+                                                   region=region)
+    
     def _cmd_run(self, name):
+        name, opt = self._opt_flag(name)
         programs = {
             'fibonacci': ("Fibonacci", SimpleProgram.fibonacci()),
             'sum': ("Sum", SimpleProgram.sum()),
@@ -253,7 +518,12 @@ Scheduler:Round-Robin (RR), FCFS, SJF, Priority
         key = name.lower()
         if key in programs:
             label, asm = programs[key]
-            prog = self.assembler.assemble(asm)
+            obj = self._load_program(asm)
+            if opt:
+                obj = self._optimized(obj)
+                if obj is None:
+                    return
+            prog = obj.code
             
             # Header
             print("\n" + "=" * 60)
@@ -263,7 +533,7 @@ Scheduler:Round-Robin (RR), FCFS, SJF, Priority
             # Show ASM
             print("\n[asm] Assembly Code:")
             print("-" * 60)
-            print(self.assembler.disassemble(prog))
+            print("\n".join(Disassembler().listing(obj)))
             
             # Show Machine Code
             print("[code] Machine Code ({} bytes):".format(len(prog)))
@@ -272,7 +542,8 @@ Scheduler:Round-Robin (RR), FCFS, SJF, Priority
             
             # Execute
             print("\n[exec] Running...\n")
-            self.process_manager.create_process(prog, name=label)
+            if self._admit(prog, label, symbols=obj.symbols) is None:
+                return
             self.process_manager.run(500, verbose=True)
             
             # Results
@@ -282,7 +553,52 @@ Scheduler:Round-Robin (RR), FCFS, SJF, Priority
         else:
             print("[error] unknown program: {}".format(name))
     
+    def _cmd_link(self, args):
+        args, opt = self._opt_flag(args)
+        paths = args.split()
+        if not paths:
+            print("[error] usage: link [-O] <main.s> [module.s ...]")
+            return
+        modules = []
+        for path in paths:
+            source = self.file_manager.cat(path)
+            if source is None:
+                print("[error] no such file: {}".format(path))
+                return
+            try:
+                modules.append(self._load_program(source))
+            except ValueError as e:
+                print("[error] {}: {}".format(path, e))
+                return
+        label = paths[0].rstrip("/").rsplit("/", 1)[-1]
+        region = "{}-{}".format(label, self.process_manager.next_pid)
+        try:
+            image = link(modules, [p.rstrip("/").rsplit("/", 1)[-1].split(".")[0] for p in paths])
+        except ValueError as e:
+            print("[error] link failed: {}".format(e))
+            return
+        if opt:
+            image = self._optimized(image)
+            if image is None:
+                return
+        try:
+            loaded = load_image(image, self.memory_manager, region)
+        except ValueError as e:
+            print("[error] link failed: {}".format(e))
+            return
+        if loaded is None:
+            print("[error] not enough memory for {} words".format(len(image)))
+            return
+        base, code = loaded
+        print("[link] {} module(s), {} words, {} relocations, loaded at {}".format(
+            len(modules), len(image), len(image.relocs), base))
+        if self._admit(code, label, base, image.symbols, region) is None:
+            self.memory_manager.deallocate(region)
+            return
+        self.process_manager.run(500, verbose=True)
+    
     def _cmd_asm(self, name):
+        name, opt = self._opt_flag(name)
         programs = {
             'fibonacci': SimpleProgram.fibonacci(),
             'sum': SimpleProgram.sum(),
@@ -298,19 +614,39 @@ Scheduler:Round-Robin (RR), FCFS, SJF, Priority
         
         key = name.lower()
         if key in programs:
-            prog = self.assembler.assemble(programs[key])
+            obj = self._load_program(programs[key])
+            if opt:
+                obj = self._optimized(obj)
+                if obj is None:
+                    return
+            prog = obj.code
             print("\n[asm] {} Assembly".format(key))
             print("-" * 50)
-            print(self.assembler.disassemble(prog))
+            print("\n".join(Disassembler().listing(obj)))
             print("\n[hex] {}".format(' '.join('{:02X}'.format(b) for b in prog)))
-            print("[size] {} bytes\n".format(len(prog)))
+            print("[size] {} bytes".format(len(prog)))
+            print(format_analysis(analyze(prog, symbols=obj.symbols)) + "\n")
         else:
             print("[error] unknown program: {}".format(name))
     
+    def _cmd_disasm(self, args):
+        try:
+            bounds = [int(a) for a in args.split()]
+        except ValueError:
+            bounds = None
+        if bounds is None or len(bounds) > 2:
+            print("[error] usage: disasm [start] [end]")
+            return
+        start = bounds[0] if bounds else 0
+        end = bounds[1] if len(bounds) > 1 else None
+        for line in Disassembler().listing(self.cpu, start, end):
+            print(line)
+    
     def _cmd_exp(self, name):
         demos = {
             'producer-consumer': ("Producer-Consumer", ExperimentDemo.producer_consumer),
             'memory-allocation': ("Memory Allocation", ExperimentDemo.memory_allocation),
+            'memory-trace': ("Memory Trace Replay", ExperimentDemo.memory_trace),
             'process-scheduling': ("Process Scheduling", ExperimentDemo.process_scheduling),
             'filesystem': ("FileSystem", ExperimentDemo.filesystem),
         }
@@ -340,10 +676,35 @@ Scheduler:Round-Robin (RR), FCFS, SJF, Priority
         print("  Current dir: {}".format(self.file_manager.pwd()))
     
     def _shutdown(self):
+        self.file_manager.close()
         print("\n[shutdown] LZY-OS terminated.")
         self.running = False
         sys.exit(0)
 
 
 if __name__ == "__main__":
-    LZYOS().run()
+    # python main.py [--disk <image>] [--journal none|sync|group]
+    #   run the file system on a persistent disk image
+    # python main.py --dedup [cdc|file]  - in-memory deduplicating storage
+    # python main.py --compress [zlib|lzma]  - in-memory transparently compressed storage
+    # python main.py --asm-cache <dir|off>  - also cache assembled programs on disk (default: memory only)
+    disk = None
+    journal = "group"
+    dedup = None
+    if "--disk" in sys.argv[1:-1]:
+        disk = sys.argv[sys.argv.index("--disk") + 1]
+    if "--journal" in sys.argv[1:-1]:
+        journal = sys.argv[sys.argv.index("--journal") + 1]
+    if "--dedup" in sys.argv[1:]:
+        i = sys.argv.index("--dedup") + 1
+        dedup = sys.argv[i] if i < len(sys.argv) and sys.argv[i] in ("cdc", "file") else "cdc"
+    compress = None
+    if "--compress" in sys.argv[1:]:
+        i = sys.argv.index("--compress") + 1
+        compress = sys.argv[i] if i < len(sys.argv) and sys.argv[i] in ("zlib", "lzma") else "zlib"
+    # the disk cache is opt-in: by default assembled programs are cached in memory only
+    asm_cache = None
+    if "--asm-cache" in sys.argv[1:-1]:
+        asm_cache = sys.argv[sys.argv.index("--asm-cache") + 1]
+        asm_cache = None if asm_cache == "off" else os.path.expanduser(asm_cache)
+    LZYOS(disk, journal, dedup, compress, asm_cache).run()
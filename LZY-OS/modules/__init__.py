@@ -1,9 +1,18 @@
 from .process_manager import ProcessManager, PCB, ProcessState, Scheduler
-from .memory_manager import MemoryManager, FixedMemory, DynamicMemory
-from .file_manager import FileManager, FileSystem, INode
+from .memory_manager import MemoryManager, ConcurrentMemoryManager, FixedMemory, DynamicMemory, TLSFMemory
+from .fs_index import MetadataIndex, SortedIndex
+from .file_manager import FileManager, FileSystem, ConcurrentFileSystem, RWLock, INode, MemoryStorage
+from .block_device import BlockDevice, BufferCache
+from .journal import Journal
+from .disk_storage import DiskStorage, open_disk
+from .dedup_storage import DedupStorage
+from .compressed_storage import CompressedStorage
+from .fs_transfer import bulk_import, bulk_export, import_tree, import_tar, export_tree, export_tar
 
 __all__ = [
     'ProcessManager', 'PCB', 'ProcessState', 'Scheduler',
-    'MemoryManager', 'FixedMemory', 'DynamicMemory',
-    'FileManager', 'FileSystem', 'INode'
+    'MemoryManager', 'ConcurrentMemoryManager', 'FixedMemory', 'DynamicMemory', 'TLSFMemory',
+    'FileManager', 'FileSystem', 'ConcurrentFileSystem', 'RWLock', 'INode', 'MemoryStorage', 'MetadataIndex', 'SortedIndex',
+    'BlockDevice', 'BufferCache', 'Journal', 'DiskStorage', 'open_disk', 'DedupStorage', 'CompressedStorage',
+    'bulk_import', 'bulk_export', 'import_tree', 'import_tar', 'export_tree', 'export_tar',
 ]
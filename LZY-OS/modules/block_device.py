@@ -0,0 +1,178 @@
+"""LZY-OS Block Device - 块设备模块"""
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+
+class BlockDevice:
+    """块设备 - 固定块大小的磁盘镜像 (镜像文件/mmap, 或内存中的 bytearray)"""
+    def __init__(self, path=None, block_size=4096, num_blocks=None, use_mmap=True):
+        self.path = path
+        self.block_size = block_size
+        self.reads = 0
+        self.writes = 0
+        self.flushes = 0
+        self._file = None
+        self._map = None
+        if path is None:
+            if not num_blocks:
+                raise ValueError("num_blocks required for an in-memory device")
+            self._buf = bytearray(block_size * num_blocks)
+        else:
+            exists = os.path.exists(path)
+            self._file = open(path, 'r+b' if exists else 'w+b')
+            size = os.path.getsize(path)
+            if num_blocks and size < block_size * num_blocks:
+                self._file.truncate(block_size * num_blocks)
+                size = block_size * num_blocks
+            if size == 0 or size % block_size:
+                self._file.close()
+                raise ValueError(f"bad image size {size} for block size {block_size}: {path}")
+            if use_mmap:
+                self._map = mmap.mmap(self._file.fileno(), size)
+            self._buf = self._map
+        self.num_blocks = (len(self._buf) if self._buf is not None else size) // block_size
+    
+    def read_block(self, n):
+        self.reads += 1
+        bs = self.block_size
+        if self._buf is not None:
+            return bytes(self._buf[n * bs:(n + 1) * bs])
+        self._file.seek(n * bs)
+        return self._file.read(bs)
+    
+    def write_block(self, n, data):
+        self.writes += 1
+        bs = self.block_size
+        if len(data) < bs:
+            data = bytes(data) + bytes(bs - len(data))
+        if self._buf is not None:
+            self._buf[n * bs:(n + 1) * bs] = data
+        else:
+            self._file.seek(n * bs)
+            self._file.write(data)
+    
+    def flush(self):
+        self.flushes += 1
+        if self._map is not None:
+            self._map.flush()
+        elif self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        self._file = None
+        self._buf = None
+    
+    def stats(self):
+        return {
+            'path': self.path or "(memory)",
+            'block_size': self.block_size,
+            'blocks': self.num_blocks,
+            'reads': self.reads,
+            'writes': self.writes,
+            'flushes': self.flushes,
+        }
+
+
+class BufferCache:
+    """块缓冲缓存 - 位于文件系统与块设备之间: LRU 淘汰, 脏块回写, 顺序读预取
+    
+    与 BlockDevice 接口相同, 可直接替换设备; 内部加锁, 可供多个读线程共享。
+    """
+    def __init__(self, device, capacity_bytes=4 * 1024 * 1024, read_ahead=8):
+        self.device = device
+        self.block_size = device.block_size
+        self.num_blocks = device.num_blocks
+        self.capacity = max(1, capacity_bytes // self.block_size)
+        self.read_ahead = read_ahead
+        self._blocks = OrderedDict()    # block -> bytes, LRU order
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._last = -2
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+        self.prefetched = 0
+    
+    def _insert(self, n, data):
+        blocks = self._blocks
+        blocks[n] = data
+        blocks.move_to_end(n)
+        while len(blocks) > self.capacity:
+            old, old_data = blocks.popitem(last=False)
+            self.evictions += 1
+            if old in self._dirty:
+                self._dirty.discard(old)
+                self.device.write_block(old, old_data)
+                self.writebacks += 1
+    
+    def read_block(self, n):
+        with self._lock:
+            data = self._blocks.get(n)
+            if data is not None:
+                self._blocks.move_to_end(n)
+                self.hits += 1
+            else:
+                self.misses += 1
+                data = self.device.read_block(n)
+                self._insert(n, data)
+            # sequential access: pull the next window in before it is asked for
+            if n == self._last + 1 and self.read_ahead and n + 1 not in self._blocks:
+                for m in range(n + 1, min(n + 1 + self.read_ahead, self.num_blocks)):
+                    if m not in self._blocks:
+                        self._insert(m, self.device.read_block(m))
+                        self.prefetched += 1
+            self._last = n
+            return data
+    
+    def write_block(self, n, data):
+        bs = self.block_size
+        data = bytes(data) + bytes(bs - len(data)) if len(data) < bs else bytes(data)
+        with self._lock:
+            self._dirty.add(n)
+            self._insert(n, data)
+    
+    def sync(self):
+        """把所有脏块按块号顺序写回设备"""
+        with self._lock:
+            for n in sorted(self._dirty):
+                self.device.write_block(n, self._blocks[n])
+                self.writebacks += 1
+            self._dirty.clear()
+    
+    def flush(self):
+        with self._lock:
+            self.sync()
+            self.device.flush()
+    
+    def close(self):
+        with self._lock:
+            self.sync()
+            self._blocks.clear()
+            self.device.close()
+    
+    def stats(self):
+        st = self.device.stats()
+        total = self.hits + self.misses
+        st.update({
+            'cache_blocks': len(self._blocks),
+            'cache_capacity': self.capacity,
+            'dirty': len(self._dirty),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'writebacks': self.writebacks,
+            'prefetched': self.prefetched,
+        })
+        return st
@@ -0,0 +1,258 @@
+"""LZY-OS Compressed Storage - 透明压缩的内存存储"""
+import lzma
+import zlib
+from collections import OrderedDict
+
+from .file_manager import MemoryStorage
+
+CODECS = ("zlib", "lzma", "none")
+LEVELS = {"zlib": (1, 9, 6), "lzma": (0, 9, 6)}      # codec -> (min, max, default)
+
+
+class _Packed:
+    """压缩后的文件内容, policy 为压缩时使用的 (codec, level)"""
+    __slots__ = ('policy', 'data', 'size')
+    
+    def __init__(self, policy, data, size):
+        self.policy = policy
+        self.data = data
+        self.size = size
+
+
+def _compress(policy, raw):
+    codec, level = policy
+    if codec == "zlib":
+        return zlib.compress(raw, level)
+    # FORMAT_ALONE: 13-byte header and no integrity check, small files stay small
+    return lzma.compress(raw, format=lzma.FORMAT_ALONE, preset=level)
+
+
+def _decompress(packed):
+    if packed.policy[0] == "zlib":
+        return zlib.decompress(packed.data)
+    return lzma.decompress(packed.data, format=lzma.FORMAT_ALONE)
+
+
+def policy_name(policy):
+    return "none" if policy[0] == "none" else "{}-{}".format(*policy)
+
+
+class CompressedStorage(MemoryStorage):
+    """透明压缩存储 - 文件内容按策略用 zlib/lzma 压缩保存, 读取时才解压
+    
+    策略 (codec, level) 可设在文件或目录上, 文件使用离它最近的、设置了策略的
+    祖先上的策略, 都没有时用默认策略。最近读写的文件以原始字节留在按字节数
+    限额的 LRU 中: 追加写入不会反复压缩, 热文件的读取不必解压; 被挤出 LRU
+    或 sync() 时才压缩。小于 min_size 或压缩后不变小的文件保持原样。
+    """
+    def __init__(self, codec="zlib", level=None, cache_bytes=1 << 22, min_size=64):
+        self.default = self.policy(codec, level)
+        self.policies = {}          # inode_id -> (codec, level) set on a file or directory
+        self.hot = OrderedDict()    # inode_id -> [INode, compressed copy, None once modified]
+        self.hot_bytes = 0
+        self.cache_bytes = cache_bytes
+        self.min_size = min_size
+        self.logical_bytes = 0      # sum of file sizes
+        self.stored_bytes = 0       # bytes held: raw contents plus compressed copies
+        self.packed_files = 0
+        self.packs = 0
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def policy(codec, level=None):
+        """校验并返回策略元组 (codec, level)"""
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec: {codec}")
+        if codec == "none":
+            return ("none", 0)
+        lo, hi, default = LEVELS[codec]
+        if level is None:
+            level = default
+        if not lo <= level <= hi:
+            raise ValueError(f"{codec} level must be between {lo} and {hi}")
+        return (codec, level)
+    
+    def set_policy(self, node, codec, level=None):
+        """在文件或目录上设置策略; codec 为 None 时清除, 改为继承上级的策略"""
+        if codec is None:
+            self.policies.pop(node.inode_id, None)
+        else:
+            self.policies[node.inode_id] = self.policy(codec, level)
+    
+    def _policy_of(self, node):
+        policies = self.policies
+        if policies:
+            while node is not None:
+                policy = policies.get(node.inode_id)
+                if policy is not None:
+                    return policy
+                node = node.parent
+        return self.default
+    
+    # ---- state changes --------------------------------------------------
+    def _modify(self, node):
+        """写入前调用: 内容解压为原始字节, LRU 中的压缩副本作废"""
+        content = node.content
+        entry = self.hot.get(node.inode_id)
+        if entry is not None:
+            if entry[1] is not None:
+                self.stored_bytes -= len(entry[1].data)
+                self.packed_files -= 1
+                entry[1] = None
+        elif type(content) is _Packed:
+            raw = node.content = _decompress(content)
+            self.stored_bytes += len(raw) - len(content.data)
+            self.packed_files -= 1
+    
+    def _settle(self, node, before):
+        """写入后调用: 记账, 并把文件放到 LRU 的最新端"""
+        n = len(node.content)
+        self.stored_bytes += n - before
+        self.logical_bytes += n - before
+        ino = node.inode_id
+        if ino in self.hot:
+            self.hot_bytes += n - before
+            if n < self.min_size:
+                del self.hot[ino]
+                self.hot_bytes -= n
+            else:
+                self.hot.move_to_end(ino)
+        elif n >= self.min_size:
+            self.hot[ino] = [node, None]
+            self.hot_bytes += n
+        self._evict()
+    
+    def _pack(self, node, packed):
+        """node 离开 LRU: 有未作废的压缩副本就换回副本, 否则按策略压缩"""
+        raw = node.content
+        if packed is None:
+            policy = self._policy_of(node)
+            if policy[0] == "none" or len(raw) < self.min_size:
+                return
+            data = _compress(policy, raw)
+            self.packs += 1
+            if len(data) >= len(raw):
+                return
+            packed = _Packed(policy, data, len(raw))
+            self.stored_bytes += len(data)
+            self.packed_files += 1
+        node.content = packed
+        self.stored_bytes -= len(raw)
+    
+    def _evict(self):
+        # the most recent file always stays, so chunked reads of a big file decompress once
+        hot = self.hot
+        while self.hot_bytes > self.cache_bytes and len(hot) > 1:
+            _, (node, packed) = hot.popitem(last=False)
+            self.hot_bytes -= len(node.content)
+            self._pack(node, packed)
+    
+    def repack(self, node):
+        """按 node 当前生效的策略重新压缩, 返回是否改写了内容"""
+        policy = self._policy_of(node)
+        content = node.content
+        entry = self.hot.get(node.inode_id)
+        if type(content) is _Packed:
+            current = content.policy
+        elif entry is not None and entry[1] is not None:
+            current = entry[1].policy
+        else:
+            current = None      # raw bytes
+        if current == policy or (current is None and policy[0] == "none"):
+            return False
+        self._modify(node)
+        if self.hot.pop(node.inode_id, None) is not None:
+            self.hot_bytes -= len(node.content)
+        self._pack(node, None)
+        # small or incompressible files stay raw: nothing changed
+        return current is not None or type(node.content) is _Packed
+    
+    # ---- FileSystem storage interface ----------------------------------
+    def create(self, parent, node):
+        if not node.is_directory and node.size:
+            size = node.size
+            node.size = 0
+            self.write(node, bytes(size))   # touch(size=n) fills with zeros
+        return True
+    
+    def remove(self, parent, node):
+        ino = node.inode_id
+        self.policies.pop(ino, None)
+        if node.is_directory:
+            return
+        content = node.content
+        entry = self.hot.pop(ino, None)
+        if entry is not None:
+            self.hot_bytes -= len(content)
+            if entry[1] is not None:
+                self.stored_bytes -= len(entry[1].data)
+                self.packed_files -= 1
+        if type(content) is _Packed:
+            self.stored_bytes -= len(content.data)
+            self.packed_files -= 1
+        else:
+            self.stored_bytes -= len(content)
+        self.logical_bytes -= node.size
+        node.content = b''
+    
+    def read(self, node, offset=0, size=-1):
+        content = node.content
+        ino = node.inode_id
+        if type(content) is _Packed:
+            # keep the compressed copy: evicting an unmodified file is then free
+            packed = content
+            content = node.content = _decompress(packed)
+            self.hot[ino] = [node, packed]
+            self.hot_bytes += len(content)
+            self.stored_bytes += len(content)
+            self.misses += 1
+            self._evict()
+        elif ino in self.hot:
+            self.hot.move_to_end(ino)
+            self.hits += 1
+        if offset == 0 and size < 0:
+            return bytes(content)
+        end = len(content) if size < 0 else offset + size
+        return bytes(content[offset:end])
+    
+    def write(self, node, data, offset=0):
+        self._modify(node)
+        before = len(node.content)
+        super().write(node, data, offset)
+        self._settle(node, before)
+    
+    def truncate(self, node, size):
+        self._modify(node)
+        before = len(node.content)
+        super().truncate(node, size)
+        self._settle(node, before)
+    
+    def sync(self):
+        """把 LRU 中的文件全部压缩"""
+        hot = self.hot
+        while hot:
+            _, (node, packed) = hot.popitem(last=False)
+            self._pack(node, packed)
+        self.hot_bytes = 0
+    
+    def stats(self):
+        logical, stored = self.logical_bytes, self.stored_bytes
+        lookups = self.hits + self.misses
+        return {
+            'backend': "compressed",
+            'policy': policy_name(self.default),
+            'policies': len(self.policies),
+            'logical_bytes': logical,
+            'stored_bytes': stored,
+            'bytes_saved': logical - stored,
+            'compression_ratio': logical / stored if stored else 1.0,
+            'packed_files': self.packed_files,
+            'packs': self.packs,
+            'cache_files': len(self.hot),
+            'cache_bytes': self.hot_bytes,
+            'cache_capacity': self.cache_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,189 @@
+"""LZY-OS Dedup Storage - 内容寻址去重存储"""
+import hashlib
+import random
+import time
+from bisect import bisect_right
+
+from .file_manager import MemoryStorage
+
+# gear table for the rolling hash, fixed so chunk boundaries are reproducible
+_GEAR = random.Random(0x4C5A59).sample(range(1 << 32), 256)
+CHUNKING_MODES = ("cdc", "file")
+
+
+class _ChunkMap:
+    """文件内容 = 按顺序排列的块摘要, ends[i] 为第 i 块的结束偏移"""
+    __slots__ = ('digests', 'ends')
+    
+    def __init__(self):
+        self.digests = []
+        self.ends = []
+    
+    @property
+    def size(self):
+        return self.ends[-1] if self.ends else 0
+
+
+class DedupStorage(MemoryStorage):
+    """去重存储 - 文件内容按块哈希, 相同的块只保存一份并计数引用
+    
+    chunking="cdc" 用 gear 滚动哈希做内容定义分块 (插入数据只影响附近的块),
+    "file" 则整个文件作为一块。块数据不可变: 落在单个块内的读取直接返回
+    memoryview, 写入时只把受影响的块复制出来重新分块 (写时复制)。
+    """
+    def __init__(self, chunking="cdc", min_chunk=2048, avg_chunk=8192, max_chunk=65536):
+        if chunking not in CHUNKING_MODES:
+            raise ValueError(f"unknown chunking mode: {chunking}")
+        if avg_chunk & (avg_chunk - 1) or not min_chunk <= avg_chunk <= max_chunk:
+            raise ValueError("avg_chunk must be a power of two between min_chunk and max_chunk")
+        self.chunking = chunking
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.mask = avg_chunk - 1
+        self.chunks = {}        # digest -> bytes
+        self.refs = {}          # digest -> reference count
+        self.logical_bytes = 0
+        self.stored_bytes = 0
+        self.cow_bytes = 0
+    
+    # ---- chunk store --------------------------------------------------
+    def _cut_points(self, buf):
+        """buf -> 各块结束位置 (最后一个为 len(buf))"""
+        n = len(buf)
+        if self.chunking == "file":
+            return [n] if n else []
+        gear, mask, lo, hi = _GEAR, self.mask, self.min_chunk, self.max_chunk
+        cuts = []
+        start = 0
+        while start < n:
+            end = min(start + hi, n)
+            cut = end
+            h = 0
+            for i in range(start + lo, end):
+                h = ((h << 1) + gear[buf[i]]) & 0xFFFFFFFF
+                if not h & mask:
+                    cut = i + 1
+                    break
+            cuts.append(cut)
+            start = cut
+        return cuts
+    
+    def _ref(self, data):
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        count = self.refs.get(digest, 0)
+        if not count:
+            self.chunks[digest] = bytes(data)
+            self.stored_bytes += len(data)
+        self.refs[digest] = count + 1
+        self.logical_bytes += len(data)
+        return digest
+    
+    def _unref(self, digest):
+        size = len(self.chunks[digest])
+        self.logical_bytes -= size
+        count = self.refs[digest] - 1
+        if count:
+            self.refs[digest] = count
+        else:
+            del self.refs[digest]
+            del self.chunks[digest]
+            self.stored_bytes -= size
+    
+    def _rechunk(self, cm, first, last, start, buf):
+        """用 buf 重新分块并替换第 first..last 块 (buf 从偏移 start 开始)"""
+        view = memoryview(buf)
+        digests, ends = [], []
+        prev = 0
+        for cut in self._cut_points(buf):
+            digests.append(self._ref(view[prev:cut]))
+            ends.append(start + cut)
+            prev = cut
+        # reference the new chunks before dropping the old ones so shared data is kept
+        for d in cm.digests[first:last]:
+            self._unref(d)
+        cm.digests[first:last] = digests
+        cm.ends[first:last] = ends
+    
+    # ---- FileSystem storage interface ----------------------------------
+    def create(self, parent, node):
+        if not node.is_directory:
+            size = node.size
+            node.content = _ChunkMap()
+            node.size = 0
+            if size:
+                self.write(node, bytes(size))   # touch(size=n) fills with zeros
+        return True
+    
+    def remove(self, parent, node):
+        if not node.is_directory:
+            for d in node.content.digests:
+                self._unref(d)
+            node.content = _ChunkMap()
+    
+    def read(self, node, offset=0, size=-1):
+        cm = node.content
+        end = cm.size if size < 0 else min(cm.size, offset + size)
+        if offset >= end:
+            return b''
+        ends, chunks = cm.ends, self.chunks
+        i = bisect_right(ends, offset)
+        base = ends[i - 1] if i else 0
+        if end <= ends[i]:
+            return memoryview(chunks[cm.digests[i]])[offset - base:end - base]
+        parts = []
+        while base < end:
+            data = memoryview(chunks[cm.digests[i]])
+            parts.append(data[max(offset - base, 0):min(end, ends[i]) - base])
+            base = ends[i]
+            i += 1
+        return b''.join(parts)
+    
+    def write(self, node, data, offset=0):
+        cm = node.content
+        n = len(cm.ends)
+        if not data and offset <= cm.size:
+            node.modified = time.time()
+            return
+        # copy out only the chunks the write touches; appends re-chunk the last one
+        first = min(bisect_right(cm.ends, offset), max(n - 1, 0))
+        last = min(bisect_right(cm.ends, offset + len(data) - 1), n - 1) + 1 if n else 0
+        start = cm.ends[first - 1] if first else 0
+        buf = bytearray()
+        for d in cm.digests[first:last]:
+            chunk = self.chunks[d]
+            if self.refs[d] > 1:
+                self.cow_bytes += len(chunk)
+            buf += chunk
+        rel = offset - start
+        if rel > len(buf):
+            buf += bytes(rel - len(buf))
+        buf[rel:rel + len(data)] = data
+        self._rechunk(cm, first, last, start, buf)
+        node.size = cm.size
+        node.modified = time.time()
+    
+    def truncate(self, node, size):
+        cm = node.content
+        if size >= cm.size:
+            if size > cm.size:
+                self.write(node, bytes(size - cm.size), cm.size)
+            return
+        keep = bisect_right(cm.ends, size)
+        start = cm.ends[keep - 1] if keep else 0
+        self._rechunk(cm, keep, len(cm.ends), start, self.chunks[cm.digests[keep]][:size - start])
+        node.size = cm.size
+        node.modified = time.time()
+    
+    def stats(self):
+        logical, stored = self.logical_bytes, self.stored_bytes
+        return {
+            'backend': "dedup",
+            'chunking': self.chunking,
+            'chunks': sum(self.refs.values()),
+            'unique_chunks': len(self.chunks),
+            'logical_bytes': logical,
+            'stored_bytes': stored,
+            'bytes_saved': logical - stored,
+            'dedup_ratio': logical / stored if stored else 1.0,
+            'cow_bytes': self.cow_bytes,
+        }
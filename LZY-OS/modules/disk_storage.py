@@ -0,0 +1,506 @@
+"""LZY-OS Disk Storage - 块设备上的持久化文件系统存储"""
+import os
+import struct
+import time
+from array import array
+
+from .file_manager import INode
+from .journal import Journal
+
+KIND_FREE = 0
+KIND_FILE = 1
+KIND_DIR = 2
+
+NDIRECT = 10
+ROOT_INO = 1
+
+JOURNAL_MODES = ("none", "sync", "group")
+
+
+class InodeRecord:
+    """磁盘 inode 记录 (定长 128 字节)"""
+    FORMAT = struct.Struct('<BHIQdd%dI' % (NDIRECT + 2))
+    SIZE = 128
+    
+    def __init__(self, kind=KIND_FREE, perm=0, parent=0, size=0, created=0.0, modified=0.0, ptrs=None):
+        self.kind = kind
+        self.perm = perm
+        self.parent = parent
+        self.size = size
+        self.created = created
+        self.modified = modified
+        self.ptrs = ptrs if ptrs is not None else [0] * (NDIRECT + 2)
+    
+    def pack(self):
+        raw = self.FORMAT.pack(self.kind, self.perm, self.parent, self.size,
+                               self.created, self.modified, *self.ptrs)
+        return raw + bytes(self.SIZE - len(raw))
+    
+    @classmethod
+    def unpack(cls, raw):
+        f = cls.FORMAT.unpack_from(raw)
+        return cls(f[0], f[1], f[2], f[3], f[4], f[5], list(f[6:]))
+
+
+class DiskStorage:
+    """块设备存储 - 超级块 + inode/块位图 + inode 表 + 数据块 (直接/一级/二级间接指针)
+    
+    目录内容是定长目录项组成的文件; 挂载时只读超级块和位图,
+    inode 与目录块在第一次访问时才加载。
+    inode 表之后保留一段日志区; journal 为 "sync" (每个操作刷盘一次) 或
+    "group" (组提交) 时元数据写入先经过 Journal, 文件数据按 ordered 模式写入,
+    "none" 时直接写设备。释放的块到操作结束 (commit) 时才清位图, 同一操作内不会重用。
+    """
+    MAGIC = b'LZYFS\0\0\0'
+    VERSION = 1
+    # images formatted without a journal read back journal_len = 0
+    SUPER = struct.Struct('<8sIIIIIIIIIII')
+    DIRENT = struct.Struct('<IBB58s')
+    MAX_NAME = 58
+    
+    def __init__(self, device, num_inodes=None, journal="group", group_commit=64, journal_blocks=None):
+        if journal not in JOURNAL_MODES:
+            raise ValueError(f"unknown journal mode: {journal}")
+        self.device = device
+        self.bs = device.block_size
+        self.per_block = self.bs // 4
+        self._recs = {}         # ino -> InodeRecord (loaded on demand)
+        self._dirs = {}         # dir ino -> [name per slot], loaded on demand
+        self._slots = {}        # dir ino -> {name: slot}
+        self._fresh = set()     # blocks allocated by the operation in progress
+        self._released = []     # blocks it freed, cleared in the bitmap at commit()
+        self.journal = None
+        self.fresh = self.device.read_block(0)[:len(self.MAGIC)] != self.MAGIC
+        if self.fresh:
+            self.format(num_inodes, journal_blocks)
+        self._read_super()
+        if self.journal_len:
+            # replay before anything reads the bitmaps or the inode table
+            log = Journal(device, self.journal_start, self.journal_len,
+                          1 if journal == "sync" else group_commit)
+            log.recover()
+            if journal != "none":
+                self.device = self.journal = log
+        self._load_super()
+    
+    # ---- layout -------------------------------------------------------
+    def format(self, num_inodes=None, journal_blocks=None):
+        bs, nblocks = self.bs, self.device.num_blocks
+        ninodes = num_inodes or max(16, nblocks // 4)
+        if journal_blocks is None:
+            journal_blocks = min(1024, max(16, nblocks // 32))
+        bits = bs * 8
+        ibm_start = 1
+        bbm_start = ibm_start + -(-ninodes // bits)
+        itable_start = bbm_start + -(-nblocks // bits)
+        journal_start = itable_start + -(-ninodes * InodeRecord.SIZE // bs)
+        data_start = journal_start + journal_blocks
+        if data_start >= nblocks:
+            raise ValueError(f"image too small: {nblocks} blocks")
+        zero = bytes(bs)
+        for n in range(1, data_start):
+            self.device.write_block(n, zero)
+        self.device.write_block(0, self.SUPER.pack(
+            self.MAGIC, self.VERSION, bs, nblocks, ninodes,
+            ibm_start, bbm_start, itable_start, data_start, ROOT_INO,
+            journal_start, journal_blocks))
+        self._load_super()
+        for n in range(data_start):
+            self._set_bit(self.block_bitmap, self.bbm_start, n)
+        for ino in (0, ROOT_INO):
+            self._set_bit(self.inode_bitmap, self.ibm_start, ino)
+        now = time.time()
+        self._put_rec(ROOT_INO, InodeRecord(KIND_DIR, 0o755, 0, 0, now, now))
+        self.fresh = True
+    
+    def _read_super(self):
+        raw = self.device.read_block(0)
+        (magic, version, bs, self.num_blocks, self.num_inodes, self.ibm_start, self.bbm_start,
+         self.itable_start, self.data_start, self.root_ino,
+         self.journal_start, self.journal_len) = self.SUPER.unpack_from(raw)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("not an LZY-OS disk image")
+        if bs != self.bs:
+            raise ValueError(f"image block size {bs} != device block size {self.bs}")
+    
+    def _load_super(self):
+        self._read_super()
+        self.inode_bitmap = self._read_region(self.ibm_start, self.bbm_start)
+        self.block_bitmap = self._read_region(self.bbm_start, self.itable_start)
+        self.free_inodes = self.num_inodes - self._popcount(self.inode_bitmap)
+        self.free_blocks = self.num_blocks - self._popcount(self.block_bitmap)
+        self._ihint = 0
+        self._bhint = self.data_start
+    
+    def _read_region(self, start, end):
+        buf = bytearray()
+        for n in range(start, end):
+            buf += self.device.read_block(n)
+        return buf
+    
+    @staticmethod
+    def _popcount(bitmap):
+        return sum(bin(b).count('1') for b in bitmap if b)
+    
+    # ---- bitmaps ------------------------------------------------------
+    def _set_bit(self, bitmap, region_start, idx):
+        bitmap[idx >> 3] |= 1 << (idx & 7)
+        self._write_bitmap_block(bitmap, region_start, idx)
+    
+    def _clear_bit(self, bitmap, region_start, idx):
+        bitmap[idx >> 3] &= ~(1 << (idx & 7))
+        self._write_bitmap_block(bitmap, region_start, idx)
+    
+    def _write_bitmap_block(self, bitmap, region_start, idx):
+        n = (idx >> 3) // self.bs
+        self.device.write_block(region_start + n, bitmap[n * self.bs:(n + 1) * self.bs])
+    
+    @staticmethod
+    def _find_clear(bitmap, hint, limit):
+        """从 hint 开始找第一个空闲位 (到末尾后回绕)"""
+        nbytes = -(-limit // 8)
+        for lo, hi in ((hint >> 3, nbytes), (0, hint >> 3)):
+            for i in range(lo, hi):
+                byte = bitmap[i]
+                if byte != 0xFF:
+                    idx = i * 8 + (~byte & (byte + 1)).bit_length() - 1
+                    if idx < limit:
+                        return idx
+        return None
+    
+    def _alloc_block(self):
+        n = self._find_clear(self.block_bitmap, self._bhint, self.num_blocks)
+        if n is None:
+            raise OSError("no space left on device")
+        self._set_bit(self.block_bitmap, self.bbm_start, n)
+        self._bhint = n + 1
+        self.free_blocks -= 1
+        self._fresh.add(n)
+        self._write_data(n, bytes(self.bs))
+        return n
+    
+    def _free_block(self, n):
+        self._released.append(n)
+    
+    def _release(self):
+        if self._released:
+            for n in self._released:
+                self._clear_bit(self.block_bitmap, self.bbm_start, n)
+            self.free_blocks += len(self._released)
+            if self.journal is not None:
+                self.journal.release(self._released)
+            self._released = []
+        self._fresh.clear()
+    
+    def _write_data(self, n, data):
+        if self.journal is None:
+            self.device.write_block(n, data)
+        else:
+            self.journal.write_data(n, data, n in self._fresh)
+    
+    def _alloc_inode(self):
+        ino = self._find_clear(self.inode_bitmap, self._ihint, self.num_inodes)
+        if ino is None:
+            raise OSError("no free inodes")
+        self._set_bit(self.inode_bitmap, self.ibm_start, ino)
+        self._ihint = ino + 1
+        self.free_inodes -= 1
+        return ino
+    
+    # ---- inode table --------------------------------------------------
+    def _rec(self, ino):
+        rec = self._recs.get(ino)
+        if rec is None:
+            n, off = divmod(ino * InodeRecord.SIZE, self.bs)
+            raw = self.device.read_block(self.itable_start + n)
+            rec = self._recs[ino] = InodeRecord.unpack(raw[off:off + InodeRecord.SIZE])
+        return rec
+    
+    def _put_rec(self, ino, rec):
+        self._recs[ino] = rec
+        n, off = divmod(ino * InodeRecord.SIZE, self.bs)
+        block = bytearray(self.device.read_block(self.itable_start + n))
+        block[off:off + InodeRecord.SIZE] = rec.pack()
+        self.device.write_block(self.itable_start + n, block)
+    
+    # ---- block mapping ------------------------------------------------
+    def _ptr_block(self, n):
+        ptrs = array('I')
+        ptrs.frombytes(self.device.read_block(n))
+        return ptrs
+    
+    def _bmap(self, rec, idx, alloc=False):
+        """文件块号 idx -> 设备块号 (0 表示空洞)"""
+        if idx < NDIRECT:
+            if not rec.ptrs[idx] and alloc:
+                rec.ptrs[idx] = self._alloc_block()
+            return rec.ptrs[idx]
+        idx -= NDIRECT
+        per = self.per_block
+        if idx < per:
+            slot, path = NDIRECT, [idx]
+        elif idx - per < per * per:
+            slot, path = NDIRECT + 1, list(divmod(idx - per, per))
+        else:
+            raise OSError("file too large")
+        if not rec.ptrs[slot]:
+            if not alloc:
+                return 0
+            rec.ptrs[slot] = self._alloc_block()
+        n = rec.ptrs[slot]
+        for i in path:
+            ptrs = self._ptr_block(n)
+            if not ptrs[i]:
+                if not alloc:
+                    return 0
+                ptrs[i] = self._alloc_block()
+                self.device.write_block(n, ptrs.tobytes())
+            n = ptrs[i]
+        return n
+    
+    def _truncate(self, rec, size):
+        """释放 size 之后的数据块 (含不再需要的间接块)"""
+        bs, per = self.bs, self.per_block
+        keep = -(-size // bs)
+        for i in range(keep, NDIRECT):
+            if rec.ptrs[i]:
+                self._free_block(rec.ptrs[i])
+                rec.ptrs[i] = 0
+        first = max(keep - NDIRECT, 0)
+        ind = rec.ptrs[NDIRECT]
+        if ind and first < per:
+            ptrs = self._ptr_block(ind)
+            for i in range(first, per):
+                if ptrs[i]:
+                    self._free_block(ptrs[i])
+                    ptrs[i] = 0
+            if first == 0:
+                self._free_block(ind)
+                rec.ptrs[NDIRECT] = 0
+            else:
+                self.device.write_block(ind, ptrs.tobytes())
+        first = max(keep - NDIRECT - per, 0)
+        dind = rec.ptrs[NDIRECT + 1]
+        if dind:
+            outer = self._ptr_block(dind)
+            for o in range(first // per, per):
+                if not outer[o]:
+                    continue
+                lo = first - o * per if o == first // per else 0
+                inner = self._ptr_block(outer[o])
+                for i in range(lo, per):
+                    if inner[i]:
+                        self._free_block(inner[i])
+                        inner[i] = 0
+                if lo == 0:
+                    self._free_block(outer[o])
+                    outer[o] = 0
+                else:
+                    self.device.write_block(outer[o], inner.tobytes())
+            if first == 0:
+                self._free_block(dind)
+                rec.ptrs[NDIRECT + 1] = 0
+            else:
+                self.device.write_block(dind, outer.tobytes())
+        # zero the tail of the last kept block so a later grow reads a hole
+        if size % bs and size < rec.size:
+            blk = self._bmap(rec, size // bs)
+            if blk:
+                block = bytearray(self.device.read_block(blk))
+                block[size % bs:] = bytes(bs - size % bs)
+                self.device.write_block(blk, block)
+        rec.size = min(rec.size, size)
+    
+    def _read_range(self, rec, offset, size):
+        end = rec.size if size < 0 else min(rec.size, offset + size)
+        if offset >= end:
+            return b''
+        bs = self.bs
+        out = bytearray()
+        pos = offset
+        while pos < end:
+            idx, off = divmod(pos, bs)
+            n = min(bs - off, end - pos)
+            blk = self._bmap(rec, idx)
+            out += self.device.read_block(blk)[off:off + n] if blk else bytes(n)
+            pos += n
+        return bytes(out)
+    
+    def _write_range(self, rec, offset, data, ordered=False):
+        bs = self.bs
+        write = self._write_data if ordered else self.device.write_block
+        pos, i = offset, 0
+        while i < len(data):
+            idx, off = divmod(pos, bs)
+            n = min(bs - off, len(data) - i)
+            blk = self._bmap(rec, idx, alloc=True)
+            if n == bs:
+                write(blk, data[i:i + n])
+            else:
+                block = bytearray(self.device.read_block(blk))
+                block[off:off + n] = data[i:i + n]
+                write(blk, block)
+            pos += n
+            i += n
+        rec.size = max(rec.size, offset + len(data))
+    
+    # ---- directories --------------------------------------------------
+    def _read_dir(self, ino):
+        """解析目录块 -> [(name, ino, kind)], 同时建立名字->槽位索引"""
+        raw = self._read_range(self._rec(ino), 0, -1)
+        entries = []
+        for off in range(0, len(raw), self.DIRENT.size):
+            child, kind, nlen, name = self.DIRENT.unpack_from(raw, off)
+            entries.append((name[:nlen].decode('utf-8'), child, kind))
+        names = [e[0] for e in entries]
+        self._dirs[ino] = names
+        self._slots[ino] = {name: i for i, name in enumerate(names)}
+        return entries
+    
+    def _dir_names(self, ino):
+        if ino not in self._dirs:
+            self._read_dir(ino)
+        return self._dirs[ino]
+    
+    def _add_entry(self, dir_ino, name, ino, kind):
+        names = self._dir_names(dir_ino)
+        raw = name.encode('utf-8')
+        rec = self._rec(dir_ino)
+        self._write_range(rec, len(names) * self.DIRENT.size, self.DIRENT.pack(ino, kind, len(raw), raw))
+        self._slots[dir_ino][name] = len(names)
+        names.append(name)
+        rec.modified = time.time()
+        self._put_rec(dir_ino, rec)
+    
+    def _remove_entry(self, dir_ino, name):
+        # move the last entry into the freed slot, then shrink the directory
+        names = self._dir_names(dir_ino)
+        slots = self._slots[dir_ino]
+        rec = self._rec(dir_ino)
+        slot = slots.pop(name)
+        last = len(names) - 1
+        es = self.DIRENT.size
+        if slot != last:
+            moved = self._read_range(rec, last * es, es)
+            self._write_range(rec, slot * es, moved)
+            names[slot] = names[last]
+            slots[names[slot]] = slot
+        names.pop()
+        self._truncate(rec, last * es)
+        rec.modified = time.time()
+        self._put_rec(dir_ino, rec)
+    
+    # ---- FileSystem storage interface ----------------------------------
+    persistent = True
+    
+    def _make_inode(self, name, ino, rec):
+        node = INode(name, is_dir=rec.kind == KIND_DIR, size=rec.size, perm=rec.perm, inode_id=ino)
+        node.created = rec.created
+        node.modified = rec.modified
+        node.content = None     # directories load lazily; file data stays on disk
+        if node.is_directory:
+            node.tree_size = None   # summed by FileSystem.du() once the subtree is loaded
+        return node
+    
+    def mount(self):
+        root = self._make_inode("/", self.root_ino, self._rec(self.root_ino))
+        root.size = 0
+        return root
+    
+    def load_dir(self, node):
+        """读取目录块, 为每个目录项构造 INode (子目录仍为惰性)"""
+        children = {}
+        for name, ino, kind in self._read_dir(node.inode_id):
+            child = self._make_inode(name, ino, self._rec(ino))
+            if kind == KIND_DIR:
+                child.size = 0
+            child.parent = node
+            children[name] = child
+        return children
+    
+    def create(self, parent, node):
+        if len(node.name.encode('utf-8')) > self.MAX_NAME or self.free_inodes == 0:
+            return False
+        ino = self._alloc_inode()
+        kind = KIND_DIR if node.is_directory else KIND_FILE
+        size = 0 if node.is_directory else node.size     # touch(size=n) leaves a sparse file
+        self._put_rec(ino, InodeRecord(kind, node.permissions, parent.inode_id,
+                                       size, node.created, node.modified))
+        node.inode_id = ino
+        self._add_entry(parent.inode_id, node.name, ino, kind)
+        return True
+    
+    def remove(self, parent, node):
+        ino = node.inode_id
+        rec = self._rec(ino)
+        self._remove_entry(parent.inode_id, node.name)
+        self._truncate(rec, 0)
+        self._put_rec(ino, InodeRecord())
+        self._clear_bit(self.inode_bitmap, self.ibm_start, ino)
+        self.free_inodes += 1
+        self._dirs.pop(ino, None)
+        self._slots.pop(ino, None)
+        del self._recs[ino]
+    
+    def read(self, node, offset=0, size=-1):
+        return self._read_range(self._rec(node.inode_id), offset, size)
+    
+    def write(self, node, data, offset=0):
+        rec = self._rec(node.inode_id)
+        self._write_range(rec, offset, data, ordered=True)
+        rec.modified = node.modified = time.time()
+        self._put_rec(node.inode_id, rec)
+        node.size = rec.size
+    
+    def truncate(self, node, size):
+        rec = self._rec(node.inode_id)
+        if size < rec.size:
+            self._truncate(rec, size)
+        else:
+            rec.size = size     # grows as a hole
+        rec.modified = node.modified = time.time()
+        self._put_rec(node.inode_id, rec)
+        node.size = rec.size
+    
+    def commit(self):
+        """一个文件系统操作结束 (日志模式下为组提交的边界)"""
+        self._release()
+        if self.journal is not None:
+            self.journal.commit()
+    
+    def op_full(self):
+        """日志模式下当前操作的事务快满时为 True (见 Journal.op_full)"""
+        return self.journal is not None and self.journal.op_full()
+    
+    def sync(self):
+        self.device.flush()
+    
+    def close(self):
+        self._release()
+        self.device.close()
+    
+    def stats(self):
+        dev = self.device.stats()
+        return {
+            'backend': "disk",
+            'image': dev['path'],
+            'device': dev,
+            'block_size': self.bs,
+            'blocks': self.num_blocks,
+            'free_blocks': self.free_blocks,
+            'inodes': self.num_inodes,
+            'free_inodes': self.free_inodes,
+            'loaded_inodes': len(self._recs),
+        }
+
+
+def open_disk(path=None, num_blocks=4096, block_size=4096, num_inodes=None, use_mmap=True,
+              cache_bytes=4 * 1024 * 1024, read_ahead=8, journal="group", group_commit=64):
+    """打开 (不存在则创建并格式化) 磁盘镜像, 返回 DiskStorage; cache_bytes=0 时不经过缓冲缓存"""
+    from .block_device import BlockDevice, BufferCache
+    if path is not None and os.path.exists(path):
+        num_blocks = None   # an existing image keeps its own size
+    device = BlockDevice(path, block_size, num_blocks, use_mmap)
+    if cache_bytes:
+        device = BufferCache(device, cache_bytes, read_ahead)
+    return DiskStorage(device, num_inodes, journal, group_commit)
@@ -1,193 +1,1198 @@
 """LZY-OS File Manager - 文件系统模块"""
+import sys
+import threading
 import time
+from collections import OrderedDict
+from itertools import count
+from fnmatch import fnmatchcase
+from types import MappingProxyType
+
+from .fs_index import MetadataIndex
+
+# shared read-only listing for directories that have no children yet
+EMPTY_DIR = MappingProxyType({})
 
 class INode:
-    """索引节点"""
-    _next_id = 1
+    """索引节点 (__slots__, 目录的子项表在加入第一个子项时才创建)
     
-    def __init__(self, name, is_dir=False, size=0, perm=0o755):
-        self.inode_id = INode._next_id
-        INode._next_id += 1
-        self.name = name
+    目录的 tree_size 是其下所有文件大小之和, 随写入/删除增量维护;
+    None 表示尚未统计 (磁盘上惰性加载的目录), 由 FileSystem.du() 补算。
+    """
+    __slots__ = ('inode_id', 'name', 'is_directory', 'size', 'permissions', 'content',
+                 'owner', 'created', 'modified', 'parent', 'tree_size')
+    _ids = count(1)     # next() is atomic, so threads never share an id
+    
+    def __init__(self, name, is_dir=False, size=0, perm=0o755, inode_id=None):
+        if inode_id is None:
+            inode_id = next(INode._ids)
+        self.inode_id = inode_id
+        # names repeat across directories (README, f0, ...), keep one copy of each
+        self.name = sys.intern(name)
         self.is_directory = is_dir
         self.size = size
         self.permissions = perm
-        self.content = {} if is_dir else b''
+        self.content = None if is_dir else b''
         self.owner = "root"
-        self.created = time.time()
-        self.modified = time.time()
+        self.created = self.modified = time.time()
         self.parent = None
+        self.tree_size = 0 if is_dir else None
     
     def __str__(self):
         t = "d" if self.is_directory else "-"
         return f"{t} {oct(self.permissions)[2:]:>4} {self.size:>6} {self.name}"
 
+class MemoryStorage:
+    """内存存储 - 文件内容直接保存在 INode.content, 进程退出即丢失"""
+    persistent = False
+    
+    def mount(self):
+        return INode("/", is_dir=True)
+    
+    def load_dir(self, node):
+        return None
+    
+    def create(self, parent, node):
+        return True
+    
+    def remove(self, parent, node):
+        pass
+    
+    def commit(self):
+        pass
+    
+    def read(self, node, offset=0, size=-1):
+        content = node.content
+        if offset == 0 and size < 0:
+            return bytes(content)
+        end = len(content) if size < 0 else offset + size
+        return bytes(content[offset:end])
+    
+    def write(self, node, data, offset=0):
+        content = node.content
+        if not isinstance(content, bytearray):
+            content = node.content = bytearray(content)
+        if offset > len(content):
+            content.extend(bytes(offset - len(content)))
+        if offset == len(content):
+            content += data
+        else:
+            content[offset:offset + len(data)] = data
+        node.size = len(content)
+        node.modified = time.time()
+    
+    def truncate(self, node, size):
+        content = node.content
+        if not isinstance(content, bytearray):
+            content = node.content = bytearray(content)
+        if size < len(content):
+            del content[size:]
+        else:
+            content.extend(bytes(size - len(content)))
+        node.size = size
+        node.modified = time.time()
+    
+    def sync(self):
+        pass
+    
+    def close(self):
+        pass
+    
+    def stats(self):
+        return {'backend': "memory"}
+
+class FileHandle:
+    """文件句柄 - 带偏移量的流式读写, 模式 r / r+ / w / a"""
+    def __init__(self, fs, node, mode="r"):
+        if mode not in ("r", "r+", "w", "a"):
+            raise ValueError(f"invalid mode: {mode}")
+        self.fs = fs
+        self.node = node
+        self.mode = mode
+        self.pos = 0
+        self.closed = False
+        if mode == "w":
+            fs._truncate_node(node, 0)
+            fs.storage.commit()
+        elif mode == "a":
+            self.pos = node.size
+    
+    def _check(self, writing):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        if writing and self.mode == "r":
+            raise ValueError("file not open for writing")
+        if not writing and self.mode in ("w", "a"):
+            raise ValueError("file not open for reading")
+    
+    def read(self, n=-1):
+        self._check(False)
+        data = self.fs._read_node(self.node, self.pos, n)
+        self.pos += len(data)
+        return data
+    
+    def write(self, data):
+        self._check(True)
+        if isinstance(data, str):
+            data = data.encode()
+        if self.mode == "a":
+            self.pos = self.node.size
+        if data:
+            self.fs._write_node(self.node, data, self.pos)
+            self.fs.storage.commit()
+            self.pos += len(data)
+        return len(data)
+    
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.node.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self.pos = offset
+        return self.pos
+    
+    def tell(self):
+        return self.pos
+    
+    def chunks(self, size=65536):
+        """从当前位置起逐块读取"""
+        while True:
+            data = self.read(size)
+            if not data:
+                return
+            yield data
+    
+    def close(self):
+        self.closed = True
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+class DentryCache:
+    """目录项缓存 - 规范化绝对路径 -> INode 的 LRU (None 为负缓存项)"""
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """返回 (命中?, INode或None)"""
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return True, entries[key]
+        self.misses += 1
+        return False, None
+    
+    def put(self, key, node):
+        entries = self.entries
+        entries[key] = node
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+    
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+    
+    def invalidate_tree(self, key):
+        """删除 key 及其所有后代路径"""
+        self.entries.pop(key, None)
+        prefix = key.rstrip("/") + "/"
+        for k in [k for k in self.entries if k.startswith(prefix)]:
+            del self.entries[k]
+    
+    def clear(self):
+        self.entries.clear()
+    
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
 class FileSystem:
     """文件系统"""
-    def __init__(self):
-        self.inodes = {}
-        self.root = INode("/", is_dir=True)
-        self.inodes[self.root.inode_id] = self.root
+    def __init__(self, dcache_size=4096, storage=None):
+        self.storage = storage if storage is not None else MemoryStorage()
+        self.root = self.storage.mount()
+        self.inode_count = 1     # inodes currently loaded in the tree
         self.cwd = self.root
+        self.cwd_path = "/"
+        self.dcache = DentryCache(dcache_size)
+        self.index = None
         self._init_dirs()
     
     def _init_dirs(self):
         for d in ["home", "bin", "etc", "tmp", "usr", "var"]:
             self.mkdir(f"/{d}")
     
+    def normalize(self, path):
+        """相对/绝对路径 -> 规范化绝对路径 (按字面处理 . 和 ..)"""
+        if not path:
+            return self.cwd_path
+        base = [] if path.startswith("/") or self.cwd_path == "/" else self.cwd_path[1:].split("/")
+        for p in path.split("/"):
+            if not p or p == ".":
+                continue
+            elif p == "..":
+                if base:
+                    base.pop()
+            else:
+                base.append(p)
+        return "/" + "/".join(base)
+    
     def resolve(self, path):
         if not path:
             return self.cwd
-        if path == "/":
+        return self._lookup(self.normalize(path))
+    
+    def _lookup(self, key):
+        if key == "/":
             return self.root
+        hit, node = self.dcache.get(key)
+        if hit:
+            return node
         
-        parts = path.strip("/").split("/")
-        cur = self.root if path.startswith("/") else self.cwd
-        
+        # walk from the nearest cached ancestor, caching every prefix on the way
+        parent_key, name = key.rsplit("/", 1)
+        hit, cur = self.dcache.get(parent_key) if parent_key else (True, self.root)
+        if hit:
+            parts, prefix = [name], parent_key
+        else:
+            parts, prefix, cur = key[1:].split("/"), "", self.root
         for p in parts:
-            if not p or p == ".":
-                continue
-            elif p == "..":
-                if cur.parent:
-                    cur = cur.parent
-            else:
-                if cur.is_directory and p in cur.content:
-                    cur = cur.content[p]
-                else:
-                    return None
+            prefix = f"{prefix}/{p}"
+            if cur is not None:
+                cur = self._dir(cur).get(p) if cur.is_directory else None
+            self.dcache.put(prefix, cur)
         return cur
     
+    def _dir(self, node):
+        """目录项表, 磁盘存储的目录在第一次访问时加载; 空目录返回共享的只读空表"""
+        if node.content is None:
+            children = self.storage.load_dir(node)
+            if not children:
+                return EMPTY_DIR
+            node.content = children
+            self.inode_count += len(children)
+        return node.content
+    
+    def _link(self, parent, name, node):
+        node.parent = parent
+        if parent.content is None:
+            parent.content = {}
+        parent.content[name] = node
+        self.inode_count += 1
+        self._add_size(parent, node.tree_size if node.is_directory else node.size)
+        if self.index is not None and not node.is_directory:
+            self.index.add(node)
+    
+    def _unlink(self, parent, name):
+        node = parent.content.pop(name)
+        if not parent.content:
+            parent.content = None
+        self.inode_count -= 1
+        if self.index is not None and not node.is_directory:
+            self.index.remove(node)
+        size = node.tree_size if node.is_directory else node.size
+        if size:
+            self._add_size(parent, -size)
+    
+    @staticmethod
+    def _add_size(node, delta):
+        """把 delta 加到 node 及其祖先的 tree_size 上 (遇到未统计的目录即停止)"""
+        while node is not None and node.tree_size is not None:
+            node.tree_size = None if delta is None else node.tree_size + delta
+            node = node.parent
+    
+    def _read_node(self, node, offset=0, size=-1):
+        return self.storage.read(node, offset, size)
+    
+    def _write_node(self, node, data, offset=0, truncate=False):
+        """写入并维护目录大小与索引; truncate=True 时文件在写入末尾处截断"""
+        old = node.size
+        self.storage.write(node, data, offset)
+        if truncate:
+            self.storage.truncate(node, offset + len(data))
+        if node.size != old:
+            self._add_size(node.parent, node.size - old)
+        if self.index is not None:
+            self.index.update(node)
+    
+    def _truncate_node(self, node, size):
+        old = node.size
+        self.storage.truncate(node, size)
+        if node.size != old:
+            self._add_size(node.parent, node.size - old)
+        if self.index is not None:
+            self.index.update(node)
+    
+    def _split(self, path):
+        """路径 -> (规范化路径, 父目录规范化路径, 文件名)"""
+        key = self.normalize(path)
+        parent_key, name = key.rsplit("/", 1)
+        return key, parent_key or "/", name
+    
     def touch(self, path, size=0, perm=0o644):
-        if "/" in path:
-            dirname, fname = path.rsplit("/", 1)
-            dirname = dirname or "/"
-        else:
-            dirname, fname = ".", path
-        
-        parent = self.resolve(dirname)
-        if parent and parent.is_directory:
-            if fname in parent.content:
-                return False
-            node = INode(fname, is_dir=False, size=size, perm=perm)
-            node.parent = parent
-            parent.content[fname] = node
-            self.inodes[node.inode_id] = node
-            return True
+        key, dirname, fname = self._split(path)
+        parent = self._lookup(dirname)
+        if parent and parent.is_directory and fname:
+            return self._create(parent, key, fname, False, size, perm) is not None
         return False
     
+    def _create(self, parent, key, name, is_dir, size, perm):
+        """在 parent 下新建节点, 返回新 INode; 已存在或存储拒绝时返回 None"""
+        if name in self._dir(parent):
+            return None
+        node = INode(name, is_dir=is_dir, size=size, perm=perm)
+        if not self.storage.create(parent, node):
+            return None
+        self._link(parent, name, node)
+        self.storage.commit()
+        self.dcache.invalidate(key)
+        return node
+    
+    def _create_files(self, parent, key, files):
+        """在目录 parent (路径 key) 下一次写入一组文件 [(名字, 权限, 内容)], 整组只提交一次
+        
+        已存在的同名文件被覆盖; 返回每个文件的 INode, 名字被目录占用或存储拒绝时为 None。
+        """
+        nodes = []
+        prefix = "" if key == "/" else key
+        for name, perm, data in files:
+            node = self._dir(parent).get(name)
+            if node is None:
+                node = INode(name, is_dir=False, size=0, perm=perm)
+                if self.storage.create(parent, node):
+                    self._link(parent, name, node)
+                    self.dcache.invalidate(f"{prefix}/{name}")
+                else:
+                    node = None
+            elif node.is_directory:
+                node = None
+            if node is not None:
+                if data:
+                    # a new file is empty: only an overwrite needs the truncate
+                    self._write_node(node, data, truncate=node.size > len(data))
+                elif node.size:
+                    self._truncate_node(node, 0)
+            nodes.append(node)
+            self._step()
+        self.storage.commit()
+        return nodes
+    
     def mkdir(self, path, parents=False, perm=0o755):
         if parents:
-            parts = path.strip("/").split("/")
-            cur_path = "" if path.startswith("/") else "."
-            for p in parts:
-                if not p:
-                    continue
-                cur_path = f"/{p}" if cur_path in ["", "/"] else (p if cur_path == "." else f"{cur_path}/{p}")
-                if not self.resolve(cur_path):
-                    self._mkdir_single(cur_path, perm)
-            return True
+            key = self.normalize(path)
+            node = self._lookup(key)
+            if node is not None:
+                return node.is_directory
+            # the lookup cached every prefix: find the first missing one, create the rest at once
+            prefixes = []
+            while key != "/" and self._lookup(key) is None:
+                prefixes.append(key)
+                key = key.rsplit("/", 1)[0] or "/"
+            return all(self.batch([("mkdir", k, perm) for k in reversed(prefixes)]))
         return self._mkdir_single(path, perm)
     
     def _mkdir_single(self, path, perm):
-        if "/" in path:
-            dirname, dname = path.rsplit("/", 1)
-            dirname = dirname or "/"
-        else:
-            dirname, dname = ".", path
-        
-        parent = self.resolve(dirname)
-        if parent and parent.is_directory:
-            if dname in parent.content:
-                return False
-            node = INode(dname, is_dir=True, perm=perm)
-            node.parent = parent
-            parent.content[dname] = node
-            self.inodes[node.inode_id] = node
-            return True
+        key, dirname, dname = self._split(path)
+        parent = self._lookup(dirname)
+        if parent and parent.is_directory and dname:
+            return self._create(parent, key, dname, True, 0, perm) is not None
         return False
     
     def ls(self, path=None):
         target = self.resolve(path) if path else self.cwd
         if not target or not target.is_directory:
             return None
-        return target.content
+        return self._dir(target)
     
     def cd(self, path):
-        target = self.resolve(path)
+        key = self.normalize(path)
+        target = self._lookup(key)
         if target and target.is_directory:
             self.cwd = target
+            self.cwd_path = key
             return True
         return False
     
     def rm(self, path):
-        if "/" in path:
-            dirname, fname = path.rsplit("/", 1)
-            dirname = dirname or "/"
-        else:
-            dirname, fname = ".", path
-        
-        parent = self.resolve(dirname)
-        if parent and parent.is_directory and fname in parent.content:
-            node = parent.content[fname]
-            if not node.is_directory:
-                del parent.content[fname]
-                del self.inodes[node.inode_id]
-                return True
+        key, dirname, fname = self._split(path)
+        parent = self._lookup(dirname)
+        if parent and parent.is_directory:
+            return self._remove_file(parent, key, fname)
         return False
     
+    def _remove_file(self, parent, key, name):
+        node = self._dir(parent).get(name)
+        if node is None or node.is_directory:
+            return False
+        # unlink first: removing it from storage frees the inode number for reuse
+        self._unlink(parent, name)
+        self.storage.remove(parent, node)
+        self.storage.commit()
+        self.dcache.invalidate(key)
+        return True
+    
     def rmdir(self, path, recursive=False):
-        target = self.resolve(path)
+        key = self.normalize(path)
+        target = self._lookup(key)
         if not target or not target.is_directory or target == self.root:
             return False
-        
-        if target.content and not recursive:
+        return self._remove_dir(key, target, recursive)
+    
+    def _remove_dir(self, key, target, recursive):
+        if self._dir(target) and not recursive:
             return False
         
         if recursive:
-            self._rm_recursive(target)
+            self._rm_recursive(key, target)
         
         parent = target.parent
         if parent:
-            del parent.content[target.name]
-            del self.inodes[target.inode_id]
+            self._unlink(parent, target.name)
+            self.storage.remove(parent, target)
+        self.storage.commit()
+        self.dcache.invalidate_tree(key)
         return True
     
-    def _rm_recursive(self, node):
-        if node.is_directory:
-            for child in list(node.content.values()):
-                self._rm_recursive(child)
-                del self.inodes[child.inode_id]
-            node.content.clear()
+    def _rm_recursive(self, key, node):
+        # post-order: every child is gone before its directory; node itself is kept
+        for _, child, depth in self._walk(key, node, "post"):
+            if depth:
+                self.inode_count -= 1
+                if self.index is not None and not child.is_directory:
+                    self.index.remove(child)
+                self.storage.remove(child.parent, child)
+                self._step()
+            if child.is_directory:
+                child.content = None
+    
+    def _step(self):
+        """组合操作 (rm -r, 成组写入) 的两步之间: 存储的事务快满时先提交已完成的部分"""
+        full = getattr(self.storage, 'op_full', None)
+        if full is not None and full():
+            self.storage.commit()
     
     def write(self, path, content):
         node = self.resolve(path)
         if node and not node.is_directory:
-            node.content = content.encode() if isinstance(content, str) else content
-            node.size = len(node.content)
-            node.modified = time.time()
-            return True
+            data = content.encode() if isinstance(content, str) else content
+            return self._replace(node, data)
         return False
     
+    def _replace(self, node, data):
+        self._write_node(node, data, truncate=True)
+        self.storage.commit()
+        return True
+    
+    # ---- batched namespace operations ------------------------------------
+    BATCH_OPS = ("mkdir", "touch", "write", "rm")
+    
+    def batch(self, ops):
+        """依次执行一组操作, 全部成功或全部撤销
+        
+        每个操作是 ("mkdir", path[, perm]) / ("touch", path[, size[, perm]]) /
+        ("write", path, data) / ("rm", path)。父目录在批内只解析一次, 批内新建的
+        目录直接作为后续操作的父目录。返回每个操作的结果: 全部成功时都为 True;
+        某一步失败时, 之前的操作按相反顺序撤销, 该步为 False, 之后的为 None。
+        """
+        for op in ops:
+            if op[0] not in self.BATCH_OPS:
+                raise ValueError(f"unknown batch operation: {op[0]}")
+        dirs = {}       # parent path -> directory INode resolved or created in this batch
+        created = set()     # files created in this batch: undoing the create is enough
+        undo = []
+        results = [None] * len(ops)
+        for i, op in enumerate(ops):
+            results[i] = self._batch_op(op, dirs, created, undo)
+            if not results[i]:
+                self._rollback(undo)
+                break
+        return results
+    
+    def _batch_op(self, op, dirs, created, undo):
+        kind, key = op[0], op[1]
+        if key.startswith("/") and "//" not in key and "/." not in key and not key.endswith("/"):
+            # scripted paths are usually normalized already: skip re-parsing them
+            dirname, _, name = key.rpartition("/")
+            dirname = dirname or "/"
+        else:
+            key, dirname, name = self._split(key)
+        parent = dirs.get(dirname)
+        if parent is None:
+            parent = self._lookup(dirname)
+            if parent is None or not parent.is_directory:
+                return False
+            dirs[dirname] = parent
+        if not name:
+            return False
+        if kind == "mkdir" or kind == "touch":
+            if kind == "mkdir":
+                size, perm = 0, op[2] if len(op) > 2 else 0o755
+            else:
+                size = op[2] if len(op) > 2 else 0
+                perm = op[3] if len(op) > 3 else 0o644
+            node = self._create(parent, key, name, kind == "mkdir", size, perm)
+            if node is None:
+                return False
+            if node.is_directory:
+                dirs[key] = node
+            else:
+                created.add(node)
+            undo.append(("create", parent, key, name, None))
+            return True
+        node = self._dir(parent).get(name)
+        if node is None or node.is_directory:
+            return False
+        fresh = node in created
+        # keep what the undo needs before changing anything
+        saved = None if fresh else (node.permissions, bytes(self._read_node(node)))
+        if kind == "write":
+            data = op[2].encode() if isinstance(op[2], str) else op[2]
+            if not self._replace(node, data):
+                return False
+            if not fresh:
+                undo.append(("write", parent, key, name, saved))
+            return True
+        if not self._remove_file(parent, key, name):
+            return False
+        if fresh:
+            created.discard(node)
+        else:
+            undo.append(("rm", parent, key, name, saved))
+        return True
+    
+    def _rollback(self, undo):
+        """按相反顺序撤销 batch 中已完成的操作 (删除的文件以新 inode 重建)"""
+        while undo:
+            kind, parent, key, name, saved = undo.pop()
+            # look the node up again: a later rm in the batch may have replaced it
+            node = self._dir(parent).get(name)
+            if kind == "create":
+                if node is None:
+                    continue
+                if node.is_directory:
+                    # its children were created later, so they are already gone
+                    self._remove_dir(key, node, False)
+                else:
+                    self._remove_file(parent, key, name)
+            elif kind == "write":
+                if node is not None:
+                    self._replace(node, saved[1])
+            else:
+                node = self._create(parent, key, name, False, 0, saved[0])
+                if node is not None and saved[1]:
+                    self._write_node(node, saved[1])
+                    self.storage.commit()
+    
+    # ---- tree walking -------------------------------------------------
+    def walk(self, path=None, order="pre", prune=None):
+        """迭代遍历子树, 产生 (路径, INode, 深度)
+        
+        order 为 "pre" (目录先于子项) 或 "post" (子项先于目录);
+        prune(path, node, depth) 为真时仍产生该目录, 但不进入它。
+        """
+        key = self.normalize(path) if path else self.cwd_path
+        node = self._lookup(key)
+        if node is None:
+            return iter(())
+        return self._walk(key, node, order, prune)
+    
+    def _walk(self, key, node, order="pre", prune=None):
+        if order not in ("pre", "post"):
+            raise ValueError(f"unknown walk order: {order}")
+        post = order == "post"
+        stack = [(key, node, 0, False)]
+        while stack:
+            path, cur, depth, expanded = stack.pop()
+            if expanded or not cur.is_directory or (prune is not None and prune(path, cur, depth)):
+                yield path, cur, depth
+                continue
+            if post:
+                stack.append((path, cur, depth, True))
+            else:
+                yield path, cur, depth
+            base = "" if path == "/" else path
+            for name, child in reversed(self._children(cur)):
+                stack.append((f"{base}/{name}", child, depth + 1, False))
+    
+    def _children(self, node):
+        return list(self._dir(node).items())
+    
+    def find(self, path=None, name=None, kind=None, min_size=None, max_size=None,
+             newer=None, older=None, max_depth=None):
+        """按条件查找, 产生匹配的路径
+        
+        name 为通配符; kind 为 'f' 或 'd'; 大小范围含两端;
+        newer/older 为修改时间下限/上限 (时间戳); max_depth 限制深度。
+        """
+        prune = None if max_depth is None else (lambda p, n, d: d >= max_depth)
+        for p, node, depth in self.walk(path, "pre", prune):
+            if name is not None and not fnmatchcase(node.name, name):
+                continue
+            if kind is not None and node.is_directory != (kind == 'd'):
+                continue
+            if min_size is not None and node.size < min_size:
+                continue
+            if max_size is not None and node.size > max_size:
+                continue
+            if newer is not None and node.modified < newer:
+                continue
+            if older is not None and node.modified > older:
+                continue
+            yield p
+    
+    # ---- metadata index -------------------------------------------------
+    def enable_index(self):
+        """建立元数据索引 (遍历整棵树一次), 之后随 touch/write/rm/rmdir 增量维护"""
+        index = MetadataIndex()
+        for _, node, _ in self._walk("/", self.root):
+            if not node.is_directory:
+                index.add(node)
+        self.index = index
+        return index
+    
+    def _path_of(self, node):
+        parts = []
+        while node.parent is not None:
+            parts.append(node.name)
+            node = node.parent
+        return "/" + "/".join(reversed(parts))
+    
+    def search(self, path=None, name=None, min_size=None, max_size=None, newer=None, older=None):
+        """按名字/大小/修改时间查找文件, 条件同 find; 开启索引时不遍历目录树"""
+        if self.index is None:
+            return self.find(path, name, 'f', min_size, max_size, newer, older)
+        key = self.normalize(path) if path else self.cwd_path
+        top = self._lookup(key)
+        if top is None:
+            return iter(())
+        return self._query(top, name, min_size, max_size, newer, older)
+    
+    def _query(self, top, name, min_size, max_size, newer, older):
+        for node in self.index.query(name, min_size, max_size, newer, older):
+            if top is not self.root:
+                cur = node
+                while cur is not None and cur is not top:
+                    cur = cur.parent
+                if cur is None:
+                    continue
+            yield self._path_of(node)
+    
+    # ---- compression ----------------------------------------------------
+    def set_compression(self, path, codec, level=None):
+        """在文件或目录上设置压缩策略并按新策略重新压缩其下的文件, 返回重新压缩的文件数
+        
+        codec 为 "zlib"/"lzma"/"none", None 表示改为继承上级目录的策略;
+        路径不存在或存储不支持压缩时返回 None。
+        """
+        key = self.normalize(path)
+        node = self._lookup(key)
+        set_policy = getattr(self.storage, 'set_policy', None)
+        if node is None or set_policy is None:
+            return None
+        set_policy(node, codec, level)
+        repacked = 0
+        for _, cur, _ in self._walk(key, node):
+            if not cur.is_directory and self.storage.repack(cur):
+                repacked += 1
+        self.storage.commit()
+        return repacked
+    
+    def du(self, path=None):
+        """子树中文件大小之和; 已统计的目录为 O(1), 否则只补算未统计的部分"""
+        key = self.normalize(path) if path else self.cwd_path
+        node = self._lookup(key)
+        if node is None:
+            return None
+        if not node.is_directory:
+            return node.size
+        if node.tree_size is None:
+            known = lambda p, n, d: n.tree_size is not None
+            for _, cur, _ in self._walk(key, node, "post", known):
+                if cur.is_directory and cur.tree_size is None:
+                    cur.tree_size = sum(c.tree_size if c.is_directory else c.size
+                                        for c in self._dir(cur).values())
+        return node.tree_size
+    
+    def open(self, path, mode="r", create=True):
+        """打开文件句柄; w/a 模式下文件不存在时创建 (create=False 则返回 None)"""
+        node = self.resolve(path)
+        if node is None and mode in ("w", "a") and create and self.touch(path):
+            node = self.resolve(path)
+        if node is None or node.is_directory:
+            return None
+        return FileHandle(self, node, mode)
+    
+    def iter_chunks(self, path, size=65536):
+        """逐块读取文件内容的生成器"""
+        handle = self.open(path)
+        if handle is None:
+            return
+        with handle:
+            for chunk in handle.chunks(size):
+                yield chunk
+    
     def read(self, path):
         node = self.resolve(path)
         if node and not node.is_directory:
-            return node.content.decode() if isinstance(node.content, bytes) else node.content
+            data = self._read_node(node)
+            return bytes(data).decode() if isinstance(data, (bytes, memoryview)) else data
         return None
     
     def pwd(self):
-        if self.cwd == self.root:
-            return "/"
-        parts = []
-        cur = self.cwd
-        while cur and cur != self.root:
-            parts.append(cur.name)
-            cur = cur.parent
-        return "/" + "/".join(reversed(parts))
+        return self.cwd_path
+    
+    def sync(self):
+        self.storage.sync()
+    
+    def close(self):
+        self.storage.close()
+
+class RWLock:
+    """读写锁 - 读者共享, 写者独占且优先; 可重入, 持有写锁的线程也可以再加读锁"""
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None     # ident of the thread holding the write lock
+        self._depth = 0
+        self._waiting = 0
+        self._local = threading.local()
+        self.acquires = 0
+        self.contended = 0
+    
+    def acquire_read(self):
+        if self._writer == threading.get_ident():
+            self._depth += 1
+            return
+        local = self._local
+        held = getattr(local, 'reads', 0)
+        if held:
+            # nested read: never queue behind a waiting writer, that would deadlock
+            local.reads = held + 1
+            return
+        with self._cond:
+            self.acquires += 1
+            if self._writer is not None or self._waiting:
+                self.contended += 1
+                while self._writer is not None or self._waiting:
+                    self._cond.wait()
+            self._readers += 1
+        local.reads = 1
+    
+    def release_read(self):
+        if self._writer == threading.get_ident():
+            self._depth -= 1
+            return
+        local = self._local
+        local.reads -= 1
+        if not local.reads:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+    
+    def acquire_write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._depth += 1
+            return
+        if getattr(self._local, 'reads', 0):
+            raise RuntimeError("cannot upgrade a read lock to a write lock")
+        with self._cond:
+            self.acquires += 1
+            if self._writer is not None or self._readers:
+                self.contended += 1
+                self._waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._waiting -= 1
+            self._writer = me
+            self._depth = 1
+    
+    def release_write(self):
+        self._depth -= 1
+        if not self._depth:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+class ConcurrentDentryCache(DentryCache):
+    """线程安全的目录项缓存 - 互斥锁保护 LRU, 失效代数防止并发查找写回过期项"""
+    def __init__(self, capacity=4096):
+        super().__init__(capacity)
+        self.lock = threading.Lock()
+        self.generation = 0
+    
+    def get(self, key):
+        with self.lock:
+            return super().get(key)
+    
+    def put(self, key, node, generation=None):
+        """generation 为查找开始时的代数; 期间有过失效则放弃写入"""
+        with self.lock:
+            if generation is None or generation == self.generation:
+                super().put(key, node)
+    
+    def invalidate(self, key):
+        with self.lock:
+            self.generation += 1
+            super().invalidate(key)
+    
+    def invalidate_tree(self, key):
+        with self.lock:
+            self.generation += 1
+            super().invalidate_tree(key)
+    
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            super().clear()
+    
+    def stats(self):
+        with self.lock:
+            return super().stats()
+
+class LockedStorage:
+    """存储后端的加锁包装 - 分配表、块缓存和日志都不是线程安全的, 逐个调用串行化"""
+    def __init__(self, storage):
+        self.storage = storage
+        self.lock = threading.RLock()
+    
+    def __getattr__(self, name):
+        attr = getattr(self.storage, name)
+        if not callable(attr):
+            return attr
+        
+        # backend-specific methods (set_policy, repack, ...) are serialized too
+        def locked(*args, **kwargs):
+            with self.lock:
+                return attr(*args, **kwargs)
+        return locked
+    
+    def mount(self):
+        with self.lock:
+            return self.storage.mount()
+    
+    def load_dir(self, node):
+        with self.lock:
+            return self.storage.load_dir(node)
+    
+    def create(self, parent, node):
+        with self.lock:
+            return self.storage.create(parent, node)
+    
+    def remove(self, parent, node):
+        with self.lock:
+            return self.storage.remove(parent, node)
+    
+    def commit(self):
+        with self.lock:
+            self.storage.commit()
+    
+    def read(self, node, offset=0, size=-1):
+        with self.lock:
+            return self.storage.read(node, offset, size)
+    
+    def write(self, node, data, offset=0):
+        with self.lock:
+            self.storage.write(node, data, offset)
+    
+    def truncate(self, node, size):
+        with self.lock:
+            self.storage.truncate(node, size)
+    
+    def sync(self):
+        with self.lock:
+            self.storage.sync()
+    
+    def close(self):
+        with self.lock:
+            self.storage.close()
+    
+    def stats(self):
+        with self.lock:
+            return self.storage.stats()
+
+class ConcurrentFileSystem(FileSystem):
+    """并发文件系统 - 可在多个线程间共享
+    
+    目录按 inode 号分到 stripes 把读写锁上。路径查找逐级只持有当前目录的读锁,
+    彼此并行; 创建/删除/写入只对所修改的目录 (及被删除或写入的节点) 加写锁,
+    多把锁按编号顺序获取, 持锁期间不再做路径查找, 因此不会死锁。
+    目录大小、inode 计数和元数据索引由 meta_lock 保护, 存储调用由 LockedStorage
+    串行化。每个线程有自己的当前目录 (初始为 /)。
+    
+    锁顺序: 目录锁 (按编号) -> meta_lock -> 存储锁 -> 目录项缓存锁
+    """
+    def __init__(self, dcache_size=4096, storage=None, stripes=64):
+        self._local = threading.local()
+        self.locks = [RWLock() for _ in range(stripes)]
+        self.meta_lock = threading.RLock()
+        super().__init__(dcache_size, LockedStorage(storage if storage is not None else MemoryStorage()))
+        self.dcache = ConcurrentDentryCache(dcache_size)
+    
+    # ---- per-thread working directory ----------------------------------
+    @property
+    def cwd(self):
+        return getattr(self._local, 'cwd', None) or self.root
+    
+    @cwd.setter
+    def cwd(self, node):
+        self._local.cwd = node
+    
+    @property
+    def cwd_path(self):
+        return getattr(self._local, 'cwd_path', "/")
+    
+    @cwd_path.setter
+    def cwd_path(self, path):
+        self._local.cwd_path = path
+    
+    # ---- locking helpers -----------------------------------------------
+    def _stripe(self, node):
+        return self.locks[node.inode_id % len(self.locks)]
+    
+    def _lock(self, nodes=None, write=True):
+        """按编号顺序锁住 nodes 所在的条带 (nodes 为 None 时锁住全部), 返回锁列表"""
+        n = len(self.locks)
+        ids = range(n) if nodes is None else sorted({node.inode_id % n for node in nodes})
+        locks = [self.locks[i] for i in ids]
+        for lock in locks:
+            lock.acquire_write() if write else lock.acquire_read()
+        return locks
+    
+    @staticmethod
+    def _unlock(locks, write=True):
+        for lock in reversed(locks):
+            lock.release_write() if write else lock.release_read()
+    
+    def _attached(self, node):
+        """node 是否仍挂在根目录下 (查找与加锁之间它可能已被删除)"""
+        while node is not self.root:
+            parent = node.parent
+            if parent is None or parent.content is None or parent.content.get(node.name) is not node:
+                return False
+            node = parent
+        return True
+    
+    def lock_stats(self):
+        acquires = sum(l.acquires for l in self.locks)
+        contended = sum(l.contended for l in self.locks)
+        return {
+            'stripes': len(self.locks),
+            'acquires': acquires,
+            'contended': contended,
+            'contention_rate': contended / acquires if acquires else 0.0,
+        }
+    
+    # ---- lookups: one read lock at a time ------------------------------
+    def _lookup(self, key):
+        if key == "/":
+            return self.root
+        dcache = self.dcache
+        hit, node = dcache.get(key)
+        if hit:
+            return node
+        generation = dcache.generation
+        parent_key, name = key.rsplit("/", 1)
+        hit, cur = dcache.get(parent_key) if parent_key else (True, self.root)
+        if hit:
+            parts, prefix = [name], parent_key
+        else:
+            parts, prefix, cur = key[1:].split("/"), "", self.root
+        for p in parts:
+            prefix = f"{prefix}/{p}"
+            if cur is not None:
+                if cur.is_directory:
+                    lock = self._stripe(cur)
+                    lock.acquire_read()
+                    try:
+                        cur = self._dir(cur).get(p)
+                    finally:
+                        lock.release_read()
+                else:
+                    cur = None
+            dcache.put(prefix, cur, generation)
+        return cur
+    
+    def _dir(self, node):
+        # loading a directory from disk mutates the tree, do it once under meta_lock
+        if node.content is None:
+            with self.meta_lock:
+                # a lookup may still hold a directory another thread just deleted;
+                # its inode number may already belong to a new directory
+                if not self._attached(node):
+                    return EMPTY_DIR
+                return super()._dir(node)
+        return node.content
+    
+    def _children(self, node):
+        lock = self._stripe(node)
+        lock.acquire_read()
+        try:
+            return super()._children(node)
+        finally:
+            lock.release_read()
+    
+    def _read_node(self, node, offset=0, size=-1):
+        lock = self._stripe(node)
+        lock.acquire_read()
+        try:
+            return self.storage.read(node, offset, size)
+        finally:
+            lock.release_read()
+    
+    def ls(self, path=None):
+        target = self.resolve(path) if path else self.cwd
+        if not target or not target.is_directory:
+            return None
+        lock = self._stripe(target)
+        lock.acquire_read()
+        try:
+            return dict(self._dir(target))
+        finally:
+            lock.release_read()
+    
+    # ---- updates: write-lock only what changes -------------------------
+    def _create(self, parent, key, name, is_dir, size, perm):
+        locks = self._lock((parent,))
+        try:
+            if not self._attached(parent):
+                return None
+            return super()._create(parent, key, name, is_dir, size, perm)
+        finally:
+            self._unlock(locks)
+    
+    def _create_files(self, parent, key, files):
+        # the new files' stripes are unknown until they exist: take every stripe, in order
+        locks = self._lock(None)
+        try:
+            if not self._attached(parent):
+                return [None] * len(files)
+            return super()._create_files(parent, key, files)
+        finally:
+            self._unlock(locks)
+    
+    def batch(self, ops):
+        # other writers must not see, or change, what a failing batch is about to undo:
+        # hold every stripe until the batch has finished or been rolled back
+        locks = self._lock(None)
+        try:
+            return super().batch(ops)
+        finally:
+            self._unlock(locks)
+    
+    def _remove_file(self, parent, key, name):
+        lock = self._stripe(parent)
+        lock.acquire_read()
+        try:
+            node = self._dir(parent).get(name)
+        finally:
+            lock.release_read()
+        if node is None:
+            return False
+        locks = self._lock((parent, node))
+        try:
+            if not self._attached(node):
+                return False
+            return super()._remove_file(parent, key, name)
+        finally:
+            self._unlock(locks)
+    
+    def _remove_dir(self, key, target, recursive):
+        # a recursive delete may touch any stripe below target, so it takes them all
+        locks = self._lock(None if recursive else (target.parent, target))
+        try:
+            if not self._attached(target):
+                return False
+            return super()._remove_dir(key, target, recursive)
+        finally:
+            self._unlock(locks)
+    
+    def _rm_recursive(self, key, node):
+        with self.meta_lock:
+            super()._rm_recursive(key, node)
+    
+    def _link(self, parent, name, node):
+        with self.meta_lock:
+            super()._link(parent, name, node)
+    
+    def _unlink(self, parent, name):
+        with self.meta_lock:
+            super()._unlink(parent, name)
+    
+    def _replace(self, node, data):
+        locks = self._lock((node,))
+        try:
+            if not self._attached(node):
+                return False
+            return super()._replace(node, data)
+        finally:
+            self._unlock(locks)
+    
+    def _write_node(self, node, data, offset=0, truncate=False):
+        locks = self._lock((node,))
+        try:
+            with self.meta_lock:
+                super()._write_node(node, data, offset, truncate)
+        finally:
+            self._unlock(locks)
+    
+    def _truncate_node(self, node, size):
+        locks = self._lock((node,))
+        try:
+            with self.meta_lock:
+                super()._truncate_node(node, size)
+        finally:
+            self._unlock(locks)
+    
+    # ---- whole-tree operations -----------------------------------------
+    def du(self, path=None):
+        # back-filling sizes needs a stable subtree: hold every stripe for reading
+        locks = self._lock(None, write=False)
+        try:
+            with self.meta_lock:
+                return super().du(path)
+        finally:
+            self._unlock(locks, write=False)
+    
+    def set_compression(self, path, codec, level=None):
+        # no file may be removed while its contents are being recompressed
+        locks = self._lock(None, write=False)
+        try:
+            return super().set_compression(path, codec, level)
+        finally:
+            self._unlock(locks, write=False)
+    
+    def enable_index(self):
+        locks = self._lock(None, write=False)
+        try:
+            with self.meta_lock:
+                return super().enable_index()
+        finally:
+            self._unlock(locks, write=False)
+    
+    def _query(self, top, name, min_size, max_size, newer, older):
+        with self.meta_lock:
+            return iter(list(super()._query(top, name, min_size, max_size, newer, older)))
 
 class FileManager:
     """文件管理器"""
-    def __init__(self):
-        self.fs = FileSystem()
+    def __init__(self, storage=None, concurrent=False):
+        self.fs = ConcurrentFileSystem(storage=storage) if concurrent else FileSystem(storage=storage)
     
     def ls(self, path=None):
         contents = self.fs.ls(path)
@@ -218,15 +1223,123 @@ class FileManager:
     def rmdir(self, path, recursive=False):
         return self.fs.rmdir(path, recursive=recursive)
     
+    def find(self, path=None, **criteria):
+        return self.fs.find(path, **criteria)
+    
+    def search(self, path=None, **criteria):
+        return self.fs.search(path, **criteria)
+    
+    def batch(self, ops):
+        return self.fs.batch(ops)
+    
+    def compress(self, path, codec, level=None):
+        return self.fs.set_compression(path, codec, level)
+    
+    def du(self, path=None, summary=False):
+        """每个目录一行 "大小  路径" (子目录在前); summary 时只输出 path 本身"""
+        key = self.fs.normalize(path) if path else self.fs.pwd()
+        total = self.fs.du(key)
+        if total is None:
+            return None
+        if summary or not self.fs.resolve(key).is_directory:
+            return f"{total:<10} {key}"
+        lines = []
+        for p, node, _ in self.fs.walk(key, "post"):
+            if node.is_directory:
+                lines.append(f"{self.fs.du(p):<10} {p}")
+        return "\n".join(lines)
+    
+    def tree(self, path=None, max_depth=None):
+        key = self.fs.normalize(path) if path else self.fs.pwd()
+        root = self.fs.resolve(key)
+        if root is None:
+            return None
+        prune = None if max_depth is None else (lambda p, n, d: d >= max_depth)
+        lines = [key]
+        last_names = {}     # id(dir) -> name of its last entry
+        tails = []          # tails[d]: whether the ancestor at depth d+1 was a last entry
+        dirs = files = 0
+        for _, node, depth in self.fs.walk(key, "pre", prune):
+            if not depth:
+                continue
+            parent = node.parent
+            last = last_names.get(id(parent))
+            if last is None:
+                last = last_names[id(parent)] = list(parent.content)[-1]
+            is_last = node.name == last
+            del tails[depth - 1:]
+            prefix = "".join("    " if t else "│   " for t in tails)
+            lines.append(f"{prefix}{'└── ' if is_last else '├── '}{node.name}{'/' if node.is_directory else ''}")
+            tails.append(is_last)
+            if node.is_directory:
+                dirs += 1
+            else:
+                files += 1
+        lines.append(f"\n{dirs} directories, {files} files")
+        return "\n".join(lines)
+    
     def cat(self, path):
         return self.fs.read(path)
     
-    def echo(self, path, content):
-        return self.fs.write(path, content)
+    def cat_chunks(self, path, size=65536):
+        return self.fs.iter_chunks(path, size)
+    
+    def open(self, path, mode="r"):
+        return self.fs.open(path, mode)
+    
+    def echo(self, path, content, append=False):
+        if not append:
+            # one storage transaction: truncate and write together
+            return self.fs.write(path, content)
+        handle = self.fs.open(path, "a", create=False)
+        if handle is None:
+            return False
+        with handle:
+            handle.write(content)
+        return True
+    
+    def sync(self):
+        self.fs.sync()
+    
+    def close(self):
+        self.fs.close()
     
     def get_status(self):
         lines = ["File System Status"]
         lines.append("-" * 30)
         lines.append(f"cwd: {self.fs.pwd()}")
-        lines.append(f"inodes: {len(self.fs.inodes)}")
+        lines.append(f"inodes: {self.fs.inode_count}")
+        dc = self.fs.dcache.stats()
+        lines.append(f"dcache: {dc['entries']}/{dc['capacity']}  hit: {dc['hit_rate']*100:.1f}%")
+        if isinstance(self.fs, ConcurrentFileSystem):
+            lk = self.fs.lock_stats()
+            lines.append(f"locks: {lk['stripes']} rw stripes  acquires: {lk['acquires']}  "
+                         f"contended: {lk['contention_rate']*100:.2f}%")
+        st = self.fs.storage.stats()
+        if self.fs.index is not None:
+            ix = self.fs.index.stats()
+            lines.append(f"index: {ix['files']} files  names: {ix['names']}  "
+                         f"extensions: {ix['extensions']}  updates: {ix['updates']}")
+        lines.append(f"storage: {st['backend']}")
+        if st['backend'] == "dedup":
+            lines.append(f"dedup: {st['dedup_ratio']:.2f}x  saved: {st['bytes_saved']} bytes  "
+                         f"chunks: {st['unique_chunks']}/{st['chunks']} unique ({st['chunking']})")
+            lines.append(f"stored: {st['stored_bytes']}/{st['logical_bytes']} bytes  cow: {st['cow_bytes']} bytes")
+        if st['backend'] == "compressed":
+            lines.append(f"compression: {st['compression_ratio']:.2f}x  saved: {st['bytes_saved']} bytes  "
+                         f"policy: {st['policy']} (+{st['policies']} set)  packed: {st['packed_files']} files")
+            lines.append(f"stored: {st['stored_bytes']}/{st['logical_bytes']} bytes  "
+                         f"zcache: {st['cache_bytes']}/{st['cache_capacity']} bytes in {st['cache_files']} files  "
+                         f"hit: {st['hits']}/{st['hits'] + st['misses']} ({st['hit_rate']*100:.1f}%)")
+        if st['backend'] == "disk":
+            lines.append(f"image: {st['image']}  block: {st['block_size']}B")
+            lines.append(f"blocks: {st['blocks'] - st['free_blocks']}/{st['blocks']} used  "
+                         f"inodes: {st['inodes'] - st['free_inodes']}/{st['inodes']} used")
+            dev = st['device']
+            if 'hits' in dev:
+                lines.append(f"bcache: {dev['cache_blocks']}/{dev['cache_capacity']} blocks  dirty: {dev['dirty']}  "
+                             f"hit: {dev['hits']}/{dev['hits'] + dev['misses']} ({dev['hit_rate']*100:.1f}%)")
+            if 'journal_blocks' in dev:
+                lines.append(f"journal: {dev['journal_used']}/{dev['journal_blocks']} blocks  group: {dev['group_size']}  "
+                             f"commits: {dev['commits']}  checkpoints: {dev['checkpoints']}  replayed: {dev['replayed']}")
         return "\n".join(lines)
@@ -0,0 +1,304 @@
+"""LZY-OS FS Index - 文件元数据二级索引"""
+from bisect import bisect_left, bisect_right, insort
+from fnmatch import fnmatchcase
+
+_LO = float('-inf')
+_HI = float('inf')
+
+
+class SortedIndex:
+    """有序索引 - 分桶的有序列表, 插入/删除约 O(√n), 范围查询 O(log n + k)
+    
+    元素为 (key, id) 元组, id 唯一, 因此同一 key 可以有多个元素。
+    """
+    LOAD = 512
+    
+    def __init__(self):
+        self._buckets = []
+        self._maxes = []
+        self._len = 0
+    
+    def __len__(self):
+        return self._len
+    
+    def add(self, item):
+        buckets, maxes = self._buckets, self._maxes
+        if not buckets:
+            buckets.append([item])
+            maxes.append(item)
+            self._len = 1
+            return
+        if item > maxes[-1]:
+            # mtimes of written files are "now": append to the last bucket
+            i = len(maxes) - 1
+            bucket = buckets[i]
+            bucket.append(item)
+        else:
+            i = bisect_left(maxes, item)
+            bucket = buckets[i]
+            insort(bucket, item)
+        maxes[i] = bucket[-1]
+        if len(bucket) > 2 * self.LOAD:
+            half = bucket[self.LOAD:]
+            del bucket[self.LOAD:]
+            buckets.insert(i + 1, half)
+            maxes[i] = bucket[-1]
+            maxes.insert(i + 1, half[-1])
+        self._len += 1
+    
+    def reset(self, items):
+        """用已排序的 items 整体重建"""
+        load = self.LOAD
+        self._buckets = [items[i:i + load] for i in range(0, len(items), load)]
+        self._maxes = [b[-1] for b in self._buckets]
+        self._len = len(items)
+    
+    def replace(self, old, new):
+        """把 old 换成 new; new 仍落在 old 所在的桶里时只在桶内移动"""
+        buckets, maxes = self._buckets, self._maxes
+        i = bisect_left(maxes, old)
+        bucket = buckets[i]
+        last = i == len(buckets) - 1
+        if not (bucket[0] <= new and (new <= maxes[i] or last)) or len(bucket) == 1:
+            self.remove(old)
+            self.add(new)
+            return
+        j = bisect_left(bucket, old)
+        if bucket[j] != old:
+            raise KeyError(old)
+        del bucket[j]
+        if new >= bucket[-1]:
+            # a rewritten file's new mtime is the newest: stays at the end
+            bucket.append(new)
+        else:
+            insort(bucket, new)
+        maxes[i] = bucket[-1]
+    
+    def remove(self, item):
+        buckets, maxes = self._buckets, self._maxes
+        i = bisect_left(maxes, item)
+        bucket = buckets[i]
+        j = bisect_left(bucket, item)
+        if bucket[j] != item:
+            raise KeyError(item)
+        del bucket[j]
+        if bucket:
+            maxes[i] = bucket[-1]
+        else:
+            del buckets[i]
+            del maxes[i]
+        self._len -= 1
+    
+    def _bounds(self, lo, hi):
+        """返回 [lo, hi] 范围的 (起始桶, 桶内起点, 结束桶, 桶内终点)"""
+        buckets, maxes = self._buckets, self._maxes
+        first = (_LO if lo is None else lo,)
+        last = (_HI if hi is None else hi, _HI)
+        i = bisect_left(maxes, first)
+        j = bisect_left(buckets[i], first) if i < len(buckets) else 0
+        k = bisect_right(maxes, last)
+        m = bisect_right(buckets[k], last) if k < len(buckets) else 0
+        return i, j, k, m
+    
+    def count(self, lo=None, hi=None):
+        """key 落在 [lo, hi] 中的元素个数 (只数桶长度, 不遍历元素)"""
+        if not self._buckets:
+            return 0
+        i, j, k, m = self._bounds(lo, hi)
+        if i > k or (i == k and j >= m):
+            return 0
+        return sum(len(b) for b in self._buckets[i:k]) - j + m
+    
+    def irange(self, lo=None, hi=None):
+        """按 key 升序产生 [lo, hi] 范围内的元素"""
+        if not self._buckets:
+            return
+        i, j, k, m = self._bounds(lo, hi)
+        buckets = self._buckets
+        while i < k:
+            for item in buckets[i][j:]:
+                yield item
+            i += 1
+            j = 0
+        if k < len(buckets):
+            for item in buckets[k][j:m]:
+                yield item
+
+
+class MetadataIndex:
+    """文件元数据索引 - 名字/扩展名倒排表 + 按大小、修改时间排序的索引
+    
+    只索引普通文件; 由 FileSystem 在创建、写入、截断、删除时维护。
+    新建和改动过的文件只记入 dirty 表, 到下一次查询时才批量并入倒排表和有序索引,
+    所以创建/写入路径上只有两次字典操作; 查询之前就被删除的文件从不进入索引。
+    """
+    def __init__(self):
+        self.entries = {}       # inode_id -> INode
+        self._keys = {}         # inode_id -> (size, mtime) of files merged into the indexes
+        self.by_name = {}       # name -> {inode_id}
+        self.by_ext = {}        # extension -> {inode_id}
+        self.by_size = SortedIndex()
+        self.by_mtime = SortedIndex()
+        self._dirty = {}        # inode_id -> INode that is new or changed since the last flush
+        self.updates = 0
+        self.flushes = 0
+    
+    @staticmethod
+    def ext_of(name):
+        # "a.tar.log" -> "log", ".log" -> "log", "log" -> ""
+        return name.rpartition('.')[2] if '.' in name else ''
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    @staticmethod
+    def _ids(value):
+        """倒排表的值: 单个 inode_id 或多个 inode_id 的集合"""
+        if value is None:
+            return ()
+        return value if type(value) is set else (value,)
+    
+    @staticmethod
+    def _post(table, key, ino):
+        # most names are unique, so a lone id is stored without a set
+        cur = table.get(key)
+        if cur is None:
+            table[key] = ino
+        elif type(cur) is set:
+            cur.add(ino)
+        else:
+            table[key] = {cur, ino}
+    
+    @staticmethod
+    def _unpost(table, key, ino):
+        cur = table[key]
+        if type(cur) is not set:
+            del table[key]
+        else:
+            cur.discard(ino)
+            if len(cur) == 1:
+                table[key] = cur.pop()
+    
+    def add(self, node):
+        # not in _keys: posted and keyed at the next flush
+        self.entries[node.inode_id] = node
+        self._dirty[node.inode_id] = node
+    
+    def remove(self, node):
+        ino = node.inode_id
+        if self.entries.pop(ino, None) is None:
+            return
+        self._dirty.pop(ino, None)
+        key = self._keys.pop(ino, None)
+        if key is not None:
+            self._unpost(self.by_name, node.name, ino)
+            self._unpost(self.by_ext, self.ext_of(node.name), ino)
+            self.by_size.remove((key[0], ino))
+            self.by_mtime.remove((key[1], ino))
+    
+    def update(self, node):
+        """文件大小或修改时间变化后调用"""
+        ino = node.inode_id
+        # already dirty: the flush reads the node's current size/mtime anyway
+        if ino not in self._dirty and ino in self.entries:
+            self._dirty[ino] = node
+        self.updates += 1
+    
+    def flush(self):
+        """把 dirty 表中的变化并入倒排表和有序索引"""
+        if not self._dirty:
+            return
+        entries, keys, by_size, by_mtime = self.entries, self._keys, self.by_size, self.by_mtime
+        by_name, exts = self.by_name, {}
+        for ino, node in self._dirty.items():
+            if ino not in keys:
+                name = node.name
+                if name in by_name:
+                    self._post(by_name, name, ino)
+                else:
+                    by_name[name] = ino
+                exts.setdefault(name.rpartition('.')[2] if '.' in name else '', []).append(ino)
+        for ext, ids in exts.items():
+            # a handful of extensions: merge each batch with one set update
+            cur = self.by_ext.get(ext)
+            if type(cur) is set:
+                cur.update(ids)
+                continue
+            if cur is not None:
+                ids.append(cur)
+            self.by_ext[ext] = ids[0] if len(ids) == 1 else set(ids)
+        if len(self._dirty) * 8 > len(entries):
+            # many changes since the last query: re-sorting everything is cheaper
+            nodes = entries.values()
+            self._keys = {ino: (n.size, n.modified) for ino, n in entries.items()}
+            sizes = [(n.size, n.inode_id) for n in nodes]
+            sizes.sort()
+            mtimes = [(n.modified, n.inode_id) for n in nodes]
+            mtimes.sort()
+            by_size.reset(sizes)
+            by_mtime.reset(mtimes)
+            self._dirty.clear()
+            self.flushes += 1
+            return
+        for ino, node in self._dirty.items():
+            size, mtime = node.size, node.modified
+            key = keys.get(ino)
+            if key is None:
+                by_size.add((size, ino))
+                by_mtime.add((mtime, ino))
+            else:
+                if key[0] != size:
+                    by_size.replace((key[0], ino), (size, ino))
+                if key[1] != mtime:
+                    by_mtime.replace((key[1], ino), (mtime, ino))
+            keys[ino] = (size, mtime)
+        self._dirty.clear()
+        self.flushes += 1
+    
+    def query(self, name=None, min_size=None, max_size=None, newer=None, older=None):
+        """产生满足全部条件的 INode: 先取最小的候选集, 再逐个过滤其余条件"""
+        plans = []
+        self.flush()
+        if name is not None:
+            if not any(c in name for c in "*?["):
+                ids = self._ids(self.by_name.get(name))
+                plans.append((len(ids), lambda: iter(ids)))
+            elif name.startswith("*.") and not any(c in name[2:] for c in "*?["):
+                ids = self._ids(self.by_ext.get(name[2:]))
+                plans.append((len(ids), lambda: iter(ids)))
+            else:
+                groups = [self._ids(ids) for n, ids in self.by_name.items() if fnmatchcase(n, name)]
+                plans.append((sum(len(g) for g in groups), lambda: (i for g in groups for i in g)))
+        if min_size is not None or max_size is not None:
+            plans.append((self.by_size.count(min_size, max_size),
+                          lambda: (i for _, i in self.by_size.irange(min_size, max_size))))
+        if newer is not None or older is not None:
+            plans.append((self.by_mtime.count(newer, older),
+                          lambda: (i for _, i in self.by_mtime.irange(newer, older))))
+        if not plans:
+            plans.append((len(self.entries), lambda: iter(self.entries)))
+        _, candidates = min(plans, key=lambda p: p[0])
+        entries = self.entries
+        for ino in candidates():
+            node = entries[ino]
+            if name is not None and not fnmatchcase(node.name, name):
+                continue
+            if min_size is not None and node.size < min_size:
+                continue
+            if max_size is not None and node.size > max_size:
+                continue
+            if newer is not None and node.modified < newer:
+                continue
+            if older is not None and node.modified > older:
+                continue
+            yield node
+    
+    def stats(self):
+        return {
+            'files': len(self.entries),
+            'names': len(self.by_name),
+            'extensions': len(self.by_ext),
+            'size_buckets': len(self.by_size._buckets),
+            'updates': self.updates,
+            'pending': len(self._dirty),
+        }
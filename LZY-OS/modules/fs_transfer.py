@@ -0,0 +1,288 @@
+"""LZY-OS FS Transfer - 宿主目录 / tar 归档的批量导入导出"""
+import os
+import tarfile
+import time
+
+from .file_manager import FileHandle
+
+CHUNK_SIZE = 1 << 16
+GROUP_FILES = 256           # small files written per storage commit
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def _new_stats():
+    return {'files': 0, 'dirs': 0, 'bytes': 0, 'skipped': 0, 'elapsed': 0.0}
+
+
+def _finish(stats, t0):
+    elapsed = stats['elapsed'] = time.perf_counter() - t0
+    stats['files_per_sec'] = stats['files'] / elapsed if elapsed > 0 else 0.0
+    stats['mb_per_sec'] = stats['bytes'] / 2 ** 20 / elapsed if elapsed > 0 else 0.0
+    return stats
+
+
+def _tar_write_mode(path):
+    name = path.lower()
+    for suffixes, comp in (((".gz", ".tgz"), "gz"), ((".bz2", ".tbz2"), "bz2"), ((".xz", ".txz"), "xz")):
+        if name.endswith(suffixes):
+            return "w|" + comp
+    return "w|"
+
+
+class _Builder:
+    """把相对路径挂到目标目录下 - 已建立的目录按相对路径缓存, 不再逐级解析路径"""
+    def __init__(self, fs, root, key, chunk_size):
+        self.fs = fs
+        self.dirs = {"": (root, key)}       # relative path -> (INode, absolute path)
+        self.chunk_size = chunk_size
+        self.stats = _new_stats()
+        self.group = None       # (parent INode, parent path) of the small files waiting in pending
+        self.pending = []       # [(name, perm, data)]
+        self.pending_bytes = 0
+    
+    def flush(self):
+        """把同一目录下攒起的小文件一次写入, 整组一次提交"""
+        if not self.pending:
+            return
+        parent, key = self.group
+        nodes = self.fs._create_files(parent, key, self.pending)
+        for (_, _, data), node in zip(self.pending, nodes):
+            if node is None:
+                self.stats['skipped'] += 1
+            else:
+                self.stats['files'] += 1
+                self.stats['bytes'] += len(data)
+        self.pending = []
+        self.pending_bytes = 0
+    
+    @staticmethod
+    def _join(key, name):
+        return f"/{name}" if key == "/" else f"{key}/{name}"
+    
+    def dir(self, rel, perm=0o755):
+        """相对路径 -> (INode, 绝对路径), 缺少的上级目录一并创建; 被文件占用时返回 None"""
+        found = self.dirs.get(rel)
+        if found is not None:
+            return found
+        parts = rel.split("/")
+        i = len(parts) - 1
+        while i and "/".join(parts[:i]) not in self.dirs:
+            i -= 1
+        node, key = self.dirs["/".join(parts[:i])]
+        # keep the archive's order: files before this directory exist before it does
+        self.flush()
+        fs = self.fs
+        for j in range(i, len(parts)):
+            name = parts[j]
+            child_key = self._join(key, name)
+            child = fs._dir(node).get(name)
+            if child is None:
+                child = fs._create(node, child_key, name, True, 0, perm if j == len(parts) - 1 else 0o755)
+                if child is None:
+                    self.stats['skipped'] += 1
+                    return None
+                self.stats['dirs'] += 1
+            elif not child.is_directory:
+                self.stats['skipped'] += 1
+                return None
+            node, key = child, child_key
+            self.dirs["/".join(parts[:j + 1])] = (node, key)
+        return node, key
+    
+    def file(self, rel, perm, stream, size=None):
+        """从 stream (有 read(n) 的对象) 逐块写入文件; 已存在的文件被覆盖
+        
+        size 为已知长度且不超过一块的小文件先攒起来, 同一目录下的一组一次写入并提交;
+        其余文件逐块写入, 各自提交一次。
+        """
+        parent_rel, _, name = rel.rpartition("/")
+        found = self.dir(parent_rel) if parent_rel else self.dirs[""]
+        if found is None:
+            return
+        if self.group is None or self.group[0] is not found[0] or len(self.pending) >= GROUP_FILES:
+            self.flush()
+            self.group = found
+        if size is not None and size <= self.chunk_size:
+            data = stream.read(size) if size else b""
+            self.pending.append((name, perm, data))
+            self.pending_bytes += len(data)
+            if self.pending_bytes >= 16 * self.chunk_size:
+                self.flush()
+            return
+        self.flush()
+        parent, key = found
+        key = self._join(key, name)
+        fs = self.fs
+        node = fs._dir(parent).get(name)
+        if node is None:
+            node = fs._create(parent, key, name, False, 0, perm)
+        elif node.is_directory:
+            node = None
+        elif node.size:
+            fs._truncate_node(node, 0)
+        if node is None:
+            self.stats['skipped'] += 1
+            return
+        offset = 0
+        while size is None or offset < size:
+            chunk = stream.read(self.chunk_size if size is None else min(self.chunk_size, size - offset))
+            if not chunk:
+                break
+            fs._write_node(node, chunk, offset)
+            offset += len(chunk)
+        fs.storage.commit()
+        self.stats['files'] += 1
+        self.stats['bytes'] += offset
+
+
+def _builder(fs, dest, chunk_size):
+    key = fs.normalize(dest)
+    root = fs.resolve(key)
+    if root is None and fs.mkdir(key, parents=True):
+        root = fs.resolve(key)
+    if root is None or not root.is_directory:
+        return None
+    return _Builder(fs, root, key, chunk_size)
+
+
+def _walk_host(builder, src):
+    for dirpath, dirnames, filenames in os.walk(src):
+        # os.walk lists symlinked directories but does not enter them
+        links = [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]
+        builder.stats['skipped'] += len(links)
+        dirnames[:] = sorted(d for d in dirnames if d not in links)
+        rel = os.path.relpath(dirpath, src).replace(os.sep, "/")
+        rel = "" if rel == "." else rel
+        perm = os.stat(dirpath).st_mode & 0o777
+        if rel and builder.dir(rel, perm) is None:
+            dirnames[:] = []
+            continue
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path) or not os.path.isfile(path):
+                builder.stats['skipped'] += 1
+                continue
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                builder.file(f"{rel}/{name}" if rel else name, st.st_mode & 0o777, f, st.st_size)
+
+
+def import_tree(fs, src, dest="/", chunk_size=CHUNK_SIZE):
+    """把宿主目录 src 的内容导入到 dest 目录下 (不存在时创建), 返回统计; dest 不是目录时返回 None"""
+    builder = _builder(fs, dest, chunk_size)
+    if builder is None or not os.path.isdir(src):
+        return None
+    t0 = time.perf_counter()
+    try:
+        _walk_host(builder, src)
+    finally:
+        builder.flush()
+    return _finish(builder.stats, t0)
+
+
+def _read_tar(builder, src):
+    with tarfile.open(src, "r|*") as tar:
+        for member in tar:
+            parts = [p for p in member.name.replace("\\", "/").split("/") if p and p != "."]
+            if ".." in parts or not (member.isdir() or member.isreg()):
+                builder.stats['skipped'] += 1
+                continue
+            if not parts:
+                continue
+            rel = "/".join(parts)
+            perm = member.mode & 0o777
+            if member.isdir():
+                builder.dir(rel, perm)
+            else:
+                builder.file(rel, perm, tar.extractfile(member), member.size)
+
+
+def import_tar(fs, src, dest="/", chunk_size=CHUNK_SIZE):
+    """流式读取 tar 归档 (可压缩) 导入到 dest 目录下; 链接、设备文件和含 .. 的路径被跳过"""
+    builder = _builder(fs, dest, chunk_size)
+    if builder is None:
+        return None
+    t0 = time.perf_counter()
+    try:
+        _read_tar(builder, src)
+    finally:
+        # files read before a corrupt or truncated member are kept
+        builder.flush()
+    return _finish(builder.stats, t0)
+
+
+def export_tree(fs, src, dest, chunk_size=CHUNK_SIZE):
+    """把 src (目录或文件) 导出到宿主路径 dest, 返回统计; src 不存在时返回 None"""
+    key = fs.normalize(src)
+    node = fs.resolve(key)
+    if node is None:
+        return None
+    stats = _new_stats()
+    t0 = time.perf_counter()
+    if not node.is_directory and os.path.isdir(dest):
+        dest = os.path.join(dest, node.name)
+    for path, cur, depth in fs.walk(key):
+        rel = path[len(key):].lstrip("/")
+        host = os.path.join(dest, *rel.split("/")) if rel else dest
+        if cur.is_directory:
+            os.makedirs(host, exist_ok=True)
+            stats['dirs'] += 1
+            continue
+        with open(host, "wb") as out, FileHandle(fs, cur) as handle:
+            for chunk in handle.chunks(chunk_size):
+                out.write(chunk)
+        stats['files'] += 1
+        stats['bytes'] += cur.size
+    return _finish(stats, t0)
+
+
+def export_tar(fs, src, dest, chunk_size=CHUNK_SIZE):
+    """把 src 子树流式写成 tar 归档 (按后缀选择 gz/bz2/xz 压缩), 成员名以 src 的名字开头"""
+    key = fs.normalize(src)
+    node = fs.resolve(key)
+    if node is None:
+        return None
+    stats = _new_stats()
+    t0 = time.perf_counter()
+    top = "" if key == "/" else node.name
+    with tarfile.open(dest, _tar_write_mode(dest), bufsize=chunk_size) as tar:
+        for path, cur, depth in fs.walk(key):
+            rel = path[len(key):].lstrip("/")
+            name = "/".join(p for p in (top, rel) if p)
+            if not name:
+                continue
+            info = tarfile.TarInfo(name)
+            info.mode = cur.permissions
+            info.mtime = int(cur.modified)
+            info.uname = info.gname = cur.owner
+            if cur.is_directory:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+                stats['dirs'] += 1
+                continue
+            info.size = cur.size
+            with FileHandle(fs, cur) as handle:
+                tar.addfile(info, handle)
+            stats['files'] += 1
+            stats['bytes'] += cur.size
+    return _finish(stats, t0)
+
+
+def is_tar_path(path):
+    return path.lower().endswith(TAR_SUFFIXES)
+
+
+def bulk_import(fs, src, dest="/", chunk_size=CHUNK_SIZE):
+    """src 为宿主目录或 tar 归档; 其它情况返回 None"""
+    if os.path.isdir(src):
+        return import_tree(fs, src, dest, chunk_size)
+    if os.path.isfile(src) and tarfile.is_tarfile(src):
+        return import_tar(fs, src, dest, chunk_size)
+    return None
+
+
+def bulk_export(fs, src, dest, chunk_size=CHUNK_SIZE):
+    """dest 以 .tar/.tar.gz/.tgz/... 结尾时写归档, 否则导出为宿主目录"""
+    if is_tar_path(dest):
+        return export_tar(fs, src, dest, chunk_size)
+    return export_tree(fs, src, dest, chunk_size)
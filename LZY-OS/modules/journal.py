@@ -0,0 +1,259 @@
+"""LZY-OS Journal - 块级预写日志 (WAL) 与组提交"""
+import struct
+import time
+import zlib
+from array import array
+
+
+class Journal:
+    """预写日志 - 包装块设备, 接口与 BlockDevice 相同
+    
+    元数据写入先暂存在当前操作的事务里, 操作结束 (commit) 后并入复合事务, 每 group_size
+    个操作 (或超过 group_delay 秒) 作为一条记录写入日志区并刷盘一次 (组提交); 一个操作
+    从不拆到两条记录里。已提交的块在日志区写满或关闭时才写回原位置 (检查点)。
+    文件数据按 ordered 模式写入 (write_data): 新分配的块直接写到原位置, 在下一个提交块
+    之前刷盘。挂载时 recover() 重放校验通过的记录。
+    
+    日志区布局: [头块][描述块..][数据块..][提交块] ...
+    """
+    HEAD = struct.Struct('<4sQ')        # magic, next sequence
+    DESC = struct.Struct('<4sQI')       # magic, sequence, block count
+    COMMIT = struct.Struct('<4sQI')     # magic, sequence, crc32
+    HEAD_MAGIC = b'LZYJ'
+    DESC_MAGIC = b'LZYD'
+    COMMIT_MAGIC = b'LZYC'
+    
+    def __init__(self, device, start, length, group_size=64, group_delay=0.05):
+        if length < 4:
+            raise ValueError(f"journal too small: {length} blocks")
+        self.device = device
+        self.block_size = device.block_size
+        self.num_blocks = device.num_blocks
+        self.start = start
+        self.length = length
+        self.group_size = max(1, group_size)
+        self.group_delay = group_delay
+        self.seq = 1
+        self._head = 1              # next free block inside the journal region
+        self._op = {}               # block -> data written by the operation in progress
+        self._pending = {}          # block -> data of finished operations, not yet in the journal
+        self._freed = set()         # blocks released by operations in _pending
+        self._ordered = False       # data written in place since the last record
+        self._committed = {}        # block -> data, durable in the journal, not yet home
+        self._ops = 0
+        self._group_start = 0.0
+        # largest group that fits in an empty journal (descriptor + data + commit)
+        usable = length - 1
+        n = usable - 2
+        while n > 0 and self._record_len(n) > usable:
+            n -= 1
+        self.max_group = n
+        self.txns = 0
+        self.commits = 0
+        self.checkpoints = 0
+        self.logged_blocks = 0
+        self.replayed = 0
+    
+    def _record_len(self, n):
+        return -(-(self.DESC.size + 4 * n) // self.block_size) + n + 1
+    
+    # ---- device interface ---------------------------------------------
+    def read_block(self, n):
+        data = self._op.get(n)
+        if data is None:
+            data = self._pending.get(n)
+        if data is None:
+            data = self._committed.get(n)
+        if data is None:
+            data = self.device.read_block(n)
+        return data
+    
+    def _pad(self, data):
+        bs = self.block_size
+        return bytes(data) + bytes(bs - len(data)) if len(data) < bs else bytes(data)
+    
+    def write_block(self, n, data):
+        if n not in self._op:
+            if len(self._op) >= self.max_group:
+                raise OSError(f"operation too large for the journal ({self.max_group} blocks)")
+            if self._pending and len(self._pending) + len(self._op) >= self.max_group:
+                # make room by logging the finished operations, never part of this one
+                self._write_group()
+        self._op[n] = self._pad(data)
+    
+    def write_data(self, n, data, fresh=False):
+        """写文件数据块; fresh 表示本操作刚分配的块
+        
+        新分配的块直接写到原位置 (提交前崩溃时它在位图里仍是空闲的)。覆盖已有数据, 或
+        块的释放/旧内容还在日志里时, 本操作的事务还剩一半以上空间就记入日志, 否则同样
+        直接写: 这时崩溃后被覆盖的文件内容可能新旧混合, 但元数据仍然一致。
+        """
+        logged = n in self._pending or n in self._freed or n in self._committed
+        if n in self._op or (logged or not fresh) and len(self._op) < self.max_group // 2:
+            return self.write_block(n, data)
+        if n in self._pending or n in self._freed:
+            # its release, or a newer image, is not in the journal yet
+            self._write_group()
+        if n in self._committed:
+            # the older image in the journal would be replayed over the new data
+            self.checkpoint()
+        self.device.write_block(n, self._pad(data))
+        self._ordered = True
+    
+    def op_full(self):
+        """当前操作已用掉一条记录一半的容量; 由多个独立步骤组成的操作应在这里先 commit"""
+        return len(self._op) * 2 >= self.max_group
+    
+    def release(self, blocks):
+        """本操作释放的块; 释放写入日志之前不能在原位置覆盖它们"""
+        self._freed.update(blocks)
+    
+    def flush(self):
+        """提交当前组并刷盘"""
+        self._write_group()
+        self.device.flush()
+    
+    def close(self):
+        self._pending.update(self._op)
+        self._op = {}
+        self._write_group()
+        self.checkpoint()
+        self.device.close()
+    
+    def stats(self):
+        st = self.device.stats()
+        st.update({
+            'journal_blocks': self.length,
+            'journal_used': self._head - 1,
+            'journal_seq': self.seq,
+            'group_size': self.group_size,
+            'txns': self.txns,
+            'commits': self.commits,
+            'logged_blocks': self.logged_blocks,
+            'checkpoints': self.checkpoints,
+            'replayed': self.replayed,
+            'pending_blocks': len(self._pending) + len(self._op),
+        })
+        return st
+    
+    # ---- transactions -------------------------------------------------
+    def commit(self):
+        """一个文件系统操作结束; 凑满一组或超时后写入日志"""
+        self.txns += 1
+        self._pending.update(self._op)
+        self._op = {}
+        if not self._ops:
+            self._group_start = time.perf_counter()
+        self._ops += 1
+        if (self._ops >= self.group_size or len(self._pending) * 2 >= self.max_group
+                or time.perf_counter() - self._group_start >= self.group_delay):
+            self._write_group()
+    
+    def _write_group(self):
+        self._ops = 0
+        if not self._pending:
+            return
+        if self._ordered:
+            # data written in place must be durable before the record that points at it
+            self.device.flush()
+            self._ordered = False
+        bs = self.block_size
+        blocks = sorted(self._pending)
+        desc = self.DESC.pack(self.DESC_MAGIC, self.seq, len(blocks)) + array('I', blocks).tobytes()
+        ndesc = -(-len(desc) // bs)
+        if self._head + ndesc + len(blocks) + 1 > self.length:
+            self.checkpoint()
+        pos = self.start + self._head
+        crc = zlib.crc32(desc)
+        desc += bytes(ndesc * bs - len(desc))
+        for i in range(ndesc):
+            self.device.write_block(pos + i, desc[i * bs:(i + 1) * bs])
+        pos += ndesc
+        for n in blocks:
+            data = self._pending[n]
+            crc = zlib.crc32(data, crc)
+            self.device.write_block(pos, data)
+            pos += 1
+        # the checksum lets recovery reject a record torn by a crash mid-flush
+        self.device.write_block(pos, self.COMMIT.pack(self.COMMIT_MAGIC, self.seq, crc))
+        self.device.flush()
+        self._head = pos + 1 - self.start
+        self.seq += 1
+        self.commits += 1
+        self.logged_blocks += len(blocks)
+        self._committed.update(self._pending)
+        self._pending = {}
+        self._freed.clear()
+    
+    def checkpoint(self):
+        """把已提交的块写回原位置, 然后清空日志区"""
+        if self._committed:
+            for n in sorted(self._committed):
+                self.device.write_block(n, self._committed[n])
+            self.device.flush()
+            self._committed.clear()
+            self.checkpoints += 1
+        self._reset()
+    
+    def _reset(self):
+        # records older than the new head sequence are ignored by recovery
+        self.device.write_block(self.start, self.HEAD.pack(self.HEAD_MAGIC, self.seq))
+        self.device.flush()
+        self._head = 1
+    
+    # ---- recovery -----------------------------------------------------
+    def recover(self):
+        """挂载时重放日志中完整的记录, 返回重放的记录数"""
+        magic, seq = self.HEAD.unpack_from(self.device.read_block(self.start))
+        if magic != self.HEAD_MAGIC:
+            self.seq = 1
+            self._reset()
+            return 0
+        self.seq = seq
+        head = 1
+        replay = {}
+        count = 0
+        while head < self.length:
+            record = self._read_record(head)
+            if record is None:
+                break
+            blocks, length = record
+            replay.update(blocks)
+            head += length
+            self.seq += 1
+            count += 1
+        for n in sorted(replay):
+            self.device.write_block(n, replay[n])
+        if replay:
+            self.device.flush()
+        self.replayed = count
+        self._reset()
+        return count
+    
+    def _read_record(self, head):
+        bs = self.block_size
+        pos = self.start + head
+        raw = self.device.read_block(pos)
+        magic, seq, count = self.DESC.unpack_from(raw)
+        if magic != self.DESC_MAGIC or seq != self.seq:
+            return None
+        size = self.DESC.size + 4 * count
+        ndesc = -(-size // bs)
+        length = ndesc + count + 1
+        if head + length > self.length:
+            return None
+        for i in range(1, ndesc):
+            raw += self.device.read_block(pos + i)
+        desc = raw[:size]
+        nums = array('I')
+        nums.frombytes(desc[self.DESC.size:])
+        crc = zlib.crc32(desc)
+        blocks = {}
+        for i, n in enumerate(nums):
+            data = self.device.read_block(pos + ndesc + i)
+            crc = zlib.crc32(data, crc)
+            blocks[n] = data
+        magic, cseq, ccrc = self.COMMIT.unpack_from(self.device.read_block(pos + length - 1))
+        if magic != self.COMMIT_MAGIC or cseq != seq or ccrc != crc:
+            return None
+        return blocks, length
@@ -1,5 +1,10 @@
 """LZY-OS Memory Manager - 内存管理模块"""
+import csv
+import json
 import time
+import threading
+from array import array
+from bisect import bisect_left
 
 class MemoryBlock:
     """内存块"""
@@ -26,6 +31,10 @@ class Memory:
     def __init__(self, size=256):
         self.size = size
         self.blocks = []
+        # running counters, maintained on every mutation
+        self.used_size = 0
+        self.free_size = 0
+        self.free_count = 0
     
     def allocate(self, name, size):
         raise NotImplementedError
@@ -35,9 +44,27 @@ class Memory:
     
     def reset(self):
         raise NotImplementedError
+    
+    def get_usage(self):
+        """O(1) 使用量统计"""
+        return {
+            'size': self.size,
+            'used': self.used_size,
+            'free': self.free_size,
+            'blocks': len(self.blocks),
+            'free_blocks': self.free_count,
+            'util': self.used_size / self.size if self.size else 0.0,
+        }
+    
+    def get_fragmentation(self):
+        free_blocks = [b for b in self.blocks if b.free]
+        total_free = sum(b.length for b in free_blocks)
+        max_free = max((b.length for b in free_blocks), default=0)
+        frag = (1 - max_free / total_free) if total_free > max_free else 0
+        return len(free_blocks), total_free, max_free, frag
 
 class FixedMemory(Memory):
-    """固定分区内存"""
+    """固定分区内存 - 按分区大小分类的空闲位图"""
     def __init__(self, size, block_size):
         super().__init__(size)
         if isinstance(block_size, list):
@@ -54,42 +81,79 @@ class FixedMemory(Memory):
             rem = size - num * block_size
             if rem > 0:
                 self.blocks.append(MemoryBlock(start, rem))
+        
+        self._index = {}        # start -> partition index
+        self._members = {}      # size class -> partition indexes in address order
+        self._slot = []         # partition index -> bit in its class bitmap
+        for i, b in enumerate(self.blocks):
+            self._index[b.start] = i
+            members = self._members.setdefault(b.length, [])
+            self._slot.append(1 << len(members))
+            members.append(i)
+        self._classes = sorted(self._members)
+        self.reset()
     
     def allocate(self, name, size):
-        for b in self.blocks:
-            if b.free and size <= b.length:
-                b.mark_allocated(name)
-                return b.start
-        return None
+        # lowest set bit of each large-enough class is its first free partition;
+        # the smallest of those keeps first-fit order across classes
+        idx = None
+        for length in self._classes[bisect_left(self._classes, size):]:
+            bm = self._bitmap[length]
+            if bm:
+                i = self._members[length][(bm & -bm).bit_length() - 1]
+                if idx is None or i < idx:
+                    idx = i
+        if idx is None:
+            return None
+        b = self.blocks[idx]
+        b.mark_allocated(name)
+        self._bitmap[b.length] &= ~self._slot[idx]
+        self.used_size += b.length
+        self.free_size -= b.length
+        self.free_count -= 1
+        return b.start
     
     def deallocate(self, start):
-        for b in self.blocks:
-            if b.start == start and not b.free:
-                b.mark_free()
-                return True
-        return False
+        idx = self._index.get(start)
+        if idx is None or self.blocks[idx].free:
+            return False
+        b = self.blocks[idx]
+        b.mark_free()
+        self._bitmap[b.length] |= self._slot[idx]
+        self.used_size -= b.length
+        self.free_size += b.length
+        self.free_count += 1
+        return True
     
     def reset(self):
         for b in self.blocks:
             b.mark_free()
+        self._bitmap = {length: (1 << len(m)) - 1 for length, m in self._members.items()}
+        self.used_size = 0
+        self.free_size = sum(b.length for b in self.blocks)
+        self.free_count = len(self.blocks)
     
-    def get_status(self):
+    def get_status(self, detail=True):
         lines = [f"Fixed Partition Memory ({self.size}KB)"]
         lines.append("-" * 40)
-        for b in self.blocks:
-            lines.append(str(b))
-        used = sum(b.length for b in self.blocks if not b.free)
-        free = sum(b.length for b in self.blocks if b.free)
-        lines.append("-" * 40)
-        lines.append(f"used: {used}KB  free: {free}KB  util: {used/self.size*100:.1f}%")
+        if detail:
+            for b in self.blocks:
+                lines.append(str(b))
+            lines.append("-" * 40)
+        used = self.used_size
+        lines.append(f"used: {used}KB  free: {self.free_size}KB  util: {used/self.size*100:.1f}%")
         return "\n".join(lines)
 
 class DynamicMemory(Memory):
-    """动态分区内存 - 支持first-fit/best-fit/worst-fit"""
+    """动态分区内存 - 支持first-fit/next-fit/best-fit/worst-fit"""
+    POLICIES = ("first-fit", "next-fit", "best-fit", "worst-fit")
+    
     def __init__(self, size, policy="first-fit"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown allocation policy: {policy}")
         super().__init__(size)
-        self.blocks.append(MemoryBlock(0, size))
         self.policy = policy
+        self.reset()
     
     def allocate(self, name, size):
         candidates = [(i, b) for i, b in enumerate(self.blocks) if b.free and b.length >= size]
@@ -98,12 +162,14 @@ class DynamicMemory(Memory):
         
         if self.policy == "first-fit":
             idx, block = candidates[0]
+        elif self.policy == "next-fit":
+            # resume from the roving pointer, wrap around to the lowest candidate
+            rover = self._rover
+            idx, block = next((c for c in candidates if c[1].start + c[1].length > rover), candidates[0])
         elif self.policy == "best-fit":
             idx, block = min(candidates, key=lambda x: x[1].length)
-        elif self.policy == "worst-fit":
-            idx, block = max(candidates, key=lambda x: x[1].length)
         else:
-            idx, block = candidates[0]
+            idx, block = max(candidates, key=lambda x: x[1].length)
         
         allocated = MemoryBlock(block.start, size)
         allocated.mark_allocated(name)
@@ -114,6 +180,10 @@ class DynamicMemory(Memory):
             self.blocks.insert(idx + 1, remaining)
         else:
             self.blocks[idx] = allocated
+            self.free_count -= 1
+        self.used_size += size
+        self.free_size -= size
+        self._rover = allocated.start + size
         
         return allocated.start
     
@@ -121,58 +191,316 @@ class DynamicMemory(Memory):
         for i, b in enumerate(self.blocks):
             if b.start == start and not b.free:
                 b.mark_free()
-                self._merge()
+                self.used_size -= b.length
+                self.free_size += b.length
+                self.free_count += 1
+                self._merge(i)
                 return True
         return False
     
-    def _merge(self):
-        i = 0
-        while i < len(self.blocks) - 1:
-            if self.blocks[i].free and self.blocks[i+1].free:
-                self.blocks[i].length += self.blocks[i+1].length
-                self.blocks.pop(i+1)
-            else:
-                i += 1
+    def _merge(self, i):
+        """与相邻空闲块合并 (只需检查 i 的左右邻居)"""
+        blocks = self.blocks
+        if i + 1 < len(blocks) and blocks[i+1].free:
+            blocks[i].length += blocks[i+1].length
+            blocks.pop(i+1)
+            self.free_count -= 1
+        if i > 0 and blocks[i-1].free:
+            blocks[i-1].length += blocks[i].length
+            blocks.pop(i)
+            self.free_count -= 1
     
     def reset(self):
         self.blocks.clear()
         self.blocks.append(MemoryBlock(0, self.size))
+        self.used_size = 0
+        self.free_size = self.size
+        self.free_count = 1
+        self._rover = 0
+    
+    def check_invariants(self):
+        """校验块表: 按地址连续无重叠、相邻空闲块已合并、计数器一致; 返回错误列表"""
+        errors = []
+        pos = 0
+        prev_free = False
+        used = free = free_count = 0
+        for b in self.blocks:
+            if b.start != pos:
+                errors.append(f"{'overlap' if b.start < pos else 'gap'} at {pos}: next block starts at {b.start}")
+            if b.length <= 0:
+                errors.append(f"empty block at {b.start}")
+            if b.free and prev_free:
+                errors.append(f"uncoalesced free blocks at {b.start}")
+            if b.free:
+                free += b.length
+                free_count += 1
+            else:
+                used += b.length
+            prev_free = b.free
+            pos = b.start + b.length
+        if pos != self.size:
+            errors.append(f"blocks cover {pos}KB of {self.size}KB")
+        if (used, free, free_count) != (self.used_size, self.free_size, self.free_count):
+            errors.append(f"counters used={self.used_size} free={self.free_size} free_blocks={self.free_count}, "
+                          f"actual used={used} free={free} free_blocks={free_count}")
+        return errors
+    
+    def get_status(self, detail=True):
+        lines = [f"Dynamic Memory ({self.size}KB) [{self.policy}]"]
+        lines.append("-" * 45)
+        if detail:
+            for b in self.blocks:
+                lines.append(str(b))
+            lines.append("-" * 45)
+        lines.append(f"used: {self.used_size}KB  free: {self.free_size}KB  blocks: {len(self.blocks)}")
+        return "\n".join(lines)
+
+class TLSFMemory(DynamicMemory):
+    """TLSF两级分离适配内存 - 位图索引空闲链表, 分配/释放均为O(1)"""
+    SL_BITS = 2                     # 2^SL_BITS second-level lists per first level
+    SMALL = 1 << SL_BITS            # sizes below this map linearly into list 0
+    
+    def __init__(self, size):
+        # blocks is a derived view here, so Memory.__init__ is not used
+        self.size = size
+        self.policy = "tlsf"
+        self.reset()
+    
+    @property
+    def blocks(self):
+        """按地址排序的块视图 (仅供显示和校验)"""
+        return sorted(self._by_start.values(), key=lambda b: b.start)
+    
+    def _mapping(self, size):
+        if size < self.SMALL:
+            return 0, size
+        fl = size.bit_length() - 1
+        return fl - self.SL_BITS + 1, (size >> (fl - self.SL_BITS)) - self.SMALL
+    
+    def _insert_free(self, b):
+        fl, sl = self._mapping(b.length)
+        self._lists[fl][sl][b.start] = b
+        self._fl_bitmap |= 1 << fl
+        self._sl_bitmap[fl] |= 1 << sl
+        self._by_start[b.start] = b
+        self._by_end[b.start + b.length] = b
+    
+    def _remove_free(self, b):
+        fl, sl = self._mapping(b.length)
+        del self._lists[fl][sl][b.start]
+        self._update_bitmaps(fl, sl)
+    
+    def _update_bitmaps(self, fl, sl):
+        if not self._lists[fl][sl]:
+            self._sl_bitmap[fl] &= ~(1 << sl)
+            if not self._sl_bitmap[fl]:
+                self._fl_bitmap &= ~(1 << fl)
+    
+    def _find_suitable(self, size):
+        # round the request up to the next list boundary, so any block found fits
+        if size >= self.SMALL:
+            size += (1 << (size.bit_length() - 1 - self.SL_BITS)) - 1
+        fl, sl = self._mapping(size)
+        if fl >= len(self._sl_bitmap):
+            return None
+        sl_map = self._sl_bitmap[fl] & (-1 << sl)
+        if not sl_map:
+            fl_map = self._fl_bitmap & (-1 << (fl + 1))
+            if not fl_map:
+                return None
+            fl = (fl_map & -fl_map).bit_length() - 1
+            sl_map = self._sl_bitmap[fl]
+        return fl, (sl_map & -sl_map).bit_length() - 1
+    
+    def allocate(self, name, size):
+        if size <= 0:
+            return None
+        found = self._find_suitable(size)
+        if found is None:
+            return None
+        fl, sl = found
+        _, block = self._lists[fl][sl].popitem()
+        self._update_bitmaps(fl, sl)
+        del self._by_end[block.start + block.length]
+        if block.length > size:
+            rest = MemoryBlock(block.start + size, block.length - size)
+            block.length = size
+            self._insert_free(rest)
+        else:
+            self.free_count -= 1
+        block.mark_allocated(name)
+        self._by_end[block.start + size] = block
+        self.used_size += size
+        self.free_size -= size
+        return block.start
+    
+    def deallocate(self, start):
+        b = self._by_start.get(start)
+        if b is None or b.free:
+            return False
+        b.mark_free()
+        self.used_size -= b.length
+        self.free_size += b.length
+        self.free_count += 1
+        del self._by_end[b.start + b.length]
+        nxt = self._by_start.get(b.start + b.length)
+        if nxt is not None and nxt.free:
+            self._remove_free(nxt)
+            del self._by_start[nxt.start]
+            del self._by_end[nxt.start + nxt.length]
+            b.length += nxt.length
+            self.free_count -= 1
+        prev = self._by_end.get(b.start)
+        if prev is not None and prev.free:
+            self._remove_free(prev)
+            del self._by_end[prev.start + prev.length]
+            del self._by_start[b.start]
+            prev.length += b.length
+            b = prev
+            self.free_count -= 1
+        self._insert_free(b)
+        return True
+    
+    def reset(self):
+        fl_count = self._mapping(max(self.size, 1))[0] + 1
+        self._lists = [[{} for _ in range(self.SMALL)] for _ in range(fl_count)]
+        self._fl_bitmap = 0
+        self._sl_bitmap = [0] * fl_count
+        self._by_start = {}
+        self._by_end = {}
+        self.used_size = 0
+        self.free_size = self.size
+        self.free_count = 1
+        if self.size > 0:
+            self._insert_free(MemoryBlock(0, self.size))
     
     def get_fragmentation(self):
-        free_blocks = [b for b in self.blocks if b.free]
-        total_free = sum(b.length for b in free_blocks)
+        free_blocks = [b for b in self._by_start.values() if b.free]
+        total_free = self.free_size
         max_free = max((b.length for b in free_blocks), default=0)
         frag = (1 - max_free / total_free) if total_free > max_free else 0
         return len(free_blocks), total_free, max_free, frag
+
+class MemoryHistory:
+    """内存压力时间序列 - 预分配数组的环形缓冲"""
+    FIELDS = ('time', 'util', 'free_blocks', 'largest_free', 'fragmentation', 'failures')
     
-    def get_status(self):
-        lines = [f"Dynamic Memory ({self.size}KB) [{self.policy}]"]
-        lines.append("-" * 45)
-        for b in self.blocks:
-            lines.append(str(b))
-        used = sum(b.length for b in self.blocks if not b.free)
-        free = sum(b.length for b in self.blocks if b.free)
-        lines.append("-" * 45)
-        lines.append(f"used: {used}KB  free: {free}KB  blocks: {len(self.blocks)}")
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.columns = {f: array('d', [0.0]) * capacity for f in self.FIELDS}
+        self._cols = [self.columns[f] for f in self.FIELDS]
+        self.count = 0          # samples ever taken; the oldest are overwritten
+    
+    def append(self, *values):
+        i = self.count % self.capacity
+        for col, v in zip(self._cols, values):
+            col[i] = v
+        self.count += 1
+    
+    def __len__(self):
+        return min(self.count, self.capacity)
+    
+    def column(self, field):
+        """按时间顺序返回某一列"""
+        col = self.columns[field]
+        if self.count <= self.capacity:
+            return col[:self.count].tolist()
+        i = self.count % self.capacity
+        return (col[i:] + col[:i]).tolist()
+    
+    def rows(self):
+        return list(zip(*(self.column(f) for f in self.FIELDS)))
+    
+    def to_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(self.FIELDS)
+            w.writerows(self.rows())
+    
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump({fld: self.column(fld) for fld in self.FIELDS}, f)
+    
+    @staticmethod
+    def percentile(values, p):
+        """最近秩百分位数, values 需已排序"""
+        if not values:
+            return 0.0
+        k = max(0, min(len(values) - 1, -(-len(values) * p // 100) - 1))
+        return values[int(k)]
+    
+    def summary(self, percentiles=(50, 90, 99)):
+        result = {}
+        for f in self.FIELDS[1:]:
+            values = sorted(self.column(f))
+            stats = {'min': values[0] if values else 0.0, 'max': values[-1] if values else 0.0}
+            for p in percentiles:
+                stats[f'p{p}'] = self.percentile(values, p)
+            result[f] = stats
+        return result
+    
+    def format_summary(self, percentiles=(50, 90, 99)):
+        times = self.column('time')
+        span = f"t={times[0]:.0f}..{times[-1]:.0f}" if times else "empty"
+        lines = [f"Memory History ({len(self)} samples, {span})"]
+        lines.append("-" * 60)
+        heads = ['min'] + [f'p{p}' for p in percentiles] + ['max']
+        lines.append("{:<14}".format("METRIC") + "".join("{:>9}".format(h) for h in heads))
+        for f, stats in self.summary(percentiles).items():
+            fmt = "{:>9.3f}" if f in ('util', 'fragmentation') else "{:>9.0f}"
+            lines.append("{:<14}".format(f) + "".join(fmt.format(stats[h]) for h in heads))
         return "\n".join(lines)
 
 class MemoryManager:
     """内存管理器"""
-    def __init__(self, memory_type="dynamic", size=256, policy_or_block=32):
+    def __init__(self, memory_type="dynamic", size=256, policy_or_block=None, verbose=True):
         self.memory_type = memory_type
         if memory_type == "fixed":
-            self.memory = FixedMemory(size, policy_or_block)
+            self.memory = FixedMemory(size, 32 if policy_or_block is None else policy_or_block)
+        elif policy_or_block == "tlsf":
+            self.memory = TLSFMemory(size)
         else:
-            self.memory = DynamicMemory(size, policy_or_block)
+            self.memory = DynamicMemory(size, "first-fit" if policy_or_block is None else policy_or_block)
         self.allocations = {}
+        self.verbose = verbose
+        self.recorder = None    # utils.memtrace.TraceRecorder
+        self.clock = 0          # simulated time: one tick per allocate/deallocate
+        self.failures = 0
+        self.history = None
+        self.sample_every = 1
+    
+    def enable_history(self, capacity=4096, every=1):
+        """开启内存压力采样, 每 every 个时钟周期记录一次"""
+        self.history = MemoryHistory(capacity)
+        self.sample_every = every
+        self.sample()
+        return self.history
+    
+    def sample(self, t=None):
+        _, _, max_free, frag = self.memory.get_fragmentation()
+        mem = self.memory
+        self.history.append(self.clock if t is None else t, mem.used_size / mem.size if mem.size else 0.0,
+                            mem.free_count, max_free, frag, self.failures)
+    
+    def _tick(self):
+        self.clock += 1
+        if self.history is not None and self.clock % self.sample_every == 0:
+            self.sample()
     
     def allocate(self, name, size):
         start = self.memory.allocate(name, size)
+        if self.recorder is not None:
+            self.recorder.on_allocate(name, size)
+        if start is None:
+            self.failures += 1
+        self._tick()
         if start is not None:
             self.allocations[name] = (start, size)
-            print(f"[mem] alloc {size}KB -> {name} @{start}")
+            if self.verbose:
+                print(f"[mem] alloc {size}KB -> {name} @{start}")
             return start
-        print(f"[mem] alloc failed: {name} ({size}KB)")
+        if self.verbose:
+            print(f"[mem] alloc failed: {name} ({size}KB)")
         return None
     
     def deallocate(self, name):
@@ -180,9 +508,204 @@ class MemoryManager:
             start, _ = self.allocations[name]
             self.memory.deallocate(start)
             del self.allocations[name]
-            print(f"[mem] free: {name}")
+            if self.recorder is not None:
+                self.recorder.on_deallocate(name)
+            self._tick()
+            if self.verbose:
+                print(f"[mem] free: {name}")
             return True
         return False
     
-    def get_status(self):
-        return self.memory.get_status()
+    def get_usage(self):
+        return self.memory.get_usage()
+    
+    def get_status(self, detail=True):
+        return self.memory.get_status(detail)
+
+class _ThreadCache:
+    """线程本地小块缓存 - 按尺寸类保存已释放块的起始地址"""
+    def __init__(self):
+        self.bins = {}          # size class -> [start, ...]
+        self.cached = 0
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.acquires = 0
+        self.contended = 0
+        self.wait_time = 0.0
+
+class ConcurrentMemoryManager(MemoryManager):
+    """并发内存管理器 - 全局锁保护块表, 线程本地缓存承接小块分配"""
+    def __init__(self, memory_type="dynamic", size=256, policy_or_block=None, verbose=False,
+                 small_size=16, quantum=4, cache_limit=32):
+        super().__init__(memory_type, size, policy_or_block, verbose)
+        self.lock = threading.Lock()            # guards self.memory
+        self.table_lock = threading.Lock()      # guards self.allocations
+        self.small_size = small_size
+        self.quantum = quantum
+        self.cache_limit = cache_limit
+        self._local = threading.local()
+        self._caches = []
+    
+    def _cache(self):
+        cache = getattr(self._local, 'cache', None)
+        if cache is None:
+            cache = self._local.cache = _ThreadCache()
+            with self.table_lock:
+                self._caches.append(cache)
+        return cache
+    
+    def sample(self, t=None):
+        # called under table_lock; the block table itself is guarded by lock
+        with self.lock:
+            super().sample(t)
+    
+    def _acquire(self, cache):
+        if not self.lock.acquire(False):
+            t0 = time.perf_counter()
+            self.lock.acquire()
+            cache.wait_time += time.perf_counter() - t0
+            cache.contended += 1
+        cache.acquires += 1
+    
+    def _size_class(self, size):
+        return -(-size // self.quantum) * self.quantum
+    
+    def _heap_allocate(self, cache, name, size):
+        self._acquire(cache)
+        try:
+            return self.memory.allocate(name, size)
+        finally:
+            self.lock.release()
+    
+    def _flush(self, cache, cls, keep=0):
+        """把缓存块归还给共享块表 (一次加锁批量归还)"""
+        bin_ = cache.bins.get(cls)
+        if not bin_ or len(bin_) <= keep:
+            return
+        spill = bin_[keep:]
+        del bin_[keep:]
+        cache.cached -= len(spill)
+        cache.flushes += 1
+        self._acquire(cache)
+        try:
+            for start in spill:
+                self.memory.deallocate(start)
+        finally:
+            self.lock.release()
+    
+    def allocate(self, name, size):
+        cache = self._cache()
+        if size <= self.small_size:
+            cls = self._size_class(size)
+            bin_ = cache.bins.get(cls)
+            if bin_:
+                start = bin_.pop()
+                cache.cached -= 1
+                cache.hits += 1
+            else:
+                cache.misses += 1
+                start = self._heap_allocate(cache, f"tcache:{cls}", cls)
+        else:
+            start = self._heap_allocate(cache, name, size)
+        if start is None and cache.cached:
+            # blocks parked in this thread's cache may be what the heap is missing
+            for c in list(cache.bins):
+                self._flush(cache, c)
+            if size <= self.small_size:
+                start = self._heap_allocate(cache, f"tcache:{cls}", cls)
+            else:
+                start = self._heap_allocate(cache, name, size)
+        
+        with self.table_lock:
+            if self.recorder is not None:
+                self.recorder.on_allocate(name, size)
+            if start is None:
+                self.failures += 1
+            else:
+                self.allocations[name] = (start, size)
+            self._tick()
+        if self.verbose:
+            if start is not None:
+                print(f"[mem] alloc {size}KB -> {name} @{start}")
+            else:
+                print(f"[mem] alloc failed: {name} ({size}KB)")
+        return start
+    
+    def deallocate(self, name):
+        with self.table_lock:
+            entry = self.allocations.pop(name, None)
+            if entry is not None:
+                if self.recorder is not None:
+                    self.recorder.on_deallocate(name)
+                self._tick()
+        if entry is None:
+            return False
+        start, size = entry
+        cache = self._cache()
+        if size <= self.small_size:
+            cls = self._size_class(size)
+            bin_ = cache.bins.setdefault(cls, [])
+            bin_.append(start)
+            cache.cached += 1
+            if len(bin_) > self.cache_limit:
+                self._flush(cache, cls, self.cache_limit // 2)
+        else:
+            self._acquire(cache)
+            try:
+                self.memory.deallocate(start)
+            finally:
+                self.lock.release()
+        if self.verbose:
+            print(f"[mem] free: {name}")
+        return True
+    
+    def flush_caches(self):
+        """归还所有线程缓存 - 只能在工作线程结束后调用"""
+        cache = self._cache()
+        with self.table_lock:
+            caches = list(self._caches)
+        with self.lock:
+            for c in caches:
+                for bin_ in c.bins.values():
+                    for start in bin_:
+                        self.memory.deallocate(start)
+                    bin_.clear()
+                c.cached = 0
+        cache.flushes += 1
+    
+    def check_invariants(self):
+        """校验块表与分配表: 存活分配互不重叠且落在已分配块内"""
+        with self.table_lock, self.lock:
+            errors = self.memory.check_invariants() if hasattr(self.memory, 'check_invariants') else []
+            used = sorted((b.start, b.start + b.length) for b in self.memory.blocks if not b.free)
+            live = sorted((s, s + n, name) for name, (s, n) in self.allocations.items())
+            end = 0
+            for s, e, name in live:
+                if s < end:
+                    errors.append(f"allocation {name} @{s} overlaps previous one ending at {end}")
+                end = max(end, e)
+                i = bisect_left(used, (s + 1,)) - 1
+                if i < 0 or not (used[i][0] <= s and e <= used[i][1]):
+                    errors.append(f"allocation {name} @{s}-{e} is not inside an allocated block")
+        return errors
+    
+    def get_contention_stats(self):
+        with self.table_lock:
+            caches = list(self._caches)
+        acquires = sum(c.acquires for c in caches)
+        contended = sum(c.contended for c in caches)
+        hits = sum(c.hits for c in caches)
+        misses = sum(c.misses for c in caches)
+        return {
+            'threads': len(caches),
+            'lock_acquires': acquires,
+            'lock_contended': contended,
+            'contention_rate': contended / acquires if acquires else 0.0,
+            'lock_wait': sum(c.wait_time for c in caches),
+            'cache_hits': hits,
+            'cache_misses': misses,
+            'cache_hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'cache_flushes': sum(c.flushes for c in caches),
+            'cached_blocks': sum(c.cached for c in caches),
+        }
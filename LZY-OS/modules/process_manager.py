@@ -12,21 +12,28 @@ class ProcessState(Enum):
 
 class PCB:
     """进程控制块"""
-    def __init__(self, pid, name, program):
+    def __init__(self, pid, name, program, base=0):
         self.pid = pid
         self.name = name
         self.state = ProcessState.READY
         self.program = program
-        self.pc_value = 0
+        self.base = base        # load address: program[0] goes to memory[base]
+        self.image = None       # the region as of the last switch-out; None until first run
+        self.pc_value = base
         self.registers_backup = {}
         self.created_time = time.time()
         self.terminated_time = None
+        self.terminated_clock = None    # ProcessManager.clock at completion
         self.total_cycles = 0
         self.priority = 50
+        self.estimate = None    # cycle bound from static analysis (utils.cfg worst); None: unbounded or unknown
+        self.region = None      # MemoryManager region holding the program, freed when it terminates
     
     def save_context(self, cpu):
         self.pc_value = cpu.pc.value
         self.registers_backup = cpu.registers.copy()
+        # keep what the process wrote into its own region (data words, patched code)
+        self.image = cpu.memory[self.base:self.base + len(self.program)]
     
     def restore_context(self, cpu):
         cpu.pc.set(self.pc_value)
@@ -65,10 +72,20 @@ class Scheduler:
     def _fcfs(self):
         return self.ready_queue.popleft() if self.ready_queue else None
     
+    @staticmethod
+    def job_length(pcb):
+        """SJF 的比较键: 有周期上界的作业 (0, 周期数) 排在前面, 其余按 (1, 程序字数)
+        
+        上界只来自无循环的程序, 它们每个字至多执行一次; 两种单位不在同一层里比较。
+        """
+        if pcb.estimate is not None:
+            return 0, pcb.estimate
+        return 1, len(pcb.program)
+    
     def _sjf(self):
         if not self.ready_queue:
             return None
-        shortest = min(self.ready_queue, key=lambda p: len(p.program))
+        shortest = min(self.ready_queue, key=self.job_length)
         self.ready_queue.remove(shortest)
         return shortest
     
@@ -82,7 +99,9 @@ class Scheduler:
     def recommend_policy(self, processes):
         if not processes:
             return "RR", "default round-robin"
-        short = sum(1 for p in processes if len(p.program) < 20)
+        # short: bounded to finish within two time slices, or (no bound) under 20 words
+        short = sum(1 for p in processes
+                    if (p.estimate <= 2 * self.time_slice if p.estimate is not None else len(p.program) < 20))
         total = len(processes)
         if short > total * 0.7:
             return "SJF", f"short jobs: {short}/{total}"
@@ -92,25 +111,28 @@ class Scheduler:
 
 class ProcessManager:
     """进程管理器"""
-    def __init__(self, cpu, policy="RR"):
+    def __init__(self, cpu, policy="RR", memory_manager=None):
         self.cpu = cpu
+        self.memory_manager = memory_manager
         self.scheduler = Scheduler(policy)
         self.processes = {}
         self.next_pid = 1000
         self.clock = 0
     
-    def create_process(self, program, name="proc", priority=50):
+    def create_process(self, program, name="proc", priority=50, base=0, estimate=None, region=None):
         pid = self.next_pid
         self.next_pid += 1
-        pcb = PCB(pid, name, program)
+        pcb = PCB(pid, name, program, base)
         pcb.priority = priority
+        pcb.estimate = estimate
+        pcb.region = region
         self.processes[pid] = pcb
         self.scheduler.add_process(pcb)
         print(f"[proc] create: {name} (pid={pid})")
         return pcb
     
     def load_process(self, pcb):
-        self.cpu.load_program(pcb.program)
+        self.cpu.load_program(pcb.program if pcb.image is None else pcb.image, pcb.base)
         pcb.restore_context(self.cpu)
         self.cpu.halted = False
     
@@ -169,12 +191,20 @@ class ProcessManager:
                     print("[proc] {} completed at cycle {}".format(self.scheduler.running_process.name, cycles))
                 self.scheduler.running_process.state = ProcessState.TERMINATED
                 self.scheduler.running_process.terminated_time = time.time()
+                self.scheduler.running_process.terminated_clock = self.clock
                 self.scheduler.terminated_processes.append(self.scheduler.running_process)
+                self._release(self.scheduler.running_process)
                 self.scheduler.running_process = None
                 self.switch_process()
         
         print("[proc] execution completed, total cycles: {}".format(cycles))
     
+    def _release(self, pcb):
+        """进程结束时归还它的内存区域"""
+        if pcb.region is not None and self.memory_manager is not None:
+            self.memory_manager.deallocate(pcb.region)
+            pcb.region = None
+    
     def get_process_info(self):
         lines = ["PID      NAME                 STATE        CYCLES"]
         lines.append("-" * 52)
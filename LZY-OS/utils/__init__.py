@@ -1,10 +1,18 @@
 """LZY-OS utils package"""
 from .assembler import Assembler, SimpleProgram
+from .objfile import ObjectFile, ProgramCache
+from .linker import link, load_image
+from .optimizer import optimize
+from .cfg import analyze
+from .disasm import Disassembler
 from .experiments import ExperimentDemo, BoundedBuffer
 from .ai_assistant import DeepSeekAssistant
+from .memtrace import AllocTrace, TraceRecorder, synthetic_trace, replay
 
 __all__ = [
     'Assembler', 'SimpleProgram',
+    'ObjectFile', 'ProgramCache', 'link', 'load_image', 'optimize', 'analyze', 'Disassembler',
     'ExperimentDemo', 'BoundedBuffer',
     'DeepSeekAssistant',
+    'AllocTrace', 'TraceRecorder', 'synthetic_trace', 'replay',
 ]
@@ -0,0 +1,267 @@
+"""LZY-OS Asm Bench - 汇编器基准测试"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synthetic_lines(lines, seed=1):
+    """逐行生成约 lines 行的汇编源码: 带标签的计算块、注释和跳转"""
+    rng = random.Random(seed)
+    ops = ('LOAD', 'ADD', 'SUB', 'MUL', 'STORE', 'MOV')
+    n = 0
+    block = 0
+    while n < lines:
+        yield f"block{block}:"
+        yield f"    # block {block}"
+        size = rng.randint(4, 12)
+        for _ in range(size):
+            yield f"    {rng.choice(ops)} {rng.randrange(256)}"
+        yield f"    JZ block{rng.randrange(block + 1)}"
+        yield "    PRINT"
+        n += size + 4
+        block += 1
+    yield "    HALT"
+
+
+def synthetic_source(lines, seed=1):
+    """synthetic_lines 拼成一个字符串"""
+    return "\n".join(synthetic_lines(lines, seed)) + "\n"
+
+
+def _best(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_cache(lines=2000, repeat=5, seed=1):
+    """同一源码: 汇编 vs 内存缓存命中 vs 磁盘缓存命中 (新的缓存实例) 的耗时"""
+    from utils.assembler import Assembler, SimpleProgram
+    from utils.objfile import ProgramCache
+    
+    sources = [("demos (4 programs)", [SimpleProgram.fibonacci(), SimpleProgram.sum(),
+                                      SimpleProgram.hello(), SimpleProgram.multiply()]),
+               (f"synthetic {lines} lines", [synthetic_source(lines, seed)])]
+    tmp = tempfile.mkdtemp(prefix="lzyasm-")
+    results = []
+    try:
+        for label, batch in sources:
+            asm = Assembler()
+            t_asm = _best(lambda: [asm.assemble(s) for s in batch], repeat)
+            warm = ProgramCache(directory=tmp)
+            for s in batch:
+                warm.load(s)
+            t_mem = _best(lambda: [warm.load(s) for s in batch], repeat)
+            
+            def disk():
+                cold = ProgramCache(directory=tmp)
+                for s in batch:
+                    obj, origin = cold.load(s)
+                    assert origin == "disk"
+            
+            t_disk = _best(disk, repeat)
+            code = [warm.load(s)[0] for s in batch]
+            results.append((label, {
+                'words': sum(len(obj) for obj in code),
+                'object_bytes': sum(len(obj.to_bytes()) for obj in code),
+                'assemble': t_asm,
+                'memory_hit': t_mem,
+                'disk_hit': t_disk,
+            }))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def format_cache(results):
+    lines = ["{:<22} {:>8} {:>10} {:>11} {:>11} {:>11}".format(
+        "SOURCE", "WORDS", "OBJ BYTES", "ASSEMBLE", "MEM HIT", "DISK HIT")]
+    for label, r in results:
+        lines.append("{:<22} {:>8,} {:>10,} {:>9.3f}ms {:>9.3f}ms {:>9.3f}ms".format(
+            label, r['words'], r['object_bytes'], r['assemble'] * 1000,
+            r['memory_hit'] * 1000, r['disk_hit'] * 1000))
+        lines.append("{:<22} {:>8} {:>10} {:>11} {:>10.0f}x {:>10.1f}x".format(
+            "", "", "", "speedup", r['assemble'] / r['memory_hit'], r['assemble'] / r['disk_hit']))
+    return "\n".join(lines)
+
+
+def bench_link(programs=50, lib_lines=2000, repeat=3, seed=1):
+    """程序集共用一个库: 每个程序把库源码拼进来整体汇编 vs 库汇编一次、逐个链接"""
+    from utils.assembler import Assembler
+    from utils.objfile import ProgramCache
+    from utils.linker import link
+    
+    lib = ".global block0\n.extern back\n" + synthetic_source(lib_lines, seed).replace("    HALT\n", "    JMP back\n")
+    mains = [f".extern block0\n.global back\n    LOAD {i}\n    STORE 500\n    JMP block0\n"
+             f"back:\n    PRINT\n    HALT\n" for i in range(programs)]
+    
+    def whole():
+        asm = Assembler()
+        return [asm.assemble(src + lib) for src in mains]
+    
+    def linked():
+        cache = ProgramCache()
+        lib_obj = cache.load(lib)[0]
+        return [link([cache.load(src)[0], lib_obj]) for src in mains]
+    
+    t_whole = _best(whole, repeat)
+    t_link = _best(linked, repeat)
+    images = linked()
+    assert [img.code for img in images] == whole()
+    t_reloc = _best(lambda: [img.relocate(256) for img in images], repeat)
+    return {
+        'programs': programs,
+        'words': len(images[0]),
+        'relocs': len(images[0].relocs),
+        'whole': t_whole,
+        'linked': t_link,
+        'relocate': t_reloc,
+    }
+
+
+def _peak(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stream(lines=1000000, repeat=3, seed=1):
+    """大源码文件: 整个读入后 assemble vs 逐行 assemble_stream (带/不带行号表) 的耗时和内存峰值"""
+    from utils.assembler import Assembler
+    
+    fd, path = tempfile.mkstemp(prefix="lzyasm-", suffix=".s")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for line in synthetic_lines(lines, seed):
+                f.write(line + "\n")
+        
+        def whole():
+            with open(path) as f:
+                return Assembler().assemble(f.read())
+        
+        def stream():
+            with open(path) as f:
+                return Assembler().assemble_stream(f)
+        
+        def stream_bare():
+            with open(path) as f:
+                return Assembler().assemble_stream(f, line_map=False)
+        
+        expected = whole()
+        assert stream().tolist() == expected and stream_bare().tolist() == expected
+        results = []
+        for label, fn in (("assemble (read all)", whole), ("stream", stream),
+                          ("stream, no line map", stream_bare)):
+            results.append((label, {'time': _best(fn, repeat), 'peak': _peak(fn)}))
+        return {'lines': lines, 'words': len(expected), 'bytes': os.path.getsize(path), 'results': results}
+    finally:
+        os.remove(path)
+
+
+def format_stream(r):
+    out = ["{:,} lines ({:.1f} MiB) -> {:,} words".format(r['lines'], r['bytes'] / 2**20, r['words']),
+           "{:<22} {:>9} {:>12} {:>11}".format("MODE", "TIME", "LINES/S", "PEAK MEM")]
+    for label, m in r['results']:
+        out.append("{:<22} {:>8.2f}s {:>12,.0f} {:>7.1f} MiB".format(
+            label, m['time'], r['lines'] / m['time'], m['peak'] / 2**20))
+    return "\n".join(out)
+
+
+def memory_image(words, seed=1):
+    """长时间运行后的内存映像: 前 1/4 为汇编好的代码, 其余为 0, 散布 1% 的非零数据"""
+    from utils.assembler import Assembler
+    
+    rng = random.Random(seed)
+    image = [0] * words
+    code = Assembler().assemble_stream(synthetic_lines(words // 6, seed), line_map=False)
+    n = min(len(code), words // 4)
+    image[:n] = code[:n]
+    for _ in range(words // 100):
+        image[rng.randrange(n, words)] = rng.randrange(1, 1 << 20)
+    return image
+
+
+def bench_disasm(words=4000000, repeat=3, seed=1):
+    """大内存映像: 完整清单 (合并 / 不合并连续的 0)、取前 50 行、中间 1000 个字的范围"""
+    from utils.disasm import Disassembler
+    
+    image = memory_image(words, seed)
+    merged = Disassembler()
+    plain = Disassembler(collapse=0)
+    mid = words // 2
+    cases = (
+        ("full listing", lambda: sum(1 for _ in merged.listing(image))),
+        ("full, no collapsing", lambda: sum(1 for _ in plain.listing(image))),
+        ("first 50 lines", lambda: sum(1 for _, _ in zip(range(50), merged.listing(image)))),
+        ("1000-word range", lambda: sum(1 for _ in merged.listing(image, mid, mid + 1000))),
+    )
+    results = []
+    for label, fn in cases:
+        results.append((label, {'lines': fn(), 'time': _best(fn, repeat)}))
+    return {'words': words, 'results': results}
+
+
+def format_disasm(r):
+    out = ["{:,} word image ({:.0f} MiB as int64)".format(r['words'], r['words'] * 8 / 2**20),
+           "{:<22} {:>11} {:>11}".format("LISTING", "LINES", "TIME")]
+    for label, m in r['results']:
+        out.append("{:<22} {:>11,} {:>9.1f}ms".format(label, m['lines'], m['time'] * 1000))
+    return "\n".join(out)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="LZY-OS assembler benchmarks")
+    sub = ap.add_subparsers(dest='bench')
+    p = sub.add_parser('cache', help="assembling vs program cache hits (memory and disk)")
+    p.add_argument('--lines', type=int, default=2000, help="synthetic source size")
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--seed', type=int, default=1)
+    p = sub.add_parser('link', help="build a program suite sharing a library: reassemble vs link")
+    p.add_argument('--programs', type=int, default=50)
+    p.add_argument('--lib-lines', type=int, default=2000)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--seed', type=int, default=1)
+    p = sub.add_parser('stream', help="whole-source assemble vs streaming assembly of a large file")
+    p.add_argument('--lines', type=int, default=1000000)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--seed', type=int, default=1)
+    p = sub.add_parser('disasm', help="disassembly listings of a large memory image")
+    p.add_argument('--words', type=int, default=4000000)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args(argv)
+    
+    if args.bench == 'cache':
+        print(f"[cache] best of {args.repeat} runs")
+        print(format_cache(bench_cache(args.lines, args.repeat, args.seed)))
+    elif args.bench == 'link':
+        print(f"[link] {args.programs} programs, each using a {args.lib_lines}-line library")
+        r = bench_link(args.programs, args.lib_lines, args.repeat, args.seed)
+        print(f"image:      {r['words']:,} words, {r['relocs']:,} relocations")
+        print(f"reassemble: {r['whole'] * 1000:.1f} ms  (library assembled into every program)")
+        print(f"link:       {r['linked'] * 1000:.1f} ms  (library assembled once, {r['whole'] / r['linked']:.1f}x)")
+        print(f"relocate:   {r['relocate'] / r['programs'] * 1e6:.0f} us per program to load at another base")
+    elif args.bench == 'stream':
+        print(f"[stream] best of {args.repeat} runs, peak memory traced separately")
+        print(format_stream(bench_stream(args.lines, args.repeat, args.seed)))
+    elif args.bench == 'disasm':
+        print(f"[disasm] best of {args.repeat} runs")
+        print(format_disasm(bench_disasm(args.words, args.repeat, args.seed)))
+    else:
+        ap.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,63 @@
 """LZY-OS Assembler - 汇编器模块"""
+from array import array
+from bisect import bisect_right
+
+
+class LineMap:
+    """行号表 - 每条指令的 (地址, 源码行号), 地址递增; 两列各存为一个 array('I')
+    
+    迭代、下标得到 (地址, 行号) 对, 与原来的 [(地址, 行号)] 列表用法相同。
+    """
+    __slots__ = ('addrs', 'lines')
+    
+    def __init__(self, pairs=()):
+        if isinstance(pairs, LineMap):
+            self.addrs = array('I', pairs.addrs)
+            self.lines = array('I', pairs.lines)
+            return
+        self.addrs = array('I')
+        self.lines = array('I')
+        for addr, line in pairs:
+            self.addrs.append(addr)
+            self.lines.append(line)
+    
+    @classmethod
+    def from_columns(cls, addrs, lines):
+        if len(addrs) != len(lines):
+            raise ValueError("line map columns differ in length")
+        line_map = cls()
+        line_map.addrs = array('I', addrs)
+        line_map.lines = array('I', lines)
+        return line_map
+    
+    def append(self, addr, line):
+        self.addrs.append(addr)
+        self.lines.append(line)
+    
+    def line_of(self, addr):
+        """地址所在指令的源码行号; 在第一条指令之前时返回 None"""
+        i = bisect_right(self.addrs, addr)
+        return self.lines[i - 1] if i else None
+    
+    def __len__(self):
+        return len(self.addrs)
+    
+    def __iter__(self):
+        return zip(self.addrs, self.lines)
+    
+    def __getitem__(self, i):
+        return self.addrs[i], self.lines[i]
+    
+    def __eq__(self, other):
+        if isinstance(other, LineMap):
+            return self.addrs == other.addrs and self.lines == other.lines
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+    
+    def __repr__(self):
+        return f"LineMap({list(self)!r})"
+
 
 class Assembler:
     """简易汇编器"""
@@ -12,71 +71,145 @@ class Assembler:
     def __init__(self):
         self.symbols = {}
         self.program = []
+        self.line_map = LineMap()   # (address, source line number) of every instruction
+        self.exports = []       # names declared with .global
+        self.imports = []       # names declared with .extern, resolved by the linker
+        self.relocs = []        # (address, None for a local label | imported name)
     
     def assemble(self, source):
-        """汇编源代码 -> 机器码"""
-        self.program = []
-        self.symbols = {}
-        lines = source.strip().split('\n')
+        """汇编源代码 -> 机器码 (list)
         
-        # pass 1: collect labels
-        addr = 0
-        for line in lines:
-            line = line.split('#')[0].strip()
-            if not line:
-                continue
-            if line.endswith(':'):
-                self.symbols[line[:-1].strip()] = addr
+        标签可以单独一行, 也可以写在指令前 ("loop: ADD 100")。伪指令: .global 名字...
+        导出标签, .extern 名字... 声明其它模块的标签, .word 值... 放置数据字。
+        用到标签的操作数都记入重定位表, 供链接和装入时加上基址。
+        源码有错时抛出 ValueError, 消息以 "line N:" 开头。
+        """
+        return self.assemble_stream(source.split('\n')).tolist()
+    
+    def assemble_stream(self, lines, line_map=True):
+        """逐行汇编任意文本行迭代器 (如打开的文件) -> 机器码 array('q')
+        
+        只读一遍源码: 前向引用的标签先记下位置, 定义出现或读完后回填, 整个源码
+        不必同时放在内存里。行号表 (LineMap) 每条指令占 8 字节; line_map=False 时不记录。
+        """
+        if isinstance(lines, str):
+            lines = lines.split('\n')
+        # mnemonic -> (opcode, 0 no operand | 1 one operand | 2 optional, for MOV)
+        forms = {}
+        for name, code in self.OPCODES.items():
+            arity = 0 if name in self.NO_OPERAND else 2 if name == 'MOV' else 1
+            forms[name] = forms[name.lower()] = (code, arity)
+        program = array('q')
+        emit = program.append
+        symbols = {}
+        lines_out = LineMap()
+        map_addr, map_line = lines_out.addrs.append, lines_out.lines.append
+        exports = []
+        imports = []
+        relocs = []
+        pending = {}        # symbol -> [first line used, addresses to backpatch]
+        
+        def operand(op, lineno):
+            try:
+                return int(op)
+            except ValueError:
+                pass
+            addr = len(program)
+            if op in symbols:
+                relocs.append((addr, None))
+                return symbols[op]
+            # not defined yet: a later label wins over an .extern of the same name
+            if op in pending:
+                pending[op][1].append(addr)
             else:
-                tokens = line.split()
-                if tokens and tokens[0].upper() in self.OPCODES:
-                    addr += 1
-                    if tokens[0].upper() not in self.NO_OPERAND:
-                        addr += 1
+                pending[op] = [lineno, [addr]]
+            return 0
         
-        # pass 2: generate code
-        for line in lines:
-            line = line.split('#')[0].strip()
-            if not line or line.endswith(':'):
-                continue
-            tokens = line.split()
-            if not tokens:
-                continue
-            
-            instr = tokens[0].upper()
-            if instr in self.OPCODES:
-                self.program.append(self.OPCODES[instr])
-                if len(tokens) > 1:
-                    op = tokens[1]
-                    if op in self.symbols:
-                        self.program.append(self.symbols[op])
-                    else:
+        lineno = 0
+        try:
+            for lineno, line in enumerate(lines, 1):
+                if '#' in line:
+                    line = line[:line.index('#')]
+                if ':' in line:
+                    label, _, line = line.partition(':')
+                    label = label.strip()
+                    if not label or label.split()[0] != label or label.lstrip('+-').isdigit():
+                        raise ValueError(f"bad label: {label!r}")
+                    if label in symbols:
+                        raise ValueError(f"label {label} is already defined")
+                    addr = symbols[label] = len(program)
+                    fixups = pending.pop(label, None)
+                    if fixups is not None:
+                        for at in fixups[1]:
+                            program[at] = addr
+                            relocs.append((at, None))
+                if ',' in line:
+                    line = line.replace(',', ' ')
+                tokens = line.split()
+                if not tokens:
+                    continue
+                n = len(tokens)
+                form = forms.get(tokens[0]) or forms.get(tokens[0].upper())
+                if form is not None:
+                    code, arity = form
+                    if line_map:
+                        map_addr(len(program))
+                        map_line(lineno)
+                    emit(code)
+                    if n == 2 and arity:
+                        arg = tokens[1]
                         try:
-                            self.program.append(int(op))
+                            emit(int(arg))
                         except ValueError:
-                            self.program.append(0)
-        return self.program
-    
-    def disassemble(self, program):
-        """机器码 -> 汇编"""
-        rev = {v: k for k, v in self.OPCODES.items()}
-        needs_op = [k for k in self.OPCODES if k not in self.NO_OPERAND]
-        lines = []
-        i = 0
-        while i < len(program):
-            code = program[i]
-            if code in rev:
-                name = rev[code]
-                if name in needs_op and i + 1 < len(program):
-                    lines.append(f"{i:3d}: {name} {program[i+1]}")
-                    i += 2
+                            emit(operand(arg, lineno))
+                    elif n > 1 or arity == 1:
+                        name = tokens[0].upper()
+                        if not arity:
+                            raise ValueError(f"{name} takes no operand")
+                        if n > 2:
+                            raise ValueError(f"{name} takes one operand, got {n - 1}")
+                        raise ValueError(f"{name} needs an operand")
+                    continue
+                head = tokens[0].upper()
+                if head == '.WORD':
+                    for op in tokens[1:]:
+                        emit(operand(op, lineno))
+                elif head == '.GLOBAL':
+                    exports.extend(t for t in tokens[1:] if t not in exports)
+                elif head == '.EXTERN':
+                    imports.extend(t for t in tokens[1:] if t not in imports)
                 else:
-                    lines.append(f"{i:3d}: {name}")
-                    i += 1
+                    raise ValueError(f"unknown instruction: {tokens[0]}")
+        except OverflowError:
+            raise ValueError(f"line {lineno}: operand does not fit in 64 bits")
+        except ValueError as e:
+            raise ValueError(f"line {lineno}: {e}") from None
+        
+        # whatever is still unresolved must be an import
+        undefined = []
+        for name, (first, addrs) in pending.items():
+            if name in imports:
+                relocs.extend((at, name) for at in addrs)
             else:
-                lines.append(f"{i:3d}: DATA {code}")
-                i += 1
-        return "\n".join(lines)
+                undefined.append((first, name))
+        if undefined:
+            first, name = min(undefined)
+            raise ValueError(f"line {first}: undefined symbol: {name}")
+        relocs.sort()      # backpatched entries were appended when their label appeared
+        
+        self.program = program
+        self.symbols = symbols
+        self.line_map = lines_out
+        self.exports = exports
+        self.imports = imports
+        self.relocs = relocs
+        return program
+    
+    def disassemble(self, program):
+        """机器码 -> 汇编 (引擎见 utils.disasm.Disassembler)"""
+        from .disasm import Disassembler
+        return "\n".join(Disassembler().listing(program))
+
 
 class SimpleProgram:
     """示例程序集"""
@@ -0,0 +1,321 @@
+"""LZY-OS CFG - 汇编程序的控制流图与周期数上下界分析"""
+import heapq
+
+from .assembler import Assembler
+
+_OP = Assembler.OPCODES
+LOAD, JMP, JZ, HALT, STORE = _OP['LOAD'], _OP['JMP'], _OP['JZ'], _OP['HALT'], _OP['STORE']
+# words per instruction as the CPU executes it: MOV, PRINT, HALT and unknown opcodes take one
+_ARITH = {_OP[name] for name in ('ADD', 'SUB', 'MUL', 'DIV')}
+_TWO_WORD = _ARITH | {LOAD, STORE, JMP, JZ}
+EXIT = -1                   # successor meaning "control leaves the program"
+LOOP_TRIPS = 10             # assumed iterations of a loop whose trip count is unknown
+
+
+class Block:
+    """基本块: [start, end) 内的指令, 每条指令执行一个周期"""
+    __slots__ = ('start', 'end', 'count', 'succ', 'label', 'halts', 'loop')
+    
+    def __init__(self, start):
+        self.start = start
+        self.end = start
+        self.count = 0          # instructions, i.e. cycles for one pass through the block
+        self.succ = []          # successor block starts; EXIT when control leaves the program
+        self.label = None
+        self.halts = False
+        self.loop = None        # index into Analysis.loops
+
+
+class Analysis:
+    """analyze() 的结果
+    
+    best / worst 为从入口到 HALT 的最少 / 最多周期数 (含 HALT), 无法确定时为 None:
+    程序可能跳出自身或改写自身代码时两者都为 None, 可到达的循环使 worst 为 None。
+    never_halts 为 True 表示静态上可以断定程序不会停机。
+    """
+    
+    def __init__(self, base, size):
+        self.base = base
+        self.size = size
+        self.blocks = {}            # start -> Block, in address order
+        self.loops = []             # sorted block starts of every strongly connected loop
+        self.traps = []             # indices of loops that can never reach HALT
+        self.escapes = False
+        self.writes_code = False
+        self.best = None
+        self.worst = None
+        self.estimate = None        # expected cycles: worst, or loops counted LOOP_TRIPS times
+        self.never_halts = False
+    
+    def block_at(self, addr):
+        """包含 addr 处指令的块 (没有时返回 None)"""
+        for block in self.blocks.values():
+            if block.start <= addr < block.end:
+                return block
+        return None
+    
+    def describe(self, start):
+        block = self.blocks[start]
+        return f"{start} ({block.label})" if block.label else str(start)
+
+
+def _decode(code, base, entry):
+    """从入口按 CPU 的执行方式找出所有可到达的指令; 返回 {地址: (操作码, 操作数, 长度)}"""
+    end = base + len(code)
+    instrs = {}
+    stack = [entry]
+    while stack:
+        addr = stack.pop()
+        if addr in instrs or not base <= addr < end:
+            continue
+        op = code[addr - base]
+        size = 2 if op in _TWO_WORD else 1
+        arg = code[addr + 1 - base] if size == 2 and addr + 1 < end else None
+        instrs[addr] = (op, arg, size)
+        if op == HALT:
+            continue
+        if op in (JMP, JZ) and arg is not None:
+            stack.append(arg)
+        if op != JMP:
+            stack.append(addr + size)
+    return instrs
+
+
+def _successors(op, arg, addr, size, base, end):
+    if op == HALT:
+        return []
+    nxt = addr + size
+    if addr + size > end or (op in (JMP, JZ) and arg is None):
+        return [EXIT]       # operand word lies past the program
+    targets = []
+    if op in (JMP, JZ):
+        targets.append(arg if base <= arg < end else EXIT)
+    if op != JMP:
+        targets.append(nxt if nxt < end else EXIT)
+    return targets
+
+
+def _build_blocks(analysis, code, instrs, symbols):
+    base, end = analysis.base, analysis.base + analysis.size
+    leaders = {analysis.base}
+    for addr, (op, arg, size) in instrs.items():
+        if op in (JMP, JZ, HALT):
+            leaders.update(s for s in _successors(op, arg, addr, size, base, end) if s != EXIT)
+            leaders.add(addr + size)
+    # words the CPU executes: a STORE onto one of them makes the analysis unsound
+    executed = {addr + i for addr, (_, _, size) in instrs.items() for i in range(size)}
+    labels = {}
+    for name, value in (symbols or {}).items():
+        labels.setdefault(base + value, name)
+    
+    for start in sorted(a for a in leaders if a in instrs):
+        block = Block(start)
+        block.label = labels.get(start)
+        addr = start
+        acc = None          # ACC value known from a LOAD earlier in this block
+        while True:
+            op, arg, size = instrs[addr]
+            block.count += 1
+            if op == LOAD:
+                acc = arg
+            elif op in _ARITH:
+                acc = None
+            if op == STORE and arg in executed:
+                analysis.writes_code = True
+            nxt = addr + size
+            if op in (JMP, JZ, HALT) or nxt not in instrs or nxt in leaders:
+                succ = _successors(op, arg, addr, size, base, end)
+                if op == JZ and acc is not None and len(succ) == 2:
+                    # the branch is decided inside the block
+                    succ = succ[:1] if acc == 0 else succ[1:]
+                block.succ = succ
+                block.halts = op == HALT
+                block.end = nxt
+                break
+            addr = nxt
+        analysis.blocks[start] = block
+
+
+def _reachable(blocks, entry):
+    seen = set()
+    stack = [entry]
+    while stack:
+        start = stack.pop()
+        if start in seen or start == EXIT:
+            continue
+        seen.add(start)
+        stack.extend(blocks[start].succ)
+    return seen
+
+
+def _loops(blocks):
+    """Tarjan 强连通分量 (迭代实现); 返回含环的分量"""
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    loops = []
+    counter = 0
+    for root in blocks:
+        if root in index:
+            continue
+        work = [(root, iter(blocks[root].succ))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, it = work[-1]
+            for succ in it:
+                if succ == EXIT:
+                    continue
+                if succ not in index:
+                    index[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(blocks[succ].succ)))
+                    break
+                if succ in on_stack:
+                    low[node] = min(low[node], index[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in blocks[node].succ:
+                        loops.append(sorted(component))
+    return sorted(loops)
+
+
+def _bounds(analysis, entry, live):
+    """live: 可到达且能到达 HALT 的块。best 用 Dijkstra, worst / estimate 用缩点后 DAG 上的最长路"""
+    blocks = analysis.blocks
+    dist = {entry: blocks[entry].count}
+    heap = [(dist[entry], entry)]
+    best = None
+    while heap:
+        d, start = heapq.heappop(heap)
+        if d > dist[start]:
+            continue
+        if blocks[start].halts:
+            best = d
+            break
+        for succ in blocks[start].succ:
+            if succ == EXIT:
+                continue
+            nd = d + blocks[succ].count
+            if nd < dist.get(succ, float('inf')):
+                dist[succ] = nd
+                heapq.heappush(heap, (nd, succ))
+    analysis.best = best
+    
+    # condense loops into single nodes, then take the longest path in topological order
+    node_of = {start: ('b', start) for start in live}
+    weight = {}
+    for start in live:
+        weight[node_of[start]] = blocks[start].count
+    for i, loop in enumerate(analysis.loops):
+        members = [s for s in loop if s in live]
+        if not members:
+            continue
+        for s in members:
+            node_of[s] = ('l', i)
+        weight[('l', i)] = sum(blocks[s].count for s in members) * LOOP_TRIPS
+    edges = {node: set() for node in weight}
+    indegree = dict.fromkeys(weight, 0)
+    for start in live:
+        for succ in blocks[start].succ:
+            if succ in live and node_of[succ] != node_of[start] and node_of[succ] not in edges[node_of[start]]:
+                edges[node_of[start]].add(node_of[succ])
+                indegree[node_of[succ]] += 1
+    longest = {node_of[entry]: weight[node_of[entry]]}
+    order = [node for node, n in indegree.items() if n == 0]
+    while order:
+        node = order.pop()
+        for succ in edges[node]:
+            if node in longest:
+                longest[succ] = max(longest.get(succ, 0), longest[node] + weight[succ])
+            indegree[succ] -= 1
+            if not indegree[succ]:
+                order.append(succ)
+    ends = [longest[node_of[s]] for s in live if blocks[s].halts and node_of[s] in longest]
+    analysis.estimate = max(ends) if ends else None
+    looping = any(node[0] == 'l' for node in weight)
+    analysis.worst = None if looping or analysis.traps else analysis.estimate
+
+
+def analyze(code, base=0, symbols=None, entry=None):
+    """对装入到 base 处的代码做静态分析, 入口默认为 base; symbols (标签 -> 相对地址) 只用于给块命名
+    
+    跳转目标取自 JMP/JZ 的操作数字 (汇编器把标签解析进这些字, 重定位后仍是绝对地址)。
+    块内 LOAD 确定了 ACC 的 JZ 只保留实际会走的那条边。
+    """
+    entry = base if entry is None else entry
+    analysis = Analysis(base, len(code))
+    if not base <= entry < base + len(code):
+        analysis.escapes = True
+        return analysis
+    instrs = _decode(code, base, entry)
+    _build_blocks(analysis, code, instrs, symbols)
+    blocks = analysis.blocks
+    reachable = _reachable(blocks, entry)
+    analysis.blocks = {start: blocks[start] for start in sorted(reachable)}
+    blocks = analysis.blocks
+    analysis.escapes = any(EXIT in b.succ for b in blocks.values())
+    analysis.loops = _loops(blocks)
+    for i, loop in enumerate(analysis.loops):
+        for start in loop:
+            blocks[start].loop = i
+    
+    # blocks from which HALT (or, conservatively, an exit from the program) is reachable
+    preds = {start: [] for start in blocks}
+    for start, block in blocks.items():
+        for succ in block.succ:
+            if succ != EXIT:
+                preds[succ].append(start)
+    finishing = [s for s, b in blocks.items() if b.halts or EXIT in b.succ]
+    can_finish = set()
+    while finishing:
+        start = finishing.pop()
+        if start not in can_finish:
+            can_finish.add(start)
+            finishing.extend(preds[start])
+    analysis.traps = [i for i, loop in enumerate(analysis.loops) if not can_finish.intersection(loop)]
+    analysis.never_halts = entry not in can_finish and not analysis.writes_code
+    if analysis.escapes or analysis.writes_code or analysis.never_halts:
+        return analysis
+    _bounds(analysis, entry, can_finish)
+    return analysis
+
+
+def format_analysis(analysis):
+    blocks = analysis.blocks
+    lines = ["{:>6} {:>6} {:>6}  {:<12} {}".format("START", "END", "INSNS", "LABEL", "SUCCESSORS")]
+    for start, block in blocks.items():
+        succ = ", ".join("exit" if s == EXIT else str(s) for s in block.succ) or "halt"
+        loop = f"  [loop {block.loop}]" if block.loop is not None else ""
+        lines.append("{:>6} {:>6} {:>6}  {:<12} {}{}".format(
+            start, block.end, block.count, block.label or "", succ, loop))
+    summary = "[cfg] {} blocks, {} loop(s)".format(len(blocks), len(analysis.loops))
+    if analysis.never_halts:
+        summary += ", never halts"
+    elif analysis.escapes:
+        summary += ", control can leave the program: cycles unknown"
+    elif analysis.writes_code:
+        summary += ", writes its own code: cycles unknown"
+    else:
+        worst = analysis.worst if analysis.worst is not None else "unbounded"
+        summary += ", cycles best {} worst {} (estimate {})".format(analysis.best, worst, analysis.estimate)
+    lines.insert(0, summary)
+    for i in analysis.traps:
+        lines.append("[cfg] loop at {} can never reach HALT".format(analysis.describe(analysis.loops[i][0])))
+    return "\n".join(lines)
@@ -0,0 +1,154 @@
+"""LZY-OS Disassembler - 成块解码的反汇编引擎与清单生成"""
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .assembler import Assembler
+
+
+class Disassembler:
+    """反汇编引擎 - 操作码表只在类定义时建一次, 清单按需逐行生成
+    
+    按 CPU 的执行方式解码: MOV / PRINT / HALT 和未知操作码占一个字, 其余指令占两个字;
+    不是操作码的字显示为 DATA。collapse 个及以上连续的 0 字合成一行 (0 表示不合并)。
+    """
+    NAMES = {code: name for name, code in Assembler.OPCODES.items()}
+    SIZES = {code: 1 if name in Assembler.NO_OPERAND or name == 'MOV' else 2
+             for name, code in Assembler.OPCODES.items()}
+    # operands that are addresses (LOAD takes an immediate)
+    ADDRESS_OPS = {code for name, code in Assembler.OPCODES.items()
+                   if name not in Assembler.NO_OPERAND and name not in ('MOV', 'LOAD')}
+    
+    def __init__(self, collapse=8):
+        self.collapse = collapse
+    
+    def _zero_runs(self, words, lo, hi, chunk=4096):
+        """按块产生 [lo, hi) 中至少 collapse 个连续 0 字的区间 (first, last)
+        
+        每块转成 int64 数组后在字节上用正则查找; 0 字与字节序无关, 不必换序。每块之后
+        产生一个空区间 (last + 1, last), 表示 last 之前没有别的区间, 调用者不必多读块。
+        """
+        if not self.collapse:
+            return
+        size = array('q').itemsize
+        pattern = re.compile(b'\0{%d,}' % (size * self.collapse))
+        pending = None      # zero run reaching the end of the previous chunk
+        for at in range(lo, hi, chunk):
+            stop = min(at + chunk, hi)
+            try:
+                raw = array('q', words[at:stop]).tobytes()
+            except (OverflowError, TypeError):
+                # words past 64 bits: nothing in this chunk is collapsed
+                if pending is not None and pending[1] - pending[0] + 1 >= self.collapse:
+                    yield pending
+                pending = None
+                yield stop, stop - 1
+                continue
+            n = stop - at
+            lead = (len(raw) - len(raw.lstrip(b'\0'))) // size
+            if pending is not None:
+                if lead == n:
+                    pending = (pending[0], stop - 1)
+                    continue
+                last = at + lead - 1 if lead else pending[1]
+                if last - pending[0] + 1 >= self.collapse:
+                    yield pending[0], last
+                pending = None
+                skip = lead
+            else:
+                skip = 0
+            tail = (len(raw) - len(raw.rstrip(b'\0'))) // size
+            for m in pattern.finditer(raw, skip * size):
+                if m.end() == len(raw):
+                    break       # the tail run continues into the next chunk
+                first = -(-m.start() // size)
+                last = m.end() // size - 1
+                if last - first + 1 >= self.collapse:
+                    yield at + first, at + last
+            if tail:
+                pending = (stop - tail, stop - 1)
+            yield stop - tail, stop - tail - 1
+        if pending is not None and pending[1] - pending[0] + 1 >= self.collapse:
+            yield pending
+    
+    def decode(self, words, start=0, end=None, base=0, starts=None, breaks=()):
+        """逐条产生 (地址, 操作码 | None, 操作数 | None, 字数); 操作码为 None 表示数据字
+        
+        words[i] 位于地址 base + i; start / end 为地址范围 [start, end)。
+        starts 为已知的指令起始地址集合 (如目标文件的行号表), 给出时其余字都按数据处理。
+        breaks 中的地址 (如标签) 总是从新的一条开始, 跨过它的双字指令按数据处理。
+        """
+        lo = max(start - base, 0)
+        hi = len(words) if end is None else max(lo, min(end - base, len(words)))
+        sizes = self.SIZES
+        runs = self._zero_runs(words, lo, hi)
+        run = next(runs, None)
+        i = lo
+        while i < hi:
+            while run is not None and run[1] < i:
+                run = next(runs, None)
+            if run is not None and run[0] <= i and run[1] - i + 1 >= self.collapse:
+                last = run[1]
+                yield base + i, None, 0, last - i + 1
+                i = last + 1
+                continue
+            word = words[i]
+            size = sizes.get(word) if starts is None or base + i in starts else None
+            if size == 2 and base + i + 1 in breaks:
+                size = None
+            if size is None:
+                yield base + i, None, word, 1
+                i += 1
+            elif size == 1:
+                yield base + i, word, None, 1
+                i += 1
+            else:
+                # an operand past the end of the image is shown as missing
+                yield base + i, word, words[i + 1] if i + 1 < len(words) else None, 2
+                i += 2
+    
+    def listing(self, source, start=0, end=None, symbols=None, base=0):
+        """source 为 ObjectFile、CPU 或字序列; 按需逐行产生清单, 带符号时标出标签和操作数引用的标签"""
+        starts = relocs = None
+        if hasattr(source, 'line_map'):
+            symbols = source.symbols if symbols is None else symbols
+            starts = {base + addr for addr in source.line_map.addrs} or None
+            relocs = {base + addr for addr, _ in source.relocs}
+            words = source.code
+        elif hasattr(source, 'memory'):
+            words = source.memory
+        else:
+            words = source
+        by_addr = {}
+        for name, value in (symbols or {}).items():
+            by_addr.setdefault(base + value, []).append(name)
+        marks = sorted(by_addr)
+        width = max(3, len(str(base + len(words) - 1)))
+        heads = {op: f": {name}" for op, name in self.NAMES.items()}
+        address_ops = self.ADDRESS_OPS
+        
+        for addr, op, arg, size in self.decode(words, start, end, base, starts, by_addr):
+            if by_addr:
+                # labels inside a collapsed run split it: list the run up to the first label
+                inside = marks[bisect_right(marks, addr):bisect_left(marks, addr + size)]
+                if op is None and size > 1 and inside:
+                    yield from self.listing(words, addr, inside[0], symbols, base)
+                    yield from self.listing(words, inside[0], addr + size, symbols, base)
+                    continue
+                for name in by_addr.get(addr, ()):
+                    yield f"{name}:"
+            if op is None:
+                if size == 1:
+                    yield f"{str(addr).rjust(width)}: DATA {arg}"
+                else:
+                    yield f"{str(addr).rjust(width)}: DATA 0 (x{size}, to {addr + size - 1})"
+            elif arg is not None:
+                if by_addr and arg in by_addr and (
+                        addr + 1 in relocs if relocs is not None else op in address_ops):
+                    yield f"{str(addr).rjust(width)}{heads[op]} {arg} <{by_addr[arg][0]}>"
+                else:
+                    yield f"{str(addr).rjust(width)}{heads[op]} {arg}"
+            elif size == 2:
+                yield f"{str(addr).rjust(width)}{heads[op]} ?"
+            else:
+                yield f"{str(addr).rjust(width)}{heads[op]}"
@@ -100,6 +100,37 @@ class ExperimentDemo:
         mem2.allocate("J4", 10)
         print(mem2.get_status())
     
+    @staticmethod
+    def memory_trace():
+        print("\n[Theory] Allocation Trace Replay:")
+        print("  - Record: allocate/deallocate calls -> compact (op, id, size) trace")
+        print("  - Replay: same trace against every placement policy")
+        print("  - Metrics: ops/sec, failure rate, fragmentation, final block count\n")
+        
+        from modules.memory_manager import MemoryManager
+        from utils.memtrace import TraceRecorder, synthetic_trace, replay, make_memory, format_results
+        
+        print("[record] J1(20) J2(15) J3(10) -J2 J4(10)")
+        print("-" * 50)
+        mem = MemoryManager("dynamic", size=64, policy_or_block="first-fit", verbose=False)
+        rec = TraceRecorder().attach(mem)
+        mem.allocate("J1", 20)
+        mem.allocate("J2", 15)
+        mem.allocate("J3", 10)
+        mem.deallocate("J2")
+        mem.allocate("J4", 10)
+        for op, hid, size in rec.trace:
+            print("  {} #{} {}".format("alloc" if op == 0 else "free ", hid, size or ""))
+        
+        print("\n[replay] 20000 synthetic ops (bimodal sizes) on 256KB")
+        print("-" * 50)
+        trace = synthetic_trace(20000, "bimodal", 1, 48, mean_lifetime=12, seed=7)
+        results = []
+        for policy in ("first-fit", "next-fit", "best-fit", "worst-fit", "tlsf"):
+            results.append((policy, replay(trace, make_memory("dynamic", 256, policy), 500)))
+        results.append(("fixed/16", replay(trace, make_memory("fixed", 256, 16), 500)))
+        print(format_results(results))
+    
     @staticmethod
     def process_scheduling():
         print("\n[Theory] Process Scheduling (Round Robin):")
@@ -178,3 +209,40 @@ class ExperimentDemo:
         content = fm.cat("/home/user/hello.txt")
         print(content)
         print("-" * 50)
+        
+        print("\n[batch] provisioning /srv/app (all-or-nothing)")
+        print("-" * 50)
+        ops = [("mkdir", "/srv"), ("mkdir", "/srv/app")]
+        for i in range(3):
+            ops.append(("touch", f"/srv/app/w{i}.cfg"))
+            ops.append(("write", f"/srv/app/w{i}.cfg", f"worker={i}"))
+        print(f"  results: {fm.batch(ops)}")
+        bad = [("mkdir", "/srv/tmp"), ("rm", "/srv/app/w0.cfg"), ("touch", "/srv/missing/x")]
+        print(f"  failing batch: {fm.batch(bad)}")
+        print(f"  rolled back: /srv/tmp exists={fm.fs.resolve('/srv/tmp') is not None}  "
+              f"w0.cfg={fm.cat('/srv/app/w0.cfg')}")
+        
+        print("\n[threads] 4 workers on one shared FileSystem (rw locks, per-thread cwd)")
+        print("-" * 50)
+        cfm = FileManager(concurrent=True)
+        cwds = {}
+        
+        def worker(n):
+            cfm.mkdir(f"/home/u{n}")
+            cfm.cd(f"/home/u{n}")
+            for i in range(50):
+                cfm.touch(f"note{i}.txt")
+                cfm.echo(f"note{i}.txt", f"u{n}-{i}")
+            cwds[n] = cfm.pwd()
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for n in range(4):
+            files = len(list(cfm.find(f"/home/u{n}", kind='f')))
+            print(f"  worker {n}: cwd={cwds[n]}  files={files}  last={cfm.cat(f'/home/u{n}/note49.txt')}")
+        lk = cfm.fs.lock_stats()
+        print(f"  locks: {lk['acquires']} acquires, {lk['contended']} contended")
+        print("-" * 50)
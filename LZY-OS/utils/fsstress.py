@@ -0,0 +1,186 @@
+"""LZY-OS FS Stress - 多线程文件系统压力测试"""
+import argparse
+import random
+import threading
+import time
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class GlobalLockFS:
+    """对照组: 普通 FileSystem 外面套一把全局互斥锁"""
+    def __init__(self, fs):
+        self.fs = fs
+        self.lock = threading.Lock()
+    
+    def __getattr__(self, name):
+        method = getattr(self.fs, name)
+        
+        def locked(*args, **kwargs):
+            with self.lock:
+                result = method(*args, **kwargs)
+                # lazy results (search, walk) must be consumed while the lock is held
+                if hasattr(result, '__next__'):
+                    result = iter(list(result))
+                return result
+        return locked
+
+
+def stress(fs, threads=4, ops=20000, shared_dirs=8, lookup_ratio=0.6, seed=1, relative=False):
+    """每个线程在自己的目录和共享目录中执行随机的查找/创建/写入/删除, 返回统计结果
+    
+    relative=True 时线程先 cd 到自己的目录, 私有文件用相对路径访问 (检验线程各自的 cwd)。
+    """
+    shared = [f"/shared/d{k}" for k in range(shared_dirs)]
+    fs.mkdir("/shared")
+    for d in shared:
+        fs.mkdir(d)
+    for t in range(threads):
+        fs.mkdir(f"/w{t}")
+    counts = [[0, 0] for _ in range(threads)]     # [lookups, updates]
+    errors = []
+    
+    def worker(tid):
+        rng = random.Random(seed * 1000 + tid)
+        home = f"/w{tid}"
+        if relative:
+            fs.cd(home)
+        mine = []
+        lookups = updates = 0
+        for i in range(ops):
+            r = rng.random()
+            if r < lookup_ratio:
+                lookups += 1
+                k = rng.random()
+                if k < 0.5 and mine:
+                    fs.resolve(rng.choice(mine))
+                elif k < 0.75:
+                    fs.ls(rng.choice(shared))
+                elif k < 0.9 and mine:
+                    fs.read(rng.choice(mine))
+                elif k < 0.97:
+                    for _ in fs.search(rng.choice(shared), name=f"t{tid}-*"):
+                        pass
+                else:
+                    fs.du(rng.choice(shared))
+                continue
+            updates += 1
+            r = rng.random()
+            if r < 0.35:
+                name = f"t{tid}-{i}.dat"
+                if rng.random() < 0.5:
+                    path = name if relative else f"{home}/{name}"
+                else:
+                    path = f"{rng.choice(shared)}/{name}"
+                if fs.touch(path):
+                    mine.append(path)
+            elif r < 0.65 and mine:
+                fs.write(rng.choice(mine), "x" * rng.randint(1, 2048))
+            elif r < 0.9 and mine:
+                fs.rm(mine.pop(rng.randrange(len(mine))))
+            elif r < 0.95:
+                fs.mkdir(f"{rng.choice(shared)}/s{tid}-{i}")
+            else:
+                # churn a shared directory under everyone else's feet
+                d = rng.choice(shared)
+                fs.rmdir(d, recursive=True)
+                fs.mkdir(d)
+        if relative and fs.pwd() != home:
+            errors.append(f"thread {tid}: cwd changed to {fs.pwd()}")
+        counts[tid] = [lookups, updates]
+    
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    total = threads * ops
+    return {
+        'threads': threads,
+        'ops': total,
+        'lookups': sum(c[0] for c in counts),
+        'updates': sum(c[1] for c in counts),
+        'elapsed': elapsed,
+        'ops_per_sec': total / elapsed if elapsed > 0 else 0.0,
+        'errors': errors,
+    }
+
+
+def check_invariants(fs):
+    """遍历整棵树, 检查 inode 计数、目录大小、目录项缓存和元数据索引"""
+    errors = []
+    nodes = 0
+    files = []
+    sizes = {}      # id(dir) -> sum of file sizes below it
+    for path, node, _ in fs.walk("/", "post"):
+        nodes += 1
+        if node.is_directory:
+            total = sum(sizes.pop(id(c)) if c.is_directory else c.size
+                        for c in fs._dir(node).values())
+            sizes[id(node)] = total
+            if node.tree_size is not None and node.tree_size != total:
+                errors.append(f"{path}: tree_size {node.tree_size} != {total}")
+        else:
+            files.append(path)
+    if nodes != fs.inode_count:
+        errors.append(f"inode_count {fs.inode_count} != {nodes} reachable inodes")
+    
+    # every cached dentry must match a fresh walk from the root
+    for key, cached in list(fs.dcache.entries.items()):
+        cur = fs.root
+        for p in key[1:].split("/"):
+            cur = fs._dir(cur).get(p) if cur is not None and cur.is_directory else None
+        if cur is not cached:
+            errors.append(f"dcache: stale entry {key}")
+    
+    if fs.index is not None:
+        indexed = sorted(fs.search("/"))
+        if indexed != sorted(files):
+            errors.append(f"index: {len(indexed)} files indexed, {len(files)} in the tree")
+    return errors
+
+
+def main(argv=None):
+    from modules.file_manager import FileSystem, ConcurrentFileSystem
+    
+    ap = argparse.ArgumentParser(description="LZY-OS concurrent file system stress benchmark")
+    ap.add_argument('--threads', type=int, default=4)
+    ap.add_argument('--ops', type=int, default=20000, help="operations per thread")
+    ap.add_argument('--shared', type=int, default=8, help="directories shared by all threads")
+    ap.add_argument('--lookups', type=float, default=0.6, help="fraction of operations that are lookups")
+    ap.add_argument('--stripes', type=int, default=64, help="reader-writer lock stripes")
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args(argv)
+    
+    modes = [
+        ("global lock", lambda: GlobalLockFS(FileSystem()), False),
+        (f"rw x{args.stripes}", lambda: ConcurrentFileSystem(stripes=args.stripes), True),
+    ]
+    ok = True
+    print(f"[stress] {args.threads} threads x {args.ops} ops, {args.lookups * 100:.0f}% lookups, "
+          f"{args.shared} shared dirs")
+    print("-" * 72)
+    print("{:<14} {:>12} {:>10} {:>10} {:>11} {:>9}".format(
+        "MODE", "OPS/SEC", "LOOKUPS", "UPDATES", "CONTENDED", "DCACHE%"))
+    for label, make, relative in modes:
+        fs = make()
+        fs.enable_index()
+        r = stress(fs, args.threads, args.ops, args.shared, args.lookups, args.seed, relative)
+        inner = getattr(fs, 'fs', fs)
+        contended = "{:.2f}%".format(inner.lock_stats()['contention_rate'] * 100) if relative else "-"
+        print("{:<14} {:>12,.0f} {:>10} {:>10} {:>11} {:>8.1f}%".format(
+            label, r['ops_per_sec'], r['lookups'], r['updates'], contended,
+            inner.dcache.stats()['hit_rate'] * 100))
+        for e in r['errors'] + check_invariants(inner):
+            ok = False
+            print(f"  [invariant] {e}")
+    print("-" * 72)
+    print("[result] invariants {}".format("ok" if ok else "VIOLATED"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,548 @@
+"""LZY-OS ISA Bench - 循环 / 访存 / 分支密集的基准程序集与指令吞吐量测试"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.assembler import Assembler
+
+_OP = Assembler.OPCODES
+_OUTPUT = re.compile(r"\[out\] Output: (-?\d+)")
+POLICIES = ("RR", "FCFS", "SJF", "PRIORITY")
+
+
+def counting_loop(n):
+    """倒数计数循环: 输出 1 + 2 + ... + n"""
+    source = f"""
+    # sum of 1..n, counting down
+    LOAD {n}
+    STORE i
+loop:
+    LOAD 0
+    ADD acc
+    ADD i
+    STORE acc
+    LOAD 0
+    ADD i
+    SUB one
+    STORE i
+    JZ done
+    JMP loop
+done:
+    LOAD 0
+    ADD acc
+    PRINT
+    HALT
+i: .word 0
+acc: .word 0
+one: .word 1
+"""
+    return source, [n * (n + 1) // 2]
+
+
+def array_sum(values):
+    """数组求和: 没有间接寻址, 循环改写 ADD 指令的操作数字来移动指针"""
+    source = f"""
+    # sum of an in-memory array through a self-modifying pointer
+    LOAD {len(values)}
+    STORE count
+loop:
+    LOAD 0
+    ADD sum
+    .word {_OP['ADD']}
+ptr: .word arr
+    STORE sum
+    LOAD 0
+    ADD ptr
+    ADD one
+    STORE ptr
+    LOAD 0
+    ADD count
+    SUB one
+    STORE count
+    JZ done
+    JMP loop
+done:
+    LOAD 0
+    ADD sum
+    PRINT
+    HALT
+count: .word 0
+sum: .word 0
+one: .word 1
+arr: .word {' '.join(map(str, values))}
+"""
+    return source, [sum(values)]
+
+
+def gcd_sum(n, k):
+    """欧几里得算法 (取模用 DIV / MUL / SUB 实现): 输出 gcd(k, 1) + ... + gcd(k, n)"""
+    source = f"""
+    # sum of gcd(k, i) for i = n..1
+    LOAD {n}
+    STORE i
+outer:
+    LOAD {k}
+    STORE a
+    LOAD 0
+    ADD i
+    STORE b
+euclid:
+    LOAD 0
+    ADD b
+    JZ found
+    LOAD 0
+    ADD a
+    DIV b
+    MUL b
+    STORE t
+    LOAD 0
+    ADD a
+    SUB t
+    STORE t
+    LOAD 0
+    ADD b
+    STORE a
+    LOAD 0
+    ADD t
+    STORE b
+    JMP euclid
+found:
+    LOAD 0
+    ADD total
+    ADD a
+    STORE total
+    LOAD 0
+    ADD i
+    SUB one
+    STORE i
+    JZ done
+    JMP outer
+done:
+    LOAD 0
+    ADD total
+    PRINT
+    HALT
+i: .word 0
+a: .word 0
+b: .word 0
+t: .word 0
+total: .word 0
+one: .word 1
+"""
+    return source, [sum(math.gcd(k, i) for i in range(1, n + 1))]
+
+
+def bubble_sort(values):
+    """内存中的冒泡排序, 依次输出排好序的元素; 只有 JZ, x > y 用 x // (y + 1) != 0 判断 (值非负)"""
+    if len(values) < 2 or min(values) < 0:
+        raise ValueError("bubble_sort needs at least two non-negative values")
+    add, store = _OP['ADD'], _OP['STORE']
+    source = f"""
+    # bubble sort; r1/w1 and r2/w2 are operand words pointing at a[j] and a[j + 1]
+    LOAD {len(values) - 1}
+    STORE passes
+outer:
+    LOAD arr
+    STORE r1
+    STORE w1
+    LOAD arr1
+    STORE r2
+    STORE w2
+    LOAD 0
+    ADD passes
+    STORE j
+inner:
+    LOAD 0
+    .word {add}
+r1: .word arr
+    STORE x
+    LOAD 0
+    .word {add}
+r2: .word arr1
+    STORE y
+    LOAD 0
+    ADD y
+    ADD one
+    STORE t
+    LOAD 0
+    ADD x
+    DIV t
+    JZ keep
+    LOAD 0
+    ADD y
+    .word {store}
+w1: .word arr
+    LOAD 0
+    ADD x
+    .word {store}
+w2: .word arr1
+keep:
+    LOAD 0
+    ADD r1
+    ADD one
+    STORE r1
+    STORE w1
+    LOAD 0
+    ADD r2
+    ADD one
+    STORE r2
+    STORE w2
+    LOAD 0
+    ADD j
+    SUB one
+    STORE j
+    JZ next
+    JMP inner
+next:
+    LOAD 0
+    ADD passes
+    SUB one
+    STORE passes
+    JZ show
+    JMP outer
+show:
+    LOAD arr
+    STORE p
+    LOAD {len(values)}
+    STORE j
+print:
+    LOAD 0
+    .word {add}
+p: .word arr
+    PRINT
+    LOAD 0
+    ADD p
+    ADD one
+    STORE p
+    LOAD 0
+    ADD j
+    SUB one
+    STORE j
+    JZ end
+    JMP print
+end:
+    HALT
+passes: .word 0
+j: .word 0
+x: .word 0
+y: .word 0
+t: .word 0
+one: .word 1
+arr: .word {values[0]}
+arr1: .word {' '.join(map(str, values[1:]))}
+"""
+    return source, sorted(values)
+
+
+def collatz(n):
+    """考拉兹序列 (奇偶判断用 DIV / MUL): 输出 1..n 各自到达 1 的步数之和"""
+    def steps(x):
+        count = 0
+        while x != 1:
+            x = x // 2 if x % 2 == 0 else 3 * x + 1
+            count += 1
+        return count
+    
+    source = f"""
+    # total Collatz steps for 1..n
+    LOAD {n}
+    STORE i
+outer:
+    LOAD 0
+    ADD i
+    STORE x
+step:
+    LOAD 0
+    ADD x
+    SUB one
+    JZ next
+    LOAD 0
+    ADD steps
+    ADD one
+    STORE steps
+    LOAD 0
+    ADD x
+    DIV two
+    MUL two
+    SUB x
+    JZ even
+    LOAD 0
+    ADD x
+    MUL three
+    ADD one
+    STORE x
+    JMP step
+even:
+    LOAD 0
+    ADD x
+    DIV two
+    STORE x
+    JMP step
+next:
+    LOAD 0
+    ADD i
+    SUB one
+    STORE i
+    JZ done
+    JMP outer
+done:
+    LOAD 0
+    ADD steps
+    PRINT
+    HALT
+i: .word 0
+x: .word 0
+steps: .word 0
+one: .word 1
+two: .word 2
+three: .word 3
+"""
+    return source, [sum(steps(x) for x in range(1, n + 1))]
+
+
+def corpus(scale=1.0, seed=1):
+    """基准程序集: [(名字, 源码, 期望输出)]; scale 按比例放大各程序的工作量"""
+    rng = random.Random(seed)
+    
+    def sized(n):
+        return max(2, int(n * scale))
+    
+    programs = [
+        ("count", counting_loop(sized(5000))),
+        ("array-sum", array_sum([rng.randrange(1000) for _ in range(sized(1000))])),
+        ("gcd", gcd_sum(sized(300), 360)),
+        ("bubble-sort", bubble_sort([rng.randrange(100) for _ in range(sized(40))])),
+        ("collatz", collatz(sized(100))),
+    ]
+    return [(name, source, expected) for name, (source, expected) in programs]
+
+
+def _captured(fn):
+    """运行 fn 并截获它的标准输出; 返回 (结果, 输出的数值)"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = fn()
+    return result, [int(v) for v in _OUTPUT.findall(out.getvalue())]
+
+
+def _check(name, got, expected):
+    if got != expected:
+        raise AssertionError(f"{name}: expected {expected[:8]}, got {got[:8]}")
+
+
+def bench_cpu(programs, repeat=3, memory_size=8192):
+    """每个程序在新的 CPU 上单独运行 (CPU.run), 按最好的一次计算每秒指令数"""
+    from core.cpu import CPU
+    from utils.objfile import ProgramCache
+    
+    cache = ProgramCache()
+    results = {}
+    for name, source, expected in programs:
+        code = cache.load(source)[0].code
+        best = float('inf')
+        for _ in range(repeat):
+            cpu = CPU(memory_size)
+            cpu.load_program(code)
+            t0 = time.perf_counter()
+            _, outputs = _captured(cpu.run)
+            best = min(best, time.perf_counter() - t0)
+            _check(name, outputs, expected)
+        results[name] = {'words': len(code), 'cycles': cpu.cycles, 'seconds': best, 'ips': cpu.cycles / best}
+    cycles = sum(r['cycles'] for r in results.values())
+    seconds = sum(r['seconds'] for r in results.values())
+    results['total'] = {'cycles': cycles, 'seconds': seconds, 'ips': cycles / seconds}
+    return results
+
+
+def _spawn(programs, policy, memory_size):
+    """所有程序各自装入一段内存, 作为一个 ProcessManager 的进程; 返回 (进程管理器, [(名字, PCB, 期望输出)])"""
+    from core.cpu import CPU
+    from modules.process_manager import ProcessManager
+    from utils.cfg import analyze
+    from utils.objfile import ProgramCache
+    
+    cache = ProgramCache()
+    pm = ProcessManager(CPU(memory_size), policy)
+    procs = []
+    base = 0
+    for name, source, expected in programs:
+        code = cache.load(source)[0].relocate(base)
+        if base + len(code) > memory_size:
+            raise ValueError(f"memory too small for the corpus ({memory_size} words)")
+        bound = analyze(code, base).worst
+        pcb = _captured(lambda: pm.create_process(code, name=name, base=base, estimate=bound))[0]
+        procs.append((name, pcb, expected))
+        base += len(code)
+    return pm, procs
+
+
+def _record_prints(pm, outputs):
+    """把 PRINT 换成按进程记录 ACC, 用于核对并发运行时每个进程的输出"""
+    cpu = pm.cpu
+    
+    def record():
+        outputs.setdefault(pm.scheduler.running_process.pid, []).append(cpu.registers['ACC'])
+        cpu.pc.inc()
+    
+    cpu.opcodes[_OP['PRINT']] = record
+
+
+def bench_scheduler(programs, policies=POLICIES, repeat=3, memory_size=8192):
+    """全部程序作为并发进程在 ProcessManager 下运行: 每种调度策略的每秒指令数和平均周转周期"""
+    results = {}
+    for policy in policies:
+        # correctness first: a separate run with PRINT recorded per process
+        pm, procs = _spawn(programs, policy, memory_size)
+        outputs = {}
+        _record_prints(pm, outputs)
+        _captured(lambda: pm.run(max_cycles=1 << 62))
+        for name, pcb, expected in procs:
+            _check(f"{name} ({policy})", outputs.get(pcb.pid, []), expected)
+        turnaround = sum(pcb.terminated_clock for _, pcb, _ in procs) / len(procs)
+        
+        best = float('inf')
+        for _ in range(repeat):
+            pm, procs = _spawn(programs, policy, memory_size)
+            t0 = time.perf_counter()
+            _captured(lambda: pm.run(max_cycles=1 << 62))
+            best = min(best, time.perf_counter() - t0)
+        results[policy] = {'cycles': pm.clock, 'seconds': best, 'ips': pm.clock / best,
+                           'mean_turnaround': turnaround}
+    return results
+
+
+def bench_end_to_end(programs, repeat=3, memory_size=8192):
+    """源码到结果: 汇编 (冷缓存)、链接、分配内存并装入、静态分析、在 ProcessManager 下运行"""
+    from core.cpu import CPU
+    from modules.memory_manager import MemoryManager
+    from modules.process_manager import ProcessManager
+    from utils.cfg import analyze
+    from utils.linker import link, load_image
+    from utils.objfile import ProgramCache
+    
+    def once():
+        cache = ProgramCache()
+        memory = MemoryManager("dynamic", memory_size, "first-fit", verbose=False)
+        pm = ProcessManager(CPU(memory_size), "RR")
+        for name, source, _ in programs:
+            loaded = load_image(link([cache.load(source)[0]], [name]), memory, name)
+            if loaded is None:
+                raise ValueError(f"memory too small for the corpus ({memory_size} words)")
+            base, code = loaded
+            pm.create_process(code, name=name, base=base, estimate=analyze(code, base).worst)
+        pm.run(max_cycles=1 << 62)
+        return pm
+    
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        pm, outputs = _captured(once)
+        best = min(best, time.perf_counter() - t0)
+    expected = sorted(v for _, _, values in programs for v in values)
+    _check("end-to-end", sorted(outputs), expected)
+    return {'cycles': pm.clock, 'seconds': best, 'ips': pm.clock / best}
+
+
+def run_suite(scale=1.0, repeat=3, seed=1, policies=POLICIES, memory_size=8192, sections=("cpu", "scheduler", "e2e")):
+    programs = corpus(scale, seed)
+    report = {
+        'suite': 'isabench',
+        'version': 1,
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {'scale': scale, 'repeat': repeat, 'seed': seed, 'memory': memory_size},
+    }
+    if "cpu" in sections:
+        report['cpu'] = bench_cpu(programs, repeat, memory_size)
+    if "scheduler" in sections:
+        report['scheduler'] = bench_scheduler(programs, policies, repeat, memory_size)
+    if "e2e" in sections:
+        report['end_to_end'] = bench_end_to_end(programs, repeat, memory_size)
+    return report
+
+
+def _rates(report):
+    """报告中所有的每秒指令数, 键为 "部分/名字" """
+    rates = {}
+    for section in ('cpu', 'scheduler'):
+        for name, r in report.get(section, {}).items():
+            rates[f"{section}/{name}"] = r['ips']
+    if 'end_to_end' in report:
+        rates['end_to_end'] = report['end_to_end']['ips']
+    return rates
+
+
+def format_report(report, baseline=None):
+    lines = []
+    if 'cpu' in report:
+        lines.append("{:<16} {:>7} {:>10} {:>10} {:>12}".format("CPU", "WORDS", "CYCLES", "TIME", "INSNS/S"))
+        for name, r in report['cpu'].items():
+            lines.append("{:<16} {:>7} {:>10,} {:>8.1f}ms {:>12,.0f}".format(
+                name, r.get('words', ''), r['cycles'], r['seconds'] * 1000, r['ips']))
+    if 'scheduler' in report:
+        lines.append("")
+        lines.append("{:<16} {:>7} {:>10} {:>10} {:>12}".format("SCHEDULER", "", "CYCLES", "TIME", "INSNS/S")
+                     + "  MEAN TURNAROUND")
+        for policy, r in report['scheduler'].items():
+            lines.append("{:<16} {:>7} {:>10,} {:>8.1f}ms {:>12,.0f}  {:,.0f} cycles".format(
+                policy, "", r['cycles'], r['seconds'] * 1000, r['ips'], r['mean_turnaround']))
+    if 'end_to_end' in report:
+        r = report['end_to_end']
+        lines.append("")
+        lines.append("{:<16} {:>7} {:>10,} {:>8.1f}ms {:>12,.0f}".format(
+            "end to end", "", r['cycles'], r['seconds'] * 1000, r['ips']))
+    if baseline is not None:
+        old = _rates(baseline)
+        lines.append("")
+        lines.append("vs {} ({})".format(baseline.get('timestamp', '?'), baseline.get('python', '?')))
+        for key, ips in _rates(report).items():
+            if key in old and old[key]:
+                lines.append("  {:<24} {:>12,.0f} -> {:>12,.0f}  {:>6.2f}x".format(key, old[key], ips, ips / old[key]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="LZY-OS instruction throughput benchmark suite")
+    ap.add_argument('--scale', type=float, default=1.0, help="workload size multiplier")
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--memory', type=int, default=8192, help="CPU memory (words)")
+    ap.add_argument('--policies', default=",".join(POLICIES))
+    ap.add_argument('--only', choices=("cpu", "scheduler", "e2e"), help="run one section")
+    ap.add_argument('--json', help="write the results to this file")
+    ap.add_argument('--compare', help="a JSON file from an earlier run to compare against")
+    ap.add_argument('--list', action='store_true', help="print the corpus sources and exit")
+    args = ap.parse_args(argv)
+    
+    if args.list:
+        for name, source, expected in corpus(args.scale, args.seed):
+            print(f"# ---- {name}: expected output {expected[:8]}{' ...' if len(expected) > 8 else ''}")
+            print(source)
+        return
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    sections = (args.only,) if args.only else ("cpu", "scheduler", "e2e")
+    policies = [p for p in args.policies.split(',') if p]
+    report = run_suite(args.scale, args.repeat, args.seed, policies, args.memory, sections)
+    print(f"[isabench] scale {args.scale}, best of {args.repeat} runs, outputs verified")
+    print(format_report(report, baseline))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[isabench] results -> {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""LZY-OS Linker - 多模块链接与重定位装入"""
+import hashlib
+
+from .objfile import ObjectFile
+
+
+def link(modules, names=None):
+    """按顺序拼接目标模块并解析 .extern 符号, 返回按地址 0 链接、仍可重定位的映像
+    
+    执行从第一个模块的第一条指令开始。映像的符号表含全部全局符号, 以及以
+    "模块名.标签" 命名的各模块局部标签。全局符号重复定义、.global 声明了却
+    没有定义, 或引用的符号没有任何模块导出时抛出 ValueError。
+    """
+    if not modules:
+        raise ValueError("nothing to link")
+    names = list(names) if names is not None else [f"module{i}" for i in range(len(modules))]
+    bases = []
+    symbols = {}
+    owner = {}
+    offset = 0
+    for name, obj in zip(names, modules):
+        bases.append(offset)
+        for sym in obj.exports:
+            if sym not in obj.symbols:
+                raise ValueError(f"{name}: exported symbol {sym} is not defined")
+            if sym in owner:
+                raise ValueError(f"{name}: {sym} is already defined in {owner[sym]}")
+            symbols[sym] = offset + obj.symbols[sym]
+            owner[sym] = name
+        offset += len(obj)
+    
+    code = []
+    relocs = []
+    missing = []
+    for name, obj, base in zip(names, modules, bases):
+        code.extend(obj.code)
+        for addr, sym in obj.relocs:
+            if sym is None:
+                code[base + addr] += base
+            elif sym in owner:
+                code[base + addr] += symbols[sym]
+            else:
+                missing.append(f"{sym} ({name})")
+                continue
+            # every patched word holds an address: it moves with the image
+            relocs.append((base + addr, None))
+        for label, value in obj.symbols.items():
+            if label not in obj.exports:
+                symbols[f"{name}.{label}"] = base + value
+    if missing:
+        raise ValueError("undefined symbols: " + ", ".join(missing))
+    digest = hashlib.blake2b(b''.join(obj.digest for obj in modules), digest_size=16).digest()
+    return ObjectFile(code, symbols, digest=digest, exports=list(owner), relocs=relocs)
+
+
+def load_image(image, memory_manager, name):
+    """向内存管理器申请 len(image) 个单元, 返回 (基址, 按基址重定位后的代码); 空间不足时返回 None"""
+    missing = image.unresolved()
+    if missing:
+        raise ValueError("unresolved symbols: " + ", ".join(missing))
+    base = memory_manager.allocate(name, len(image))
+    if base is None:
+        return None
+    return base, image.relocate(base)
@@ -0,0 +1,109 @@
+"""LZY-OS Memory Stress - 多线程内存分配压力测试"""
+import argparse
+import random
+import threading
+import time
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def stress(manager, threads=4, ops=250000, small_ratio=0.9, small_max=16, large_max=96,
+           max_live=64, share_every=16, seed=1):
+    """每个线程执行 ops 次随机分配/释放, 部分对象交给其它线程释放; 返回统计结果"""
+    handoff = []
+    handoff_lock = threading.Lock()
+    failures = [0] * threads
+    
+    def worker(tid):
+        rng = random.Random(seed * 1000 + tid)
+        live = []
+        seq = 0
+        for i in range(ops):
+            if live and (len(live) >= max_live or rng.random() < 0.5):
+                name = live.pop(rng.randrange(len(live)))
+                if share_every and i % share_every == 0:
+                    with handoff_lock:
+                        handoff.append(name)
+                    continue
+                manager.deallocate(name)
+            else:
+                if share_every and i % share_every == 1:
+                    with handoff_lock:
+                        name = handoff.pop() if handoff else None
+                    if name is not None:
+                        manager.deallocate(name)
+                        continue
+                size = rng.randint(1, small_max) if rng.random() < small_ratio else rng.randint(small_max + 1, large_max)
+                name = f"t{tid}-{seq}"
+                seq += 1
+                if manager.allocate(name, size) is None:
+                    failures[tid] += 1
+                else:
+                    live.append(name)
+    
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    
+    # invariants with the survivors still allocated, then after freeing everything
+    live_errors = manager.check_invariants()
+    for name in list(manager.allocations):
+        manager.deallocate(name)
+    manager.flush_caches()
+    final_errors = manager.check_invariants()
+    blocks = manager.memory.blocks
+    if len(blocks) != 1 or not blocks[0].free:
+        final_errors.append(f"memory not fully coalesced: {len(blocks)} blocks remain")
+    
+    total = threads * ops
+    return {
+        'threads': threads,
+        'ops': total,
+        'elapsed': elapsed,
+        'ops_per_sec': total / elapsed if elapsed > 0 else 0.0,
+        'failures': sum(failures),
+        'errors': live_errors + final_errors,
+        'contention': manager.get_contention_stats(),
+    }
+
+
+def main(argv=None):
+    from modules.memory_manager import ConcurrentMemoryManager
+    
+    ap = argparse.ArgumentParser(description="LZY-OS concurrent allocator stress benchmark")
+    ap.add_argument('--threads', type=int, default=4)
+    ap.add_argument('--ops', type=int, default=250000, help="operations per thread")
+    ap.add_argument('--size', type=int, default=16384, help="memory size (KB)")
+    ap.add_argument('--policy', default='first-fit')
+    ap.add_argument('--small', type=int, default=16, help="thread cache size limit (KB)")
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args(argv)
+    
+    modes = [("global lock", 0), (f"tcache <= {args.small}KB", args.small)]
+    ok = True
+    print(f"[stress] {args.threads} threads x {args.ops} ops, {args.size}KB {args.policy}")
+    print("-" * 72)
+    print("{:<16} {:>12} {:>9} {:>10} {:>11} {:>9}".format(
+        "MODE", "OPS/SEC", "FAILS", "LOCKS", "CONTENDED", "HIT%"))
+    for label, small in modes:
+        mgr = ConcurrentMemoryManager("dynamic", args.size, args.policy, small_size=small)
+        r = stress(mgr, args.threads, args.ops, small_max=max(args.small, 1), seed=args.seed)
+        c = r['contention']
+        print("{:<16} {:>12,.0f} {:>9} {:>10} {:>10.2f}% {:>8.1f}%".format(
+            label, r['ops_per_sec'], r['failures'], c['lock_acquires'],
+            c['contention_rate'] * 100, c['cache_hit_rate'] * 100))
+        for e in r['errors']:
+            ok = False
+            print(f"  [invariant] {e}")
+    print("-" * 72)
+    print("[result] invariants {}".format("ok" if ok else "VIOLATED"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""LZY-OS Memory Trace - 内存分配轨迹记录/回放模块"""
+import argparse
+import heapq
+import random
+import struct
+import sys
+import time
+from array import array
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+OP_ALLOC = 0
+OP_FREE = 1
+
+
+class AllocTrace:
+    """分配轨迹 - 以 (op, id, size) 三列数组紧凑存储"""
+    MAGIC = b'LZYT'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHI')
+    
+    def __init__(self):
+        self.ops = array('B')
+        self.ids = array('I')
+        self.sizes = array('I')
+    
+    def alloc(self, hid, size):
+        self.ops.append(OP_ALLOC)
+        self.ids.append(hid)
+        self.sizes.append(size)
+    
+    def free(self, hid):
+        self.ops.append(OP_FREE)
+        self.ids.append(hid)
+        self.sizes.append(0)
+    
+    def __len__(self):
+        return len(self.ops)
+    
+    def __iter__(self):
+        return zip(self.ops, self.ids, self.sizes)
+    
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.ops, self.ids, self.sizes))
+    
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, len(self)))
+            for col in (self.ops, self.ids, self.sizes):
+                if sys.byteorder == 'big':
+                    col = array(col.typecode, col)
+                    col.byteswap()
+                col.tofile(f)
+    
+    @classmethod
+    def load(cls, path):
+        trace = cls()
+        with open(path, 'rb') as f:
+            magic, version, count = cls.HEADER.unpack(f.read(cls.HEADER.size))
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f"not a trace file: {path}")
+            for col in (trace.ops, trace.ids, trace.sizes):
+                col.fromfile(f, count)
+                if sys.byteorder == 'big':
+                    col.byteswap()
+        return trace
+
+
+class TraceRecorder:
+    """轨迹记录器 - 挂到 MemoryManager.recorder 上记录 allocate/deallocate"""
+    def __init__(self, trace=None):
+        self.trace = trace if trace is not None else AllocTrace()
+        self.handles = {}
+        self.next_id = 0
+    
+    def attach(self, manager):
+        manager.recorder = self
+        return self
+    
+    def detach(self, manager):
+        if manager.recorder is self:
+            manager.recorder = None
+    
+    def on_allocate(self, name, size):
+        # every request is recorded, so a replay under another policy sees it
+        hid = self.next_id
+        self.next_id += 1
+        self.handles[name] = hid
+        self.trace.alloc(hid, size)
+    
+    def on_deallocate(self, name):
+        hid = self.handles.pop(name, None)
+        if hid is not None:
+            self.trace.free(hid)
+
+
+# synthetic size distributions: factory(rng, lo, hi) -> size()
+def _uniform(rng, lo, hi):
+    return lambda: rng.randint(lo, hi)
+
+def _bimodal(rng, lo, hi):
+    # 80% small objects, 20% large ones
+    span = max(hi - lo, 1)
+    small_hi = lo + max(span // 8, 1)
+    large_lo = hi - max(span // 4, 1)
+    return lambda: rng.randint(lo, small_hi) if rng.random() < 0.8 else rng.randint(large_lo, hi)
+
+def _power_law(rng, lo, hi, alpha=1.5):
+    return lambda: min(hi, int(lo * rng.paretovariate(alpha)))
+
+SIZE_DISTS = {
+    'uniform': _uniform,
+    'bimodal': _bimodal,
+    'power-law': _power_law,
+}
+
+
+def synthetic_trace(n_ops, dist="uniform", min_size=1, max_size=64, mean_lifetime=20, seed=None):
+    """生成合成轨迹: 尺寸服从 dist, 生命周期服从均值为 mean_lifetime 的指数分布"""
+    if dist not in SIZE_DISTS:
+        raise ValueError(f"unknown size distribution: {dist}")
+    rng = random.Random(seed)
+    next_size = SIZE_DISTS[dist](rng, min_size, max_size)
+    trace = AllocTrace()
+    deaths = []     # heap of (death_tick, id)
+    tick = 0
+    hid = 0
+    while len(trace) < n_ops:
+        while deaths and deaths[0][0] <= tick and len(trace) < n_ops:
+            trace.free(heapq.heappop(deaths)[1])
+        if len(trace) >= n_ops:
+            break
+        trace.alloc(hid, next_size())
+        heapq.heappush(deaths, (tick + 1 + int(rng.expovariate(1.0 / mean_lifetime)), hid))
+        hid += 1
+        tick += 1
+    return trace
+
+
+def replay(trace, memory, sample_every=1000):
+    """在任意 Memory 实现上回放轨迹, 返回统计结果"""
+    handles = {}
+    allocs = failures = 0
+    series = []
+    peak = 0.0
+    sample_time = 0.0
+    t0 = time.perf_counter()
+    for i, (op, hid, size) in enumerate(trace, 1):
+        if op == OP_ALLOC:
+            allocs += 1
+            start = memory.allocate(hid, size)
+            if start is None:
+                failures += 1
+            else:
+                handles[hid] = start
+        else:
+            start = handles.pop(hid, None)
+            if start is not None:
+                memory.deallocate(start)
+        if sample_every and i % sample_every == 0:
+            s0 = time.perf_counter()
+            frag = memory.get_fragmentation()[3]
+            series.append((i, frag))
+            peak = max(peak, frag)
+            sample_time += time.perf_counter() - s0
+    elapsed = time.perf_counter() - t0 - sample_time
+    return {
+        'ops': len(trace),
+        'elapsed': elapsed,
+        'ops_per_sec': len(trace) / elapsed if elapsed > 0 else 0.0,
+        'allocs': allocs,
+        'failures': failures,
+        'failure_rate': failures / allocs if allocs else 0.0,
+        'peak_fragmentation': peak,
+        'fragmentation': series,
+        'final_blocks': len(memory.blocks),
+    }
+
+
+def make_memory(memory_type, size, policy_or_block):
+    from modules.memory_manager import MemoryManager
+    return MemoryManager(memory_type, size, policy_or_block, verbose=False).memory
+
+
+def format_results(results):
+    lines = ["{:<18} {:>12} {:>9} {:>9} {:>9} {:>7}".format(
+        "MEMORY", "OPS/SEC", "FAIL%", "PEAKFRAG", "ENDFRAG", "BLOCKS")]
+    lines.append("-" * 69)
+    for label, r in results:
+        end = r['fragmentation'][-1][1] if r['fragmentation'] else 0.0
+        lines.append("{:<18} {:>12,.0f} {:>8.2f}% {:>9.3f} {:>9.3f} {:>7}".format(
+            label, r['ops_per_sec'], r['failure_rate'] * 100,
+            r['peak_fragmentation'], end, r['final_blocks']))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="LZY-OS memory trace replay benchmark")
+    ap.add_argument('--ops', type=int, default=1000000)
+    ap.add_argument('--dist', choices=sorted(SIZE_DISTS), default='uniform')
+    ap.add_argument('--min-size', type=int, default=1)
+    ap.add_argument('--max-size', type=int, default=64)
+    ap.add_argument('--lifetime', type=float, default=20)
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--size', type=int, default=1024, help="memory size (KB)")
+    ap.add_argument('--policies', default='first-fit,next-fit,best-fit,worst-fit,tlsf')
+    ap.add_argument('--block', type=int, default=0, help="also replay on fixed partitions of this size")
+    ap.add_argument('--sample-every', type=int, default=1000)
+    ap.add_argument('--load', help="replay a saved trace instead of generating one")
+    ap.add_argument('--save', help="save the generated trace")
+    args = ap.parse_args(argv)
+    
+    if args.load:
+        trace = AllocTrace.load(args.load)
+        print(f"[trace] loaded {len(trace)} ops from {args.load}")
+    else:
+        trace = synthetic_trace(args.ops, args.dist, args.min_size, args.max_size,
+                                args.lifetime, args.seed)
+        print(f"[trace] generated {len(trace)} ops ({args.dist}, {trace.nbytes()} bytes)")
+    if args.save:
+        trace.save(args.save)
+        print(f"[trace] saved -> {args.save}")
+    
+    targets = [(p, ("dynamic", p)) for p in args.policies.split(',') if p]
+    if args.block:
+        targets.append((f"fixed/{args.block}", ("fixed", args.block)))
+    results = []
+    for label, (kind, arg) in targets:
+        print(f"[replay] {label} ...")
+        results.append((label, replay(trace, make_memory(kind, args.size, arg), args.sample_every)))
+    print()
+    print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""LZY-OS Object File - 目标文件格式与汇编结果缓存"""
+import hashlib
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+from .assembler import Assembler, LineMap
+
+
+class ObjectFile:
+    """目标文件 - 机器码 + 符号表 + 源码行号表 + 导出/导入符号 + 重定位表
+    
+    代码按装入地址 0 汇编; 重定位表记录所有取值为标签地址的字, 装入到别处时
+    只需给这些字加上基址 (relocate), 不必重新汇编。
+    
+    格式 (小端): 头 [magic, 版本, 标志, 代码字数, 符号数, 行表项数, 导出数, 导入数,
+    重定位数, 源码摘要 16B] | 代码 int64 x n | 符号 [名字, 值 int64] x n
+    | 行表 [地址 u32, 行号 u32] x n | 导出 [名字] x n | 导入 [名字] x n
+    | 重定位 [地址 i32, 导入序号 i32 (-1 为本模块标签)] x n | CRC32
+    名字均为 [长度 u16, utf-8]。
+    """
+    MAGIC = b'LZYO'
+    VERSION = 2
+    HEADER = struct.Struct('<4sHHIIIIII16s')
+    NAME = struct.Struct('<H')
+    VALUE = struct.Struct('<q')
+    CRC = struct.Struct('<I')
+    
+    def __init__(self, code, symbols=None, line_map=None, digest=b'',
+                 exports=None, imports=None, relocs=None):
+        self.code = code
+        self.symbols = dict(symbols) if symbols else {}
+        self.line_map = LineMap(line_map) if line_map else LineMap()   # (address, line), ascending
+        self.digest = digest
+        self.exports = list(exports) if exports else []
+        self.imports = list(imports) if imports else []
+        self.relocs = list(relocs) if relocs else []            # (address, None | imported name)
+    
+    def __len__(self):
+        return len(self.code)
+    
+    def line_of(self, addr):
+        """地址所在指令的源码行号; 不在任何指令上时返回 None"""
+        return self.line_map.line_of(addr)
+    
+    def unresolved(self):
+        """代码中引用到、尚未由链接器解析的导入符号"""
+        return sorted({name for _, name in self.relocs if name is not None})
+    
+    def relocate(self, base):
+        """装入到 base 处的代码副本; 还有未解析的导入时抛出 ValueError"""
+        missing = self.unresolved()
+        if missing:
+            raise ValueError("unresolved symbols: " + ", ".join(missing))
+        code = list(self.code)
+        if base:
+            for addr, _ in self.relocs:
+                code[addr] += base
+        return code
+    
+    # ---- serialization --------------------------------------------------
+    @staticmethod
+    def _words(values, typecode):
+        words = array(typecode, values)
+        if sys.byteorder == 'big':
+            words.byteswap()
+        return words
+    
+    @classmethod
+    def _name(cls, name):
+        raw = name.encode('utf-8')
+        return cls.NAME.pack(len(raw)) + raw
+    
+    @classmethod
+    def _read_name(cls, body, pos):
+        n, = cls.NAME.unpack_from(body, pos)
+        pos += cls.NAME.size
+        if pos + n > len(body):
+            raise ValueError("truncated object file")
+        return bytes(body[pos:pos + n]).decode('utf-8'), pos + n
+    
+    @staticmethod
+    def _read_words(body, pos, typecode, count):
+        words = array(typecode)
+        end = pos + words.itemsize * count
+        if end > len(body):
+            raise ValueError("truncated object file")
+        words.frombytes(body[pos:end])
+        if sys.byteorder == 'big':
+            words.byteswap()
+        return words, end
+    
+    def to_bytes(self):
+        try:
+            code = self._words(self.code, 'q')
+        except OverflowError:
+            raise ValueError("operand does not fit in 64 bits")
+        parts = [self.HEADER.pack(self.MAGIC, self.VERSION, 0, len(code), len(self.symbols),
+                                  len(self.line_map), len(self.exports), len(self.imports),
+                                  len(self.relocs), self.digest.ljust(16, b'\0')),
+                 code.tobytes()]
+        for name, value in self.symbols.items():
+            parts.append(self._name(name) + self.VALUE.pack(value))
+        lines = array('I', [0]) * (2 * len(self.line_map))
+        lines[::2], lines[1::2] = self.line_map.addrs, self.line_map.lines
+        parts.append(self._words(lines, 'I').tobytes())
+        parts.extend(self._name(name) for name in self.exports)
+        parts.extend(self._name(name) for name in self.imports)
+        index = {name: i for i, name in enumerate(self.imports)}
+        parts.append(self._words((v for addr, name in self.relocs
+                                  for v in (addr, -1 if name is None else index[name])), 'i').tobytes())
+        data = b''.join(parts)
+        return data + self.CRC.pack(zlib.crc32(data))
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """解析 to_bytes() 的结果; 格式不符或校验失败时抛出 ValueError"""
+        view = memoryview(data)
+        if len(view) < cls.HEADER.size + cls.CRC.size:
+            raise ValueError("truncated object file")
+        body = view[:-cls.CRC.size]
+        if zlib.crc32(body) != cls.CRC.unpack(view[-cls.CRC.size:])[0]:
+            raise ValueError("object file checksum mismatch")
+        magic, version, _, ncode, nsyms, nlines, nexports, nimports, nrelocs, digest = \
+            cls.HEADER.unpack_from(body)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("not an LZY-OS object file (or another version)")
+        try:
+            code, pos = cls._read_words(body, cls.HEADER.size, 'q', ncode)
+            symbols = {}
+            for _ in range(nsyms):
+                name, pos = cls._read_name(body, pos)
+                symbols[name], = cls.VALUE.unpack_from(body, pos)
+                pos += cls.VALUE.size
+            lines, pos = cls._read_words(body, pos, 'I', 2 * nlines)
+            exports = []
+            for _ in range(nexports):
+                name, pos = cls._read_name(body, pos)
+                exports.append(name)
+            imports = []
+            for _ in range(nimports):
+                name, pos = cls._read_name(body, pos)
+                imports.append(name)
+            relocs, pos = cls._read_words(body, pos, 'i', 2 * nrelocs)
+            relocs = [(addr, None if i < 0 else imports[i]) for addr, i in zip(relocs[::2], relocs[1::2])]
+        except (struct.error, IndexError, UnicodeDecodeError):
+            raise ValueError("malformed object file")
+        return cls(code.tolist(), symbols, LineMap.from_columns(lines[::2], lines[1::2]),
+                   digest, exports, imports, relocs)
+    
+    def save(self, path):
+        # write-then-rename: a reader never sees a half-written file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(tmp, path)
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+# the instruction set and format are part of every key: changing either invalidates old entries
+_SIGNATURE = repr((ObjectFile.VERSION, sorted(Assembler.OPCODES.items()),
+                   sorted(Assembler.NO_OPERAND))).encode()
+
+
+class ProgramCache:
+    """汇编结果缓存 - 以源码内容哈希为键, 内存中的 LRU + 可选的磁盘目录
+    
+    命中时直接返回目标文件而不再汇编; 磁盘条目带校验和, 损坏的按未命中处理。
+    返回的 ObjectFile 在调用者之间共享, 不要修改它。
+    """
+    SUFFIX = ".lzo"
+    
+    def __init__(self, capacity=64, directory=None):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.directory = directory
+        self.entries = OrderedDict()    # digest -> ObjectFile
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_errors = 0
+        self.assemble_time = 0.0
+    
+    @staticmethod
+    def digest(source):
+        h = hashlib.blake2b(source.encode('utf-8'), digest_size=16)
+        h.update(_SIGNATURE)
+        return h.digest()
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key.hex() + self.SUFFIX)
+    
+    def _remember(self, key, obj):
+        self.entries[key] = obj
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+    
+    def _read_disk(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            obj = ObjectFile.load(path)
+        except (OSError, ValueError):
+            self.disk_errors += 1
+            return None
+        return obj if obj.digest == key else None
+    
+    def _write_disk(self, key, obj):
+        if self.directory is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            obj.save(self._path(key))
+        except (OSError, ValueError):
+            self.disk_errors += 1
+    
+    def load(self, source, assembler=None):
+        """源码 -> (ObjectFile, 来源), 来源为 "memory" / "disk" / "assembled" """
+        key = self.digest(source)
+        obj = self.entries.get(key)
+        if obj is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return obj, "memory"
+        obj = self._read_disk(key)
+        if obj is not None:
+            self.disk_hits += 1
+            self._remember(key, obj)
+            return obj, "disk"
+        self.misses += 1
+        asm = assembler if assembler is not None else Assembler()
+        t0 = time.perf_counter()
+        code = asm.assemble(source)
+        obj = ObjectFile(code, asm.symbols, asm.line_map, key, asm.exports, asm.imports, asm.relocs)
+        self.assemble_time += time.perf_counter() - t0
+        self._remember(key, obj)
+        self._write_disk(key, obj)
+        return obj, "assembled"
+    
+    def optimized(self, obj, passes=None):
+        """目标文件 -> (优化后的 ObjectFile, 报告, 来源), 来源为 "memory" / "disk" / "optimized"
+        
+        以原目标文件的摘要和 pass 列表为键, 与汇编结果共用 LRU 和磁盘目录; 命中时报告为 None。
+        没有摘要的目标文件 (不是由缓存或链接器产生的) 每次都重新优化。
+        """
+        from .optimizer import PASSES, optimize
+        passes = PASSES if passes is None else tuple(passes)
+        if not obj.digest:
+            return optimize(obj, passes) + ("optimized",)
+        h = hashlib.blake2b(obj.digest, digest_size=16)
+        h.update(b"optimize:" + ",".join(passes).encode('utf-8'))
+        key = h.digest()
+        new = self.entries.get(key)
+        if new is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return new, None, "memory"
+        new = self._read_disk(key)
+        if new is not None:
+            self.disk_hits += 1
+            self._remember(key, new)
+            return new, None, "disk"
+        self.misses += 1
+        new, report = optimize(obj, passes)
+        self._remember(key, new)
+        if new is not obj:
+            # skipped programs come back unchanged and keep their own digest
+            new.digest = key
+            self._write_disk(key, new)
+        return new, report, "optimized"
+    
+    def clear(self, disk=False):
+        """清空内存中的条目; disk=True 时一并删除磁盘目录中的缓存文件"""
+        self.entries.clear()
+        if disk and self.directory is not None and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(self.SUFFIX):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        self.disk_errors += 1
+    
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'capacity': self.capacity,
+            'directory': self.directory,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            'disk_errors': self.disk_errors,
+            'assemble_time': self.assemble_time,
+        }
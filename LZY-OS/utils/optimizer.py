@@ -0,0 +1,515 @@
+"""LZY-OS Optimizer - 汇编程序的窥孔 / 数据流优化"""
+import contextlib
+import io
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from .assembler import Assembler
+from .objfile import ObjectFile
+
+_OP = Assembler.OPCODES
+LOAD, ADD, SUB, MUL, DIV = _OP['LOAD'], _OP['ADD'], _OP['SUB'], _OP['MUL'], _OP['DIV']
+STORE, JMP, JZ, HALT, MOV = _OP['STORE'], _OP['JMP'], _OP['JZ'], _OP['HALT'], _OP['MOV']
+ARITH = {ADD: lambda a, v: a + v, SUB: lambda a, v: a - v, MUL: lambda a, v: a * v,
+         DIV: lambda a, v: a // v if v else a}
+MEMORY_OPS = set(ARITH) | {STORE}
+# word count as the CPU executes it: MOV only advances pc by one, its "operand" runs as an opcode
+TWO_WORD = MEMORY_OPS | {LOAD, JMP, JZ}
+_OPNAMES = set(_OP.values())
+PASSES = ("unreachable", "mov", "threading", "fold", "store-load")
+INT64 = (-1 << 63, 1 << 63)
+
+
+class _Entry:
+    """一条指令或一个数据字; target 为操作数 (或数据字) 引用的程序内条目"""
+    __slots__ = ('op', 'arg', 'target', 'reloc', 'line', 'code', 'reachable', 'pinned', 'removed', 'addr')
+    
+    def __init__(self, op, arg=None, code=True, line=None, reloc=False):
+        self.op = op            # opcode; None for a data word
+        self.arg = arg          # operand, or the value of a data word
+        self.target = None
+        self.reloc = reloc
+        self.line = line
+        self.code = code
+        self.reachable = False
+        self.pinned = False     # referenced as data: never removed
+        self.removed = False
+        self.addr = 0
+    
+    @property
+    def size(self):
+        if not self.code:
+            return 0 if self.op == 'end' else 1
+        return 1 if self.arg is None else 2
+
+
+def _key(e):
+    """内存操作数的键: 程序内的数据字用条目本身, 程序外用绝对地址"""
+    return e.target if e.target is not None else e.arg
+
+
+def _decode(obj):
+    """按 CPU 的执行方式从地址 0 开始解码; 返回 (条目列表, 符号 -> 条目), 无法安全优化时返回 (None, 原因)"""
+    code = obj.code
+    n = len(code)
+    starts = {}     # reachable instruction address -> size
+    claimed = set()
+    stack = [0] if n else []
+    while stack:
+        a = stack.pop()
+        if a in starts:
+            continue
+        if not 0 <= a < n:
+            return None, "control flow leaves the program"
+        op = code[a]
+        size = 2 if op in TWO_WORD else 1
+        if a + size > n or claimed.intersection(range(a, a + size)):
+            return None, "overlapping or truncated instructions"
+        claimed.update(range(a, a + size))
+        starts[a] = size
+        if op == JMP:
+            stack.append(code[a + 1])
+        elif op == JZ:
+            stack.extend((code[a + 1], a + 2))
+        elif op != HALT:
+            stack.append(a + size)
+    
+    relocated = {addr for addr, _ in obj.relocs}
+    refs = set()
+    for a, size in starts.items():
+        if size == 2 and (code[a] in (JMP, JZ) or code[a] in MEMORY_OPS or a + 1 in relocated):
+            ref = code[a + 1]
+            if 0 <= ref < n:
+                if code[a] in MEMORY_OPS and ref in claimed:
+                    return None, "program reads or writes its own code"
+                refs.add(ref)
+    refs.update(code[a] for a in relocated if 0 <= code[a] < n)
+    
+    # instructions the assembler emitted but nothing reaches: dead code unless used as data
+    lines = dict(obj.line_map)
+    dead = {}
+    for a in lines:
+        if a not in claimed:
+            size = 2 if code[a] in TWO_WORD else 1
+            words = range(a, a + size)
+            if a + size <= n and not claimed.intersection(words) and not refs.intersection(words[1:]):
+                dead[a] = size
+    
+    entries = []
+    at = {}
+    a = 0
+    while a < n:
+        size = starts.get(a) or dead.get(a)
+        if size:
+            e = _Entry(code[a], code[a + 1] if size == 2 else None, line=lines.get(a),
+                       reloc=a + 1 in relocated)
+            e.reachable = a in starts
+            e.pinned = a in refs and not e.reachable
+        else:
+            size = 1
+            e = _Entry(None, code[a], code=False, reloc=a in relocated)
+        e.addr = a
+        at[a] = e
+        entries.append(e)
+        a += size
+    end = _Entry('end', code=False)
+    end.addr = n
+    at[n] = end
+    entries.append(end)
+    for e in entries:
+        if e.arg is not None and 0 <= e.arg < n and (e.code and (e.op in (JMP, JZ) or e.op in MEMORY_OPS)
+                                                     or e.reloc):
+            e.target = at.get(e.arg)
+            if e.target is None:
+                return None, "reference into the middle of an instruction"
+    symbols = {}
+    for name, value in obj.symbols.items():
+        symbols[name] = at.get(value, value)
+    return entries, symbols
+
+
+def _compact(entries):
+    """去掉已删除的条目, 指向它们的引用改指向其后第一个保留的条目"""
+    follow = None
+    for e in reversed(entries):
+        if e.removed:
+            e.target = follow       # removed entries forward to their successor
+        else:
+            follow = e
+    
+    def resolve(t):
+        while t is not None and t.removed:
+            t = t.target
+        return t
+    
+    live = [e for e in entries if not e.removed]
+    for e in live:
+        if e.target is not None:
+            e.target = resolve(e.target)
+    return live, resolve
+
+
+def _layout(entries, symbols):
+    """条目 -> ObjectFile: 按顺序重新分配地址, 改写所有引用"""
+    addr = 0
+    for e in entries:
+        e.addr = addr
+        addr += e.size
+    code, relocs, line_map = [], [], []
+    for e in entries:
+        if e.code:
+            if e.line is not None:
+                line_map.append((e.addr, e.line))
+            code.append(e.op)
+            if e.arg is None:
+                continue
+        elif e.op == 'end':
+            continue
+        if e.reloc:
+            relocs.append((len(code), None))
+        code.append(e.target.addr if e.target is not None else e.arg)
+    named = {name: (v.addr if isinstance(v, _Entry) else v) for name, v in symbols.items()}
+    return code, named, line_map, relocs
+
+
+def _blocks(entries):
+    """可达指令划分为基本块: 跳转目标和跳转/停机之后的指令开始新块, 数据字隔开"""
+    leaders = {e.target for e in entries if e.code and e.op in (JMP, JZ)}
+    blocks, cur = [], []
+    for e in entries:
+        if not e.code or not e.reachable or e in leaders:
+            if cur:
+                blocks.append(cur)
+            cur = []
+            if not e.code or not e.reachable:
+                continue
+        cur.append(e)
+        if e.op in (JMP, JZ, HALT):
+            blocks.append(cur)
+            cur = []
+    if cur:
+        blocks.append(cur)
+    return blocks
+
+
+# ---- passes: each marks entries removed / rewrites them, returns the number of changes
+def _pass_unreachable(entries):
+    for e in entries:
+        e.reachable = False
+    index = {e: i for i, e in enumerate(entries)}
+    stack = [entries[0]] if entries[0].code else []
+    while stack:
+        e = stack.pop()
+        if e.reachable or not e.code:
+            continue
+        e.reachable = True
+        nxt = entries[index[e] + 1]
+        if e.op == JMP:
+            stack.append(e.target)
+        elif e.op == JZ:
+            stack.extend((e.target, nxt))
+        elif e.op != HALT:
+            stack.append(nxt)
+    changes = 0
+    for e in entries:
+        if e.code and not e.reachable and not e.pinned:
+            e.removed = True
+            changes += 1
+    return changes
+
+
+def _pass_mov(entries):
+    changes = 0
+    for e, nxt in zip(entries, entries[1:]):
+        # the CPU reports an unknown opcode with its address: keep that address stable
+        if e.code and e.op == MOV and not (nxt.code and nxt.op not in _OPNAMES):
+            e.removed = True
+            changes += 1
+    return changes
+
+
+def _pass_threading(entries):
+    changes = 0
+    for i, e in enumerate(entries):
+        if not (e.code and e.reachable and e.op in (JMP, JZ)) or e.target is None:
+            continue
+        # a taken JZ lands with ACC == 0, so a JZ at the target is taken as well
+        seen = {e}
+        t = e.target
+        while t.code and (t.op == JMP or (t.op == JZ and e.op == JZ)) and t not in seen \
+                and t.target is not None:
+            seen.add(t)
+            t = t.target
+        if t is not e.target:
+            e.target = t
+            changes += 1
+        nxt = next((x for x in entries[i + 1:] if not x.removed), None)
+        if t is nxt:
+            e.removed = True        # jump to the next instruction
+            changes += 1
+        elif e.op == JMP and t.code and t.op == HALT:
+            e.op, e.arg, e.target, e.reloc = HALT, None, None, False
+            changes += 1
+    return changes
+
+
+def _pass_fold(entries):
+    """块内常量传播: 已知 ACC 和已知内存上的 LOAD/ADD/SUB/MUL/DIV 链合并为一条 LOAD,
+    结果与链开始前 ACC 的值相同时整条删除"""
+    stored = {e.target for e in entries if e.code and e.op == STORE and e.target is not None}
+    changes = 0
+    for block in _blocks(entries):
+        acc = None
+        chain = []      # instructions since ACC last held a value some later one may read
+        before = None   # ACC before the chain
+        memory = {}     # _key() -> known value
+        
+        def known(e):
+            key = _key(e)
+            if key in memory:
+                return memory[key]
+            t = e.target
+            if t is not None and not t.code and not t.reloc and t not in stored:
+                return t.arg        # a data word nothing stores to
+            return None
+        
+        def materialize():
+            nonlocal changes, chain, before
+            if chain and acc is not None:
+                if acc == before:
+                    for e in chain:
+                        e.removed = True
+                    changes += len(chain)
+                elif len(chain) > 1 and INT64[0] <= acc < INT64[1]:
+                    head = chain[0]
+                    head.op, head.arg, head.target, head.reloc = LOAD, acc, None, False
+                    for e in chain[1:]:
+                        e.removed = True
+                    changes += len(chain) - 1
+            chain, before = [], acc
+        
+        for e in block:
+            op = e.op
+            if op == LOAD and not e.reloc:
+                materialize()
+                acc = e.arg
+                chain.append(e)
+            elif op in ARITH:
+                v = known(e)
+                if acc is not None and v is not None:
+                    if not chain:
+                        before = acc
+                    acc = ARITH[op](acc, v)
+                    chain.append(e)
+                else:
+                    acc, chain = None, []
+            elif op == LOAD:
+                acc, chain = None, []
+            elif op == MOV:
+                continue
+            else:
+                materialize()
+                if op == STORE:
+                    memory[_key(e)] = acc
+                elif op == JZ and acc is not None:
+                    if acc == 0:
+                        e.op = JMP
+                    else:
+                        e.removed = True    # never taken
+                    changes += 1
+        materialize()
+    return changes
+
+
+def _zero(e):
+    """LOAD 0 (ACC 清零)"""
+    return e.op == LOAD and e.arg == 0 and not e.reloc
+
+
+def _scan_mirror(block, mirror, rewrite=False):
+    """沿块向前推导 ACC 与哪些内存键相等, 返回块末的集合 (和改动数)
+    
+    rewrite 为 True 时删除重算 ACC 已有值的 "LOAD 0; ADD a" (a 与 ACC 相等),
+    并把 "LOAD 0; ADD x; ADD a" 改为 "ADD x" (加法可交换)。
+    """
+    changes = 0
+    i, n = 0, len(block)
+    while i < n:
+        e = block[i]
+        nxt = block[i + 1] if i + 1 < n else None
+        if _zero(e) and nxt is not None and nxt.op == ADD:
+            key = _key(nxt)
+            if key in mirror:
+                if rewrite:
+                    e.removed = nxt.removed = True
+                    changes += 2
+                i += 2
+                continue
+            last = block[i + 2] if i + 2 < n else None
+            if rewrite and last is not None and last.op == ADD and _key(last) in mirror:
+                e.removed = last.removed = True
+                changes += 2
+                mirror = set()
+                i += 3
+                continue
+            mirror = {key}      # ACC now holds mem[key]
+            i += 2
+            continue
+        if e.op == STORE:
+            mirror = mirror | {_key(e)}
+        elif e.op == LOAD or e.op in ARITH:
+            mirror = set()
+        i += 1
+    return mirror, changes
+
+
+def _entry_mirrors(entries, blocks):
+    """每个块入口处一定与 ACC 相等的内存键: 所有前驱 (含循环回边) 出口集合的交集, 迭代到不动点"""
+    first = {block[0]: i for i, block in enumerate(blocks)}
+    position = {e: i for i, e in enumerate(entries)}
+    succs = []
+    for block in blocks:
+        last = block[-1]
+        targets = []
+        if last.op in (JMP, JZ):
+            targets.append(last.target)
+        if last.op not in (JMP, HALT):
+            targets.append(entries[position[last] + 1])
+        succs.append([first[t] for t in targets if t in first])
+    entry = first.get(entries[0])
+    ins = [None] * len(blocks)      # None: no path seen yet
+    if entry is not None:
+        ins[entry] = set()          # nothing is known when the program starts
+    work = [entry] if entry is not None else []
+    while work:
+        i = work.pop()
+        out, _ = _scan_mirror(blocks[i], ins[i])
+        for j in succs[i]:
+            new = set(out) if ins[j] is None else ins[j] & out
+            if j == entry:
+                new = set()
+            if new != ins[j]:
+                ins[j] = new
+                work.append(j)
+    return ins
+
+
+def _pass_store_load(entries):
+    """删除重算 ACC 已有值的 LOAD 0 / ADD a (跨块, 包括循环回边), 以及块内被覆盖前没人读的 STORE 与 ACC 赋值"""
+    changes = 0
+    blocks = _blocks(entries)
+    # forward: after STORE a on every path, "LOAD 0; ADD a" recomputes the value ACC already has
+    for block, mirror in zip(blocks, _entry_mirrors(entries, blocks)):
+        if mirror is not None:
+            changes += _scan_mirror(block, mirror, rewrite=True)[1]
+    for block in blocks:
+        # backward: dead stores and dead ACC definitions
+        acc_live = True
+        overwritten = set()
+        for e in reversed(block):
+            if e.removed:
+                continue
+            op = e.op
+            key = _key(e)
+            if op == LOAD or op in ARITH:
+                if not acc_live:
+                    e.removed = True
+                    changes += 1
+                    continue
+                acc_live = op != LOAD
+                if op in ARITH:
+                    overwritten.discard(key)
+            elif op == STORE:
+                if key in overwritten:
+                    e.removed = True
+                    changes += 1
+                    continue
+                overwritten.add(key)
+                acc_live = True
+            elif op != MOV:
+                acc_live = True
+    return changes
+
+
+_PASS_FUNCS = {
+    "unreachable": _pass_unreachable,
+    "mov": _pass_mov,
+    "threading": _pass_threading,
+    "fold": _pass_fold,
+    "store-load": _pass_store_load,
+}
+
+
+def execute(code, memory_size=512, max_cycles=100000):
+    """在新 CPU 上从地址 0 运行, 返回 (周期数, 输出, ACC, 内存); 未停机时周期数为 None"""
+    from core.cpu import CPU
+    
+    cpu = CPU(max(memory_size, len(code)))
+    cpu.load_program(code)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        while not cpu.halted and cpu.cycles < max_cycles:
+            cpu.step()
+    return (cpu.cycles if cpu.halted else None), out.getvalue(), cpu.registers['ACC'], cpu.memory
+
+
+def optimize(obj, passes=PASSES, rounds=4, measure=True, memory_size=512, max_cycles=100000):
+    """对已链接的程序 (入口为地址 0) 依次执行优化 pass, 返回 (新的 ObjectFile, 报告)
+    
+    报告含每个 pass 的改动数和删除的字数。每个 pass 只靠静态分析保证程序行为不变;
+    程序在运行中改写或读取自身代码、控制流离开程序时不做优化。measure 为 True
+    时优化前后各运行一次, 只用于报告周期数。假定程序的内存不会被其它进程同时读写。
+    """
+    missing = obj.unresolved()
+    if missing:
+        raise ValueError("unresolved symbols: " + ", ".join(missing))
+    unknown = [p for p in passes if p not in _PASS_FUNCS]
+    if unknown:
+        raise ValueError("unknown passes: " + ", ".join(unknown))
+    report = {'words_before': len(obj), 'words_after': len(obj), 'cycles_before': None,
+              'cycles_after': None, 'passes': {p: {'changes': 0, 'words': 0} for p in passes},
+              'skipped': None}
+    if measure:
+        report['cycles_before'] = report['cycles_after'] = execute(obj.code, memory_size, max_cycles)[0]
+    entries, symbols = _decode(obj)
+    if entries is None:
+        report['skipped'] = symbols
+        return obj, report
+    
+    current = (list(obj.code), dict(obj.symbols), list(obj.line_map), list(obj.relocs))
+    for _ in range(rounds):
+        progress = False
+        for name in passes:
+            changes = _PASS_FUNCS[name](entries)
+            if not changes:
+                continue
+            live, resolve = _compact(entries)
+            named = {k: resolve(v) if isinstance(v, _Entry) else v for k, v in symbols.items()}
+            laid = _layout(live, named)
+            report['passes'][name]['changes'] += changes
+            report['passes'][name]['words'] += len(current[0]) - len(laid[0])
+            entries, symbols, current = live, named, laid
+            progress = True
+        if not progress:
+            break
+    code, named, line_map, relocs = current
+    report['words_after'] = len(code)
+    if measure and code != list(obj.code):
+        report['cycles_after'] = execute(code, memory_size, max_cycles)[0]
+    return ObjectFile(code, named, line_map, b'', obj.exports, relocs=relocs), report
+
+
+def format_report(report):
+    lines = []
+    if report['skipped']:
+        return "[opt] not optimized: {}".format(report['skipped'])
+    before, after = report['cycles_before'], report['cycles_after']
+    for name, stats in report['passes'].items():
+        if stats['changes']:
+            lines.append("  {:<12} {:>4} changes  {:>5} words".format(name, stats['changes'], stats['words']))
+    summary = "[opt] {} -> {} words".format(report['words_before'], report['words_after'])
+    if before is not None and after is not None:
+        summary += ", {} -> {} cycles ({:.0f}% fewer)".format(
+            before, after, 100.0 * (before - after) / before if before else 0.0)
+    return "\n".join([summary] + lines)